@@ -0,0 +1,762 @@
+from collections import OrderedDict
+
+from .CR_Transaction import GraphTransaction,MayaExecutor,CurveData,setDefaultExecutor,getPlugValue,findPlug,stringTypes
+
+try:
+    import pymel.core as _pymel
+    import maya.cmds as _cmds
+    import maya.api.OpenMaya as om
+except ImportError:
+    #no maya in this session, only in-memory scenes can be used
+    _pymel = None
+    _cmds = None
+    om = None
+
+_backend = None
+
+
+class _Namespace(object):
+    '''
+    stand in for the pm/cmds modules, forward every call to the active backend
+    '''
+    def __init__(self,attrName):
+        self._attrName = attrName
+
+    def __getattr__(self,name):
+        return getattr(getattr(getBackend(),self._attrName),name)
+
+pm = _Namespace('pm')
+cmds = _Namespace('cmds')
+
+def plugName(plug):
+    '''
+    return the 'node.attr' name of a plug object, a plug name or a (node,'attr') tuple
+    '''
+    if isinstance(plug,tuple):
+        return str(plug[0])+'.'+plug[1]
+    return str(plug)
+
+
+# --------------------------------------------------------------
+# INTERFACE
+# --------------------------------------------------------------
+class SceneBackend(object):
+    '''
+    the thin scene interface CybeRig does its bulk work through, one call per batch
+    nodes and plugs can be given as objects or names, plugs also as (node,'attr') tuples
+    nodes returned are the node objects of the backend pm module
+    writes go through one transaction per call so they are undoable as one step
+    '''
+    name = None
+    pm = None
+    cmds = None
+
+    def executor(self):
+        '''
+        return a new transaction executor for this scene
+        '''
+        raise NotImplementedError
+
+    # writes
+    def createGroup(self,name,parent=None):
+        '''
+        create an empty transform, return it
+        '''
+        with self._transaction('CR_createGroup') as tx:
+            node = tx.createNode('transform',name,parent)
+        return tx.resolve(node)
+
+    def createJointChain(self,names,parent=None):
+        '''
+        create a chain of joints, each one the child of the previous one, the first under parent
+        the joints have identity local transforms, return them
+        '''
+        with self._transaction('CR_createJointChain') as tx:
+            jnts = []
+            for n in names:
+                parent = tx.createNode('joint',n,parent)
+                jnts.append(parent)
+        return [tx.resolve(j) for j in jnts]
+
+    def addAttrs(self,nodes,attrName,attrType='double',multi=False):
+        '''
+        add a dynamic attribute to every node missing it
+        '''
+        with self._transaction('CR_addAttrs') as tx:
+            for n in nodes:
+                tx.addAttr(n,attrName,attrType,multi)
+
+    def setAttrs(self,plugs,values):
+        '''
+        set plug values, tuples set the compound children
+        '''
+        with self._transaction('CR_setAttrs') as tx:
+            for p,v in zip(plugs,values):
+                node,attrName = plugName(p).split('.',1)
+                tx.setAttr(p[0] if isinstance(p,tuple) else node,attrName,v)
+
+    def connectPlugs(self,pairs):
+        '''
+        connect (src,dst) plug pairs, existing inputs of dst are replaced
+        '''
+        with self._transaction('CR_connectPlugs') as tx:
+            for src,dst in pairs:
+                tx.connect(src,dst)
+
+    def disconnectPlugs(self,pairs):
+        '''
+        disconnect (src,dst) plug pairs, pairs not connected are skipped
+        '''
+        with self._transaction('CR_disconnectPlugs') as tx:
+            for src,dst in pairs:
+                tx.disconnect(src,dst)
+
+    def setCurvePoints(self,shapes,pointLists):
+        '''
+        set the object space cvs of nurbs curve shapes, one list of points per shape
+        '''
+        with self._transaction('CR_setCurvePoints') as tx:
+            for s,points in zip(shapes,pointLists):
+                for x in range(0,len(points)):
+                    tx.setAttr(s,'controlPoints[{}]'.format(x),tuple([float(v) for v in points[x]]))
+
+    def setParents(self,nodes,parent=None,preserve=True):
+        '''
+        parent nodes under parent, None is the world, world transforms kept unless preserve is False
+        '''
+        raise NotImplementedError
+
+    def deleteNodes(self,nodes):
+        '''
+        delete nodes and their dag children, nodes already gone are skipped
+        '''
+        raise NotImplementedError
+
+    # reads
+    def hasAttrs(self,nodes,attrName):
+        '''
+        return for every node whether it has the attribute
+        '''
+        raise NotImplementedError
+
+    def getAttrs(self,plugs):
+        '''
+        return plug values, compounds as tuples, angles in degrees
+        '''
+        raise NotImplementedError
+
+    def worldMatrices(self,nodes,exclusive=False):
+        '''
+        return the world matrix of every node as 4x4 nested lists
+        exclusive returns the world matrix of the parent instead, identity at world
+        '''
+        raise NotImplementedError
+
+    def curvePoints(self,shapes):
+        '''
+        return the object space cvs of nurbs curve shapes, one list of (x,y,z) per shape
+        '''
+        raise NotImplementedError
+
+    def curveData(self,shapes):
+        '''
+        return the CurveData of nurbs curve shapes (object space cvs, knots, degree, form)
+        '''
+        raise NotImplementedError
+
+    def parentMap(self,nodeList):
+        '''
+        return ids,parentMap,labels of the dag nodes in one pass
+        ids are in nodeList order, parentMap maps every id to its parent id (None at world)
+        the ancestors of the nodes whose parent is not in the list are mapped too
+        '''
+        raise NotImplementedError
+
+    def nodesWithAttr(self,attrName):
+        '''
+        return the node handles of every node holding this attribute
+        handles have key(), uuid(), isValid(), name(), hasAttr(), isType(), plug() and node()
+        '''
+        raise NotImplementedError
+
+    def nodeHandles(self,nodes):
+        '''
+        return the node handle of every node given as an object or a name, in one pass
+        lookups should go through handleCache() instead, it only asks for the names it does not know
+        '''
+        raise NotImplementedError
+
+    def isDestination(self,plugs):
+        '''
+        return for every plug whether it has an input connection
+        '''
+        raise NotImplementedError
+
+    def handleCache(self):
+        '''
+        return the node handle cache of this scene, created on first use
+        '''
+        if getattr(self,'_handleCache',None) is None:
+            self._handleCache = HandleCache(self)
+        return self._handleCache
+
+    # callbacks
+    def addCallbacks(self,nodeAdded=None,nodeRemoved=None,nameChanged=None,connectionChanged=None,sceneCleared=None,nodeType='transform'):
+        '''
+        register scene callbacks, node callbacks get node handles
+        connectionChanged gets srcHandle,dstHandle,made
+        return the callback ids
+        '''
+        raise NotImplementedError
+
+    def removeCallbacks(self,ids):
+        raise NotImplementedError
+
+    # private methods
+    def _transaction(self,name):
+        if getattr(self,'_txExecutor',None) is None:
+            self._txExecutor = self.executor()
+        return GraphTransaction(name,self._txExecutor)
+
+
+# --------------------------------------------------------------
+# MAYA
+# --------------------------------------------------------------
+class MayaNodeHandle(object):
+    '''
+    MObjectHandle wrapper, the node handle kept by registries and given to callbacks
+    '''
+    def __init__(self,obj):
+        self.handle = om.MObjectHandle(obj)
+
+    def key(self):
+        return self.handle.hashCode()
+
+    def uuid(self):
+        return om.MFnDependencyNode(self.handle.object()).uuid().asString()
+
+    def object(self):
+        return self.handle.object()
+
+    def plug(self,attrPath):
+        return findPlug(self.handle.object(),attrPath)
+
+    def isValid(self):
+        return self.handle.isAlive() and self.handle.isValid()
+
+    def name(self):
+        return om.MFnDependencyNode(self.handle.object()).name()
+
+    def hasAttr(self,attrName):
+        return om.MFnDependencyNode(self.handle.object()).hasAttribute(attrName)
+
+    def isType(self,nodeType):
+        return self.handle.object().hasFn(MFNTYPES[nodeType])
+
+    def node(self):
+        obj = self.handle.object()
+        if obj.hasFn(om.MFn.kDagNode):
+            return _pymel.PyNode(om.MFnDagNode(obj).fullPathName())
+        return _pymel.PyNode(om.MFnDependencyNode(obj).name())
+
+
+MFNTYPES = {}
+if om is not None:
+    MFNTYPES = {
+        'dependNode' : om.MFn.kDependencyNode,
+        'transform' : om.MFn.kTransform,
+        'joint' : om.MFn.kJoint,
+        'skinCluster' : om.MFn.kSkinClusterFilter,
+    }
+
+
+class _MayaBackend(SceneBackend):
+    '''
+    shared part of the maya backends: OpenMaya 2 queries and callbacks, undoable transactions
+    '''
+    def __init__(self):
+        if _pymel is None:
+            raise RuntimeError('maya is not available in this session')
+        self.pm = _pymel
+        self.cmds = _cmds
+
+    def executor(self):
+        return MayaExecutor(self.handleCache())
+
+    def setParents(self,nodes,parent=None,preserve=True):
+        names = self._reparented(nodes,parent)
+        if len(names) == 0:
+            return
+        if parent is None:
+            _cmds.parent(names,world=True,relative=not preserve)
+        else:
+            _cmds.parent(names,str(parent),relative=not preserve)
+
+    def deleteNodes(self,nodes):
+        names = [str(n) for n in nodes]
+        names = _cmds.ls(names) or []
+        if len(names) > 0:
+            _cmds.delete(names)
+
+    def curveData(self,shapes):
+        curves = []
+        #cvPositions is in internal units, plug values are in ui units
+        toUI = om.MDistance.internalToUI(1.0)
+        for handle in self.handleCache().nodeHandles(shapes):
+            fn = om.MFnNurbsCurve(om.MDagPath.getAPathTo(handle.object()))
+            points = [(p.x*toUI,p.y*toUI,p.z*toUI) for p in fn.cvPositions(om.MSpace.kObject)]
+            curves.append(CurveData(points,list(fn.knots()),fn.degree,fn.form))
+        return curves
+
+    def parentMap(self,nodeList):
+        ids = []
+        parentMap = {}
+        labels = {}
+        objects = {}
+        for n,handle in zip(nodeList,self.handleCache().nodeHandles(nodeList)):
+            obj = handle.object()
+            i = handle.key()
+            ids.append(i)
+            labels[i] = str(n)
+            objects[i] = obj
+            parentMap[i] = self._parentId(obj)
+
+        idSet = set(ids)
+        for i in ids:
+            if parentMap[i] in idSet:
+                continue
+            #walk up to world so a missing joint in between can be told apart
+            obj = objects[i]
+            p = parentMap[i]
+            while (p is not None) and (p not in parentMap):
+                obj = om.MFnDagNode(obj).parent(0)
+                parentMap[p] = self._parentId(obj)
+                p = parentMap[p]
+        return ids,parentMap,labels
+
+    def nodesWithAttr(self,attrName):
+        names = _cmds.ls('*.'+attrName,objectsOnly=True,recursive=True) or []
+        if len(names) == 0:
+            return []
+        return self.handleCache().nodeHandles(names)
+
+    def nodeHandles(self,nodes):
+        sel = om.MSelectionList()
+        for n in nodes:
+            sel.add(str(n))
+        return [MayaNodeHandle(sel.getDependNode(x)) for x in range(0,sel.length())]
+
+    def isDestination(self,plugs):
+        return [self._plug(p).isDestination for p in plugs]
+
+    def addCallbacks(self,nodeAdded=None,nodeRemoved=None,nameChanged=None,connectionChanged=None,sceneCleared=None,nodeType='transform'):
+        ids = []
+        if nodeAdded is not None:
+            ids.append(om.MDGMessage.addNodeAddedCallback(lambda node,data: nodeAdded(MayaNodeHandle(node)),nodeType))
+        if nodeRemoved is not None:
+            ids.append(om.MDGMessage.addNodeRemovedCallback(lambda node,data: nodeRemoved(MayaNodeHandle(node)),nodeType))
+        if nameChanged is not None:
+            ids.append(om.MNodeMessage.addNameChangedCallback(om.MObject(),lambda node,prevName,data: nameChanged(MayaNodeHandle(node))))
+        if connectionChanged is not None:
+            ids.append(om.MDGMessage.addConnectionCallback(lambda src,dst,made,data: connectionChanged(MayaNodeHandle(src.node()),MayaNodeHandle(dst.node()),made)))
+        if sceneCleared is not None:
+            ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew,lambda data: sceneCleared()))
+            ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen,lambda data: sceneCleared()))
+        return ids
+
+    def removeCallbacks(self,ids):
+        if len(ids) > 0:
+            om.MMessage.removeCallbacks(ids)
+
+    # private methods
+    def _plug(self,plug):
+        #MPlug of a (node,'attr') tuple or a plug name, through the handle cache
+        if not isinstance(plug,tuple):
+            plug = tuple(plugName(plug).split('.',1))
+        return self.handleCache().plug(plug[0],plug[1])
+
+    def _parentId(self,obj):
+        fn = om.MFnDagNode(obj)
+        if fn.parentCount() == 0:
+            return None
+        parent = fn.parent(0)
+        if parent.hasFn(om.MFn.kWorld):
+            return None
+        return om.MObjectHandle(parent).hashCode()
+
+    def _reparented(self,nodes,parent):
+        #cmds.parent fails on nodes already under parent
+        cache = self.handleCache()
+        parentObj = None
+        if parent is not None:
+            parentObj = cache.nodeHandles([parent])[0].object()
+        names = []
+        for handle in cache.nodeHandles(nodes):
+            fn = om.MFnDagNode(handle.object())
+            current = fn.parent(0)
+            if parentObj is None:
+                if current.hasFn(om.MFn.kWorld):
+                    continue
+            elif current == parentObj:
+                continue
+            names.append(fn.fullPathName())
+        return names
+
+
+class OpenMayaBackend(_MayaBackend):
+    '''
+    high throughput backend, OpenMaya 2 reads and modifier writes without pymel wrapping
+    the default backend in maya
+    '''
+    name = 'openmaya'
+
+    def hasAttrs(self,nodes,attrName):
+        return [h.hasAttr(attrName) for h in self.handleCache().nodeHandles(nodes)]
+
+    def getAttrs(self,plugs):
+        return [getPlugValue(self._plug(p)) for p in plugs]
+
+    def worldMatrices(self,nodes,exclusive=False):
+        matrices = []
+        for handle in self.handleCache().nodeHandles(nodes):
+            path = om.MDagPath.getAPathTo(handle.object())
+            m = path.exclusiveMatrix() if exclusive else path.inclusiveMatrix()
+            matrices.append([[m.getElement(r,c) for c in range(0,4)] for r in range(0,4)])
+        return matrices
+
+    def curvePoints(self,shapes):
+        pointLists = []
+        #cvPositions is in internal units, plug values are in ui units
+        toUI = om.MDistance.internalToUI(1.0)
+        for handle in self.handleCache().nodeHandles(shapes):
+            points = om.MFnNurbsCurve(om.MDagPath.getAPathTo(handle.object())).cvPositions(om.MSpace.kObject)
+            pointLists.append([(p.x*toUI,p.y*toUI,p.z*toUI) for p in points])
+        return pointLists
+
+
+class CmdsBackend(_MayaBackend):
+    '''
+    maya.cmds backend, one command per node or plug, no pymel wrapping on reads
+    '''
+    name = 'cmds'
+
+    def createGroup(self,name,parent=None):
+        kwargs = {'empty' : True,'name' : name}
+        if parent is not None:
+            kwargs['parent'] = str(parent)
+        return _pymel.PyNode(_cmds.group(**kwargs))
+
+    def createJointChain(self,names,parent=None):
+        jnts = []
+        for n in names:
+            kwargs = {'name' : n}
+            if parent is not None:
+                kwargs['parent'] = str(parent)
+            parent = _cmds.createNode('joint',**kwargs)
+            jnts.append(_cmds.ls(parent,long=True)[0])
+        return [_pymel.PyNode(j) for j in jnts]
+
+    def addAttrs(self,nodes,attrName,attrType='double',multi=False):
+        for n in nodes:
+            if _cmds.attributeQuery(attrName,node=str(n),exists=True):
+                continue
+            if attrType == 'string':
+                _cmds.addAttr(str(n),longName=attrName,dataType='string',multi=multi)
+            else:
+                _cmds.addAttr(str(n),longName=attrName,attributeType=attrType,multi=multi)
+
+    def setAttrs(self,plugs,values):
+        for p,v in zip(plugs,values):
+            if isinstance(v,(tuple,list)):
+                _cmds.setAttr(plugName(p),*v)
+            elif isinstance(v,stringTypes):
+                _cmds.setAttr(plugName(p),v,type='string')
+            else:
+                _cmds.setAttr(plugName(p),v)
+
+    def connectPlugs(self,pairs):
+        for src,dst in pairs:
+            _cmds.connectAttr(plugName(src),plugName(dst),force=True)
+
+    def disconnectPlugs(self,pairs):
+        for src,dst in pairs:
+            if _cmds.isConnected(plugName(src),plugName(dst)):
+                _cmds.disconnectAttr(plugName(src),plugName(dst))
+
+    def hasAttrs(self,nodes,attrName):
+        return [_cmds.attributeQuery(attrName,node=str(n),exists=True) for n in nodes]
+
+    def getAttrs(self,plugs):
+        values = []
+        for p in plugs:
+            value = _cmds.getAttr(plugName(p))
+            if isinstance(value,list) and len(value) == 1 and isinstance(value[0],tuple):
+                value = value[0]
+            values.append(value)
+        return values
+
+    def worldMatrices(self,nodes,exclusive=False):
+        matrices = []
+        for n in nodes:
+            if exclusive:
+                m = _cmds.getAttr(str(n)+'.parentMatrix[0]')
+            else:
+                m = _cmds.xform(str(n),query=True,matrix=True,worldSpace=True)
+            matrices.append([m[r*4:r*4+4] for r in range(0,4)])
+        return matrices
+
+    def curvePoints(self,shapes):
+        return [[tuple(p) for p in _cmds.getAttr(str(s)+'.cv[*]')] for s in shapes]
+
+
+class PymelBackend(_MayaBackend):
+    '''
+    pymel backend, every call goes through PyNode objects like CybeRig did before
+    kept for compatibility and as the reference the faster backends are checked against
+    '''
+    name = 'pymel'
+
+    def createGroup(self,name,parent=None):
+        if parent is None:
+            return _pymel.group(empty=True,name=name)
+        return _pymel.group(empty=True,name=name,parent=parent)
+
+    def createJointChain(self,names,parent=None):
+        jnts = []
+        for n in names:
+            if parent is None:
+                parent = _pymel.createNode('joint',name=n)
+            else:
+                parent = _pymel.createNode('joint',name=n,parent=parent)
+            jnts.append(parent)
+        return jnts
+
+    def addAttrs(self,nodes,attrName,attrType='double',multi=False):
+        for n in [_pymel.PyNode(n) for n in nodes]:
+            if n.hasAttr(attrName):
+                continue
+            if attrType == 'string':
+                n.addAttr(attrName,dataType='string',multi=multi)
+            else:
+                n.addAttr(attrName,attributeType=attrType,multi=multi)
+
+    def setAttrs(self,plugs,values):
+        for p,v in zip(plugs,values):
+            _pymel.PyNode(plugName(p)).set(v)
+
+    def connectPlugs(self,pairs):
+        for src,dst in pairs:
+            _pymel.PyNode(plugName(src)).connect(_pymel.PyNode(plugName(dst)),force=True)
+
+    def disconnectPlugs(self,pairs):
+        for src,dst in pairs:
+            src = _pymel.PyNode(plugName(src))
+            dst = _pymel.PyNode(plugName(dst))
+            if src.isConnectedTo(dst):
+                src.disconnect(dst)
+
+    def setParents(self,nodes,parent=None,preserve=True):
+        for n in [_pymel.PyNode(n) for n in nodes]:
+            if parent is None:
+                if n.getParent() is not None:
+                    _pymel.parent(n,world=True,relative=not preserve)
+            elif n.getParent() != parent:
+                _pymel.parent(n,parent,relative=not preserve)
+
+    def deleteNodes(self,nodes):
+        nodes = [n for n in nodes if _pymel.objExists(str(n))]
+        if len(nodes) > 0:
+            _pymel.delete(nodes)
+
+    def hasAttrs(self,nodes,attrName):
+        return [_pymel.PyNode(n).hasAttr(attrName) for n in nodes]
+
+    def getAttrs(self,plugs):
+        values = []
+        for p in plugs:
+            value = _pymel.PyNode(plugName(p)).get()
+            if hasattr(value,'__len__') and not isinstance(value,stringTypes):
+                value = tuple(value)
+            values.append(value)
+        return values
+
+    def worldMatrices(self,nodes,exclusive=False):
+        matrices = []
+        for n in nodes:
+            n = _pymel.PyNode(n)
+            m = n.parentMatrix[0].get() if exclusive else n.getMatrix(worldSpace=True)
+            matrices.append([[m[r][c] for c in range(0,4)] for r in range(0,4)])
+        return matrices
+
+    def curvePoints(self,shapes):
+        return [[tuple(p) for p in _pymel.PyNode(s).getCVs(space='preTransform')] for s in shapes]
+
+
+# --------------------------------------------------------------
+# HANDLE CACHE
+# --------------------------------------------------------------
+class HandleCache(object):
+    '''
+    node handles of one scene keyed by uuid, the names CR looked up resolve to a uuid once
+    plugs are kept per uuid and attribute path, so a node and an attribute index give a plug without parsing
+    delete, rename and new scene callbacks drop the stale entries
+    a name keeps pointing at the node it named when first resolved, even when the name is not unique anymore
+    '''
+    def __init__(self,backend):
+        self.backend = backend
+        self.byUuid = {}
+        self.uuids = {}
+        self.names = {}
+        self.namesOf = {}
+        self.plugs = {}
+        self.callbackIds = []
+        self.hits = 0
+        self.misses = 0
+
+    def nodeHandles(self,nodes):
+        '''
+        return the handle of every node given as an object or a name
+        the names not cached yet are resolved with one backend call
+        '''
+        names = [str(n) for n in nodes]
+        missing = [n for n in OrderedDict.fromkeys(names) if not self._known(n)]
+        self.hits += len(names)-len(missing)
+        self.misses += len(missing)
+        if len(missing) > 0:
+            if len(self.callbackIds) == 0:
+                self._addCallbacks()
+            for name,handle in zip(missing,self.backend.nodeHandles(missing)):
+                self._add(name,handle)
+        return [self.byUuid[self.names[n]] for n in names]
+
+    def uuid(self,node):
+        '''
+        return the uuid of a node given as an object or a name
+        '''
+        return self.names[str(node)] if self._known(str(node)) else self.nodeHandles([node])[0].uuid()
+
+    def plug(self,node,attrName,index=None):
+        '''
+        return the backend plug of node.attrName, the element index of a multi if given
+        '''
+        attrPath = attrName if index is None else '{}[{}]'.format(attrName,index)
+        handle = self.nodeHandles([node])[0]
+        plugs = self.plugs.setdefault(self.names[str(node)],{})
+        if attrPath not in plugs:
+            plugs[attrPath] = handle.plug(attrPath)
+        return plugs[attrPath]
+
+    def forgetPlugs(self,node):
+        '''
+        drop the cached plugs of node, for attributes deleted or added again
+        '''
+        self.plugs.pop(self.uuid(node),None)
+
+    def clear(self):
+        '''
+        forget every handle, name and plug
+        '''
+        self.byUuid.clear()
+        self.uuids.clear()
+        self.names.clear()
+        self.namesOf.clear()
+        self.plugs.clear()
+
+    def remove(self):
+        '''
+        remove the scene callbacks of this cache
+        '''
+        self.backend.removeCallbacks(self.callbackIds)
+        self.callbackIds = []
+        self.clear()
+
+    # private methods
+    def _known(self,name):
+        uuid = self.names.get(name)
+        if uuid is None:
+            return False
+        if not self.byUuid[uuid].isValid():
+            self._forget(uuid)
+            return False
+        return True
+
+    def _add(self,name,handle):
+        uuid = handle.uuid()
+        if uuid not in self.byUuid:
+            self.byUuid[uuid] = handle
+            self.uuids[handle.key()] = uuid
+        self.names[name] = uuid
+        self.namesOf.setdefault(uuid,set()).add(name)
+
+    def _forget(self,uuid):
+        handle = self.byUuid.pop(uuid,None)
+        if handle is not None:
+            self.uuids.pop(handle.key(),None)
+        for name in self.namesOf.pop(uuid,()):
+            self.names.pop(name,None)
+        self.plugs.pop(uuid,None)
+
+    def _addCallbacks(self):
+        self.callbackIds = self.backend.addCallbacks(
+            nodeRemoved=self._nodeRemoved,
+            nameChanged=self._nameChanged,
+            sceneCleared=self.clear,
+            nodeType='dependNode',
+        )
+
+    def _nodeRemoved(self,handle):
+        uuid = self.uuids.get(handle.key())
+        if uuid is not None:
+            self._forget(uuid)
+
+    def _nameChanged(self,handle):
+        #the handle and its plugs stay good, only the names are stale
+        uuid = self.uuids.get(handle.key())
+        if uuid is not None:
+            for name in self.namesOf.pop(uuid,()):
+                self.names.pop(name,None)
+
+def getHandleCache():
+    '''
+    return the node handle cache of the active scene backend
+    '''
+    return getBackend().handleCache()
+
+
+# --------------------------------------------------------------
+# ACTIVE BACKEND
+# --------------------------------------------------------------
+BACKENDS = {
+    'openmaya' : OpenMayaBackend,
+    'cmds' : CmdsBackend,
+    'pymel' : PymelBackend,
+}
+
+def getBackend():
+    '''
+    return the active scene backend, OpenMaya 2 on the maya scene unless another one was set
+    '''
+    if _backend is None:
+        setBackend('openmaya')
+    return _backend
+
+def setBackend(backend):
+    '''
+    make backend the scene every CR call goes to, transactions included
+    backend is a SceneBackend or one of 'openmaya', 'cmds', 'pymel', 'memory' (a new empty scene)
+    scene caches built on the previous backend are dropped on their next use
+    '''
+    global _backend
+    #the handle cache callbacks of the previous scene are not needed anymore
+    previous = getattr(_backend,'_handleCache',None)
+    if previous is not None:
+        previous.remove()
+        _backend._handleCache = None
+    if backend == 'memory':
+        from .CR_MemoryScene import MemoryBackend
+        backend = MemoryBackend()
+    elif backend in BACKENDS:
+        backend = BACKENDS[backend]()
+    _backend = backend
+    setDefaultExecutor(backend.executor())
+    return backend
@@ -0,0 +1,409 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+
+from .CR_Graph import buildChainForest
+from .CR_Backend import setBackend
+from .CR_MemoryScene import MemoryScene,MemoryBackend
+from .CR_Units import BoundJoints,DriverSystem,ConnectorSystem,createCharacterDrivers
+from .CR_Utils import CONNECTORMODES,iterManagers,splitJointChains
+
+_clock = getattr(time,'perf_counter',time.time)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),'CR_Bench_baseline.json')
+
+# --------------------------------------------------------------
+# SYNTHETIC DATA
+# --------------------------------------------------------------
+def syntheticChain(count,seed=0):
+    '''
+    return shuffled ids and parentMap of a single chain of count joints
+    '''
+    parentMap = dict([(x,x-1 if x > 0 else None) for x in range(0,count)])
+    ids = list(range(0,count))
+    random.Random(seed).shuffle(ids)
+    return ids,parentMap
+
+def syntheticHand(count,fingers=5,seed=0):
+    '''
+    return shuffled ids and parentMap of an arm chain ending in fingers chains
+    about count joints in total, half of them in the arm
+    '''
+    armCount = max(1,count//2)
+    fingerCount = max(1,(count-armCount)//fingers)
+    parentMap = dict([(x,x-1 if x > 0 else None) for x in range(0,armCount)])
+    nextId = armCount
+    for f in range(0,fingers):
+        parent = armCount-1
+        for x in range(0,fingerCount):
+            parentMap[nextId] = parent
+            parent = nextId
+            nextId += 1
+    ids = list(parentMap)
+    random.Random(seed).shuffle(ids)
+    return ids,parentMap
+
+def legacyReorder(ids,parentMap):
+    '''
+    the list membership ordering reorderSingleChainJointList used before, for comparison
+    '''
+    children = {}
+    for i in ids:
+        children.setdefault(parentMap[i],[]).append(i)
+    reorderList = []
+    btmJnt = None
+    for j in ids:
+        isBtm = True
+        for c in children.get(j,[]):
+            if c in ids:
+                isBtm = False
+                break
+        if isBtm:
+            btmJnt = j
+            reorderList.append(btmJnt)
+            break
+    while len(reorderList) < len(ids):
+        nextJnt = parentMap[btmJnt]
+        if nextJnt in ids:
+            btmJnt = nextJnt
+            reorderList.append(btmJnt)
+        else:
+            raise AttributeError('This is not a single joint chain, unable to reorder')
+    reorderList.reverse()
+    return reorderList
+
+def _bestTime(func,repeat):
+    best = None
+    for x in range(0,repeat):
+        start = _clock()
+        func()
+        elapsed = _clock() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# --------------------------------------------------------------
+# SYNTHETIC SKELETONS (on a MemoryScene)
+# --------------------------------------------------------------
+def _jointChain(scene,parent,names,offset):
+    pm = scene.pm
+    if parent is None:
+        pm.select(cl=True)
+    else:
+        pm.select(parent)
+    jnts = []
+    for n in names:
+        j = pm.joint(n=n)
+        j.translate.set(*offset)
+        j.jointOrient.set(0,0,5)
+        jnts.append(j)
+    return jnts
+
+def chainSkeleton(scene,count):
+    '''
+    one chain of count joints under a root group, return [chain]
+    '''
+    root = scene.pm.group(empty=True,n='root')
+    return [_jointChain(scene,root,['j{}'.format(x) for x in range(0,count)],(0,1,0))]
+
+def parallelSkeleton(scene,count,length=20):
+    '''
+    count chains of length joints side by side under a root group, return the chains
+    '''
+    root = scene.pm.group(empty=True,n='root')
+    chains = []
+    for c in range(0,count):
+        chain = _jointChain(scene,root,['c{}_j{}'.format(c,x) for x in range(0,length)],(0,1,0))
+        chain[0].translate.set(c,0,0)
+        chains.append(chain)
+    return chains
+
+def bodySkeleton(scene,fingerJoints=3):
+    '''
+    a biped with spine, neck, head, arms with five fingers and legs
+    return its chains as split by splitJointChains
+    '''
+    spine = _jointChain(scene,None,['hips','spine1','spine2','spine3','chest'],(0,10,0))
+    joints = list(spine)
+    joints += _jointChain(scene,spine[-1],['neck','head','headEnd'],(0,5,0))
+    for side,x in (('L',1),('R',-1)):
+        arm = _jointChain(scene,spine[-1],[n+side for n in ('clavicle','shoulder','elbow','wrist')],(x*8,0,0))
+        joints += arm
+        for f in ('thumb','index','middle','ring','pinky'):
+            joints += _jointChain(scene,arm[-1],['{}{}{}'.format(f,x,side) for x in range(0,fingerJoints)],(x*2,0,1))
+        joints += _jointChain(scene,spine[0],[n+side for n in ('upLeg','knee','ankle','ball','toe')],(x*3,-10,0))
+    skin = scene.createNode('skinCluster','skinCluster1')
+    for x in range(0,len(joints)):
+        scene.connect((joints[x],'worldMatrix[0]'),(skin,'matrix[{}]'.format(x)))
+    return splitJointChains(joints)
+
+SKELETONS = {
+    'chain' : chainSkeleton,
+    'parallel' : parallelSkeleton,
+    'body' : bodySkeleton,
+}
+ATTRIBUTELISTS = {
+    'rotate' : ['rotateX','rotateY','rotateZ'],
+    'trs' : [a+x for a in ('translate','rotate','scale') for x in 'XYZ'],
+}
+RIGCASES = [('chain',10),('chain',100),('chain',1000),('chain',5000),('parallel',10),('parallel',100),('body',3)]
+QUICKCASES = [('chain',10),('chain',100),('parallel',10),('body',3)]
+
+# --------------------------------------------------------------
+# BENCHMARKS
+# --------------------------------------------------------------
+def benchChainOrdering(sizes=(10,100,1000,10000),repeat=3,legacyLimit=2000):
+    '''
+    time the chain ordering on single chains and hands of every size
+    the legacy ordering is quadratic so it only runs up to legacyLimit joints
+    '''
+    results = []
+    for size in sizes:
+        chainIds,chainParents = syntheticChain(size)
+        handIds,handParents = syntheticHand(size)
+        result = {
+            'size' : size,
+            'chain' : _bestTime(lambda: buildChainForest(chainIds,chainParents),repeat),
+            'hand' : _bestTime(lambda: buildChainForest(handIds,handParents),repeat),
+            'legacy' : None,
+        }
+        if size <= legacyLimit:
+            result['legacy'] = _bestTime(lambda: legacyReorder(chainIds,chainParents),repeat)
+        results.append(result)
+    return results
+
+def printChainOrdering(results):
+    print('{:>8} {:>12} {:>12} {:>12}'.format('joints','chain (ms)','hand (ms)','legacy (ms)'))
+    for r in results:
+        legacy = '-' if r['legacy'] is None else '{:.3f}'.format(r['legacy']*1000.0)
+        print('{:>8} {:>12.3f} {:>12.3f} {:>12}'.format(r['size'],r['chain']*1000.0,r['hand']*1000.0,legacy))
+
+def benchRigCase(kind,size,attributes='rotate',repeat=1,mode='direct'):
+    '''
+    build, rehydrate (from_manager of every system and a first read of its properties) then tear down default drivers
+    on a synthetic skeleton in a fresh MemoryScene, then build them again in one character batch
+    mode is the connector mode, best of repeat runs
+    return the result dict with time, scene calls and transaction ops per phase
+    and the connection count of the built character
+    '''
+    attributeList = ATTRIBUTELISTS[attributes]
+    result = None
+    for x in range(0,repeat):
+        scene = MemoryScene()
+        setBackend(MemoryBackend(scene))
+        chains = SKELETONS[kind](scene,size)
+        phases = {}
+
+        start = _startPhase(scene)
+        bounds = [BoundJoints(chain,'{}{}'.format(kind,c)) for c,chain in enumerate(chains)]
+        for b in bounds:
+            b.createDefaultDriver(attributeList,mode=mode)
+        phases['build'] = _endPhase(scene,start)
+
+        start = _startPhase(scene)
+        bounds = [BoundJoints.from_manager(m) for m in iterManagers('bound')]
+        drivers = [DriverSystem.from_manager(m) for m in iterManagers('driver')]
+        connectors = [ConnectorSystem.from_manager(m) for m in iterManagers('connector')]
+        #properties are lazy, the first read is where the scene is queried
+        for b in bounds:
+            b.jointList,b.parent,b.connectorPlugs,b.skinNodeList
+        for d in drivers:
+            d.driverJnts,d.masterGrp,d.masterGrpOffset,d.connectorPlugs
+        for c in connectors:
+            c.drvOutputs,c.bnJntInputs,c.connectorNodes,c.mode
+        phases['rehydrate'] = _endPhase(scene,start)
+
+        start = _startPhase(scene)
+        for b in bounds:
+            b.deleteDrivers()
+        phases['teardown'] = _endPhase(scene,start)
+
+        if len(list(iterManagers('driver'))) > 0 or len(list(iterManagers('connector'))) > 0:
+            raise RuntimeError('teardown of {}{} left driver or connector managers behind'.format(kind,size))
+
+        start = _startPhase(scene)
+        built = createCharacterDrivers([(b,attributeList) for b in bounds],mode=mode)
+        phases['batchBuild'] = _endPhase(scene,start)
+        errors = [name for name,r in built.items() if r['error'] is not None]
+        if len(errors) > 0:
+            raise RuntimeError('character build of {}{} failed for {}'.format(kind,size,', '.join(errors)))
+
+        if result is None:
+            result = {
+                'case' : '{}{}'.format(kind,size),
+                'attributes' : attributes,
+                'mode' : mode,
+                'connections' : len(scene._inputs),
+                'joints' : sum([len(c) for c in chains]),
+                'chains' : len(chains),
+                'systems' : len(drivers),
+                'phases' : phases,
+            }
+        else:
+            for name,phase in phases.items():
+                result['phases'][name]['time'] = min(result['phases'][name]['time'],phase['time'])
+    return result
+
+def _startPhase(scene):
+    scene.resetCalls()
+    return _clock()
+
+def _endPhase(scene,start):
+    elapsed = _clock() - start
+    top = sorted(scene.calls.items(),key=lambda item: -item[1])[:5]
+    return {'time' : elapsed,'calls' : scene.callCount(),'txOps' : scene.txOps,'topCalls' : dict(top)}
+
+def checkConnectorModes(size=5,attributes='trs',pose=((10.0,-20.0,35.0),(0.5,0.2,-0.3)),tolerance=1e-6):
+    '''
+    build a driver on an oriented chain in every connector mode, pose the driver joints
+    and raise a RuntimeError if a mode does not give the bound joints the channel values of direct mode
+    pose is the rotate and the translate offset set on every driver joint
+    return the bound rotate,translate,scale values per mode
+    '''
+    channels = ('rotate','translate','scale')
+    values = OrderedDict()
+    for mode in CONNECTORMODES:
+        scene = MemoryScene()
+        setBackend(MemoryBackend(scene))
+        chain = chainSkeleton(scene,size)[0]
+        drv,con = BoundJoints(chain,'modes').createDefaultDriver(ATTRIBUTELISTS[attributes],mode=mode)
+        rotate,offset = pose
+        for dj in drv.driverJnts:
+            node = scene.node(dj)
+            scene.setAttr(node,'rotate',rotate)
+            scene.setAttr(node,'translate',[t+o for t,o in zip(scene.getAttr(node,'translate'),offset)])
+        values[mode] = [[scene.evaluate((j,a)) for a in channels] for j in chain]
+    for mode,modeValues in values.items():
+        for j,expected,found in zip(chain,values['direct'],modeValues):
+            for a,e,f in zip(channels,expected,found):
+                if any([abs(x-y) > tolerance for x,y in zip(e,f)]):
+                    raise RuntimeError('{} connector gives {}.{} {}, direct gives {}'.format(mode,j.name(),a,tuple(f),tuple(e)))
+    return values
+
+def benchRigScaling(cases=RIGCASES,attributeLists=('rotate','trs'),repeat=1,modes=('direct',)):
+    '''
+    run benchRigCase for every skeleton case, attribute list and connector mode
+    '''
+    results = []
+    for kind,size in cases:
+        for attributes in attributeLists:
+            for mode in modes:
+                results.append(benchRigCase(kind,size,attributes,repeat,mode))
+    return results
+
+def printRigScaling(results):
+    print('{:<14} {:<7} {:<8} {:>6} {:>7} {:>7} {:<10} {:>11} {:>9} {:>9}'.format('case','attrs','mode','joints','systems','conns','phase','time (ms)','calls','tx ops'))
+    for r in results:
+        for name in ('build','rehydrate','teardown','batchBuild'):
+            phase = r['phases'][name]
+            print('{:<14} {:<7} {:<8} {:>6} {:>7} {:>7} {:<10} {:>11.2f} {:>9} {:>9}'.format(r['case'],r['attributes'],r['mode'],r['joints'],r['systems'],r['connections'],
+                                                                                       name,phase['time']*1000.0,phase['calls'],phase['txOps']))
+
+# --------------------------------------------------------------
+# BASELINE
+# --------------------------------------------------------------
+def _resultKey(result):
+    #direct mode results keep the keys of baselines saved before connector modes
+    if result.get('mode','direct') == 'direct':
+        return '{}/{}'.format(result['case'],result['attributes'])
+    return '{}/{}/{}'.format(result['case'],result['attributes'],result['mode'])
+
+def saveBaseline(results,path=BASELINE_PATH):
+    '''
+    store the time and scene calls of every case/phase as the baseline
+    '''
+    baseline = {}
+    for r in results:
+        baseline[_resultKey(r)] = dict([(name,{'time' : phase['time'],'calls' : phase['calls']}) for name,phase in r['phases'].items()])
+    with open(path,'w') as f:
+        json.dump(baseline,f,indent=2,sort_keys=True)
+    return baseline
+
+def loadBaseline(path=BASELINE_PATH):
+    with open(path,'r') as f:
+        return json.load(f)
+
+def compareToBaseline(results,baseline,timeTolerance=0.5,minTime=0.05):
+    '''
+    return one row per case/phase of the results
+    more scene calls than the baseline is a regression, so is a time over baseline*(1+timeTolerance)
+    phases faster than minTime seconds are too noisy to be timed against the baseline
+    a case/phase the baseline does not have is not gated, its row is flagged missing
+    '''
+    rows = []
+    for r in results:
+        stored = baseline.get(_resultKey(r),{})
+        for name,phase in sorted(r['phases'].items()):
+            if name not in stored:
+                rows.append({
+                    'key' : _resultKey(r),
+                    'phase' : name,
+                    'time' : phase['time'],
+                    'baselineTime' : None,
+                    'timeRatio' : None,
+                    'calls' : phase['calls'],
+                    'baselineCalls' : None,
+                    'regressed' : False,
+                    'missing' : True,
+                })
+                continue
+            ref = stored[name]
+            ratio = phase['time']/ref['time'] if ref['time'] > 0 else 1.0
+            rows.append({
+                'key' : _resultKey(r),
+                'phase' : name,
+                'time' : phase['time'],
+                'baselineTime' : ref['time'],
+                'timeRatio' : ratio,
+                'calls' : phase['calls'],
+                'baselineCalls' : ref['calls'],
+                'regressed' : phase['calls'] > ref['calls'] or (phase['time'] > minTime and ratio > 1.0+timeTolerance),
+                'missing' : False,
+            })
+    return rows
+
+def printBaselineComparison(rows):
+    print('{:<22} {:<10} {:>8} {:>9} {:>9} {:>6}'.format('case','phase','x time','calls','baseline',''))
+    for row in rows:
+        if row['missing']:
+            print('{:<22} {:<10} {:>8} {:>9} {:>9} {:>6}'.format(row['key'],row['phase'],'-',row['calls'],'-','MISSING'))
+            continue
+        flag = 'SLOWER' if row['regressed'] else ''
+        print('{:<22} {:<10} {:>8.2f} {:>9} {:>9} {:>6}'.format(row['key'],row['phase'],row['timeRatio'],row['calls'],row['baselineCalls'],flag))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='CybeRig headless benchmarks')
+    parser.add_argument('suite',nargs='?',default='rig',choices=['rig','chains'])
+    parser.add_argument('--quick',action='store_true',help='small skeletons only')
+    parser.add_argument('--repeat',type=int,default=1)
+    parser.add_argument('--mode',action='append',choices=CONNECTORMODES,help='connector mode, repeat to compare modes, direct by default')
+    parser.add_argument('--baseline',default=None,help='compare against this baseline file')
+    parser.add_argument('--save-baseline',default=None,help='write the results as the baseline file')
+    options = parser.parse_args(args)
+
+    if options.suite == 'chains':
+        printChainOrdering(benchChainOrdering(repeat=max(1,options.repeat)))
+        return 0
+
+    #the modes are only comparable if they pose the bound joints the same
+    checkConnectorModes()
+    results = benchRigScaling(QUICKCASES if options.quick else RIGCASES,repeat=options.repeat,modes=options.mode or ('direct',))
+    printRigScaling(results)
+    if options.save_baseline is not None:
+        saveBaseline(results,options.save_baseline)
+    if options.baseline is not None:
+        rows = compareToBaseline(results,loadBaseline(options.baseline))
+        printBaselineComparison(rows)
+        #an ungated case fails too, save a baseline that covers it
+        if any([row['regressed'] or row['missing'] for row in rows]):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,434 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections import OrderedDict
+
+from .CR_Profile import logger,startProfiling,stopProfiling
+
+_clock = getattr(time,'perf_counter',time.time)
+
+PACKAGE = __package__ or __name__.rsplit('.',1)[0]
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAYAPY = os.environ.get('CR_MAYAPY','mayapy')
+
+#job keys a manifest "defaults" block can set for every job
+JOB_DEFAULTS = OrderedDict([
+    ('recipe',['characterDrivers']),
+    ('args',{}),
+    ('timeout',600.0),
+    ('retries',1),
+    ('output',None),
+    ('save',False),
+])
+
+# --------------------------------------------------------------
+# MANIFEST
+# --------------------------------------------------------------
+def loadManifest(path):
+    '''
+    return the jobs of a manifest file, defaults merged and paths made absolute
+    {"defaults": {recipe, args, timeout, retries, output, save},
+     "jobs": [{"scene": path, "name": optional, ...any default overridden}]}
+    '''
+    with open(path,'r') as f:
+        manifest = json.load(f,object_pairs_hook=OrderedDict)
+    root = os.path.dirname(os.path.abspath(path))
+    defaults = dict(JOB_DEFAULTS)
+    defaults.update(manifest.get('defaults',{}))
+    jobs = []
+    names = set()
+    for entry in manifest['jobs']:
+        job = dict(defaults)
+        job.update(entry)
+        if isinstance(job['recipe'],(list,tuple)):
+            job['recipe'] = list(job['recipe'])
+        else:
+            job['recipe'] = [job['recipe']]
+        job['scene'] = os.path.join(root,job['scene'])
+        if job['output'] is not None:
+            job['output'] = os.path.join(root,job['output'])
+        name = job.get('name') or os.path.splitext(os.path.basename(job['scene']))[0]
+        #two scenes with the same file name still get their own report entry
+        base = name
+        x = 1
+        while name in names:
+            name = '{}_{}'.format(base,x)
+            x += 1
+        names.add(name)
+        job['name'] = name
+        jobs.append(job)
+    return jobs
+
+# --------------------------------------------------------------
+# RUNNER
+# --------------------------------------------------------------
+class FarmJob(object):
+    '''
+    one manifest job and its worker attempts
+    '''
+    def __init__(self,job):
+        self.job = job
+        self.attempts = []
+        self.process = None
+        self.start = None
+        self.logFile = None
+        self.resultPath = None
+
+    def name(self):
+        return self.job['name']
+
+    def launch(self,workDir,python,backend):
+        '''
+        start a worker process on this job
+        '''
+        attempt = len(self.attempts)
+        prefix = os.path.join(workDir,'{}_{}'.format(self.name(),attempt))
+        jobPath = prefix+'.job.json'
+        self.resultPath = prefix+'.result.json'
+        with open(jobPath,'w') as f:
+            json.dump(self.job,f)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([p for p in (PACKAGE_ROOT,env.get('PYTHONPATH')) if p])
+        #a file, not a pipe, a chatty worker can not block on a full pipe
+        self.logFile = open(prefix+'.log','w')
+        command = [python,'-m',PACKAGE+'.CR_Farm','worker',jobPath,self.resultPath,'--backend',backend]
+        self.process = subprocess.Popen(command,stdout=self.logFile,stderr=subprocess.STDOUT,env=env)
+        self.start = _clock()
+        logger.info('farm: started %s (attempt %d)',self.name(),attempt+1)
+
+    def poll(self):
+        '''
+        return the attempt dict once the worker is done or timed out, None while it runs
+        '''
+        elapsed = _clock() - self.start
+        if self.process.poll() is None:
+            if elapsed < self.job['timeout']:
+                return None
+            self.process.kill()
+            self.process.wait()
+            attempt = {'status' : 'timeout','time' : elapsed,'error' : 'no result after {}s'.format(self.job['timeout'])}
+        else:
+            attempt = self._readResult(elapsed)
+        self.logFile.close()
+        self.process = None
+        attempt['log'] = self.logFile.name
+        self.attempts.append(attempt)
+        return attempt
+
+    def _readResult(self,elapsed):
+        try:
+            with open(self.resultPath,'r') as f:
+                attempt = json.load(f)
+        except (IOError,OSError,ValueError):
+            return {'status' : 'failed','time' : elapsed,'error' : 'worker exited with code {} and no result'.format(self.process.returncode)}
+        attempt['wallTime'] = elapsed
+        return attempt
+
+    def report(self):
+        last = self.attempts[-1]
+        entry = OrderedDict([
+            ('name',self.name()),
+            ('scene',self.job['scene']),
+            ('recipe',self.job['recipe']),
+            ('status',last['status']),
+            ('attempts',len(self.attempts)),
+            ('time',last.get('wallTime',last.get('time'))),
+            ('error',last.get('error')),
+        ])
+        for key in ('steps','profile','traceback','log'):
+            if key in last:
+                entry[key] = last[key]
+        if len(self.attempts) > 1:
+            entry['failedAttempts'] = [dict([(k,a.get(k)) for k in ('status','time','error')]) for a in self.attempts[:-1]]
+        return entry
+
+def runFarm(jobs,workers=4,backend='openmaya',python=None,workDir=None,pollInterval=0.05):
+    '''
+    run the jobs on a pool of worker processes, one scene per worker
+    failed and timed out jobs are retried up to their retries count,
+    except the ones whose scene file is missing or can not be read
+    return the aggregated report dict
+    '''
+    if python is None:
+        python = sys.executable if backend == 'memory' else MAYAPY
+    ownWorkDir = workDir is None
+    if ownWorkDir:
+        workDir = tempfile.mkdtemp(prefix='CR_farm_')
+    start = _clock()
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    pending = [FarmJob(job) for job in jobs]
+    done = []
+    running = []
+    try:
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < workers:
+                farmJob = pending.pop(0)
+                if not os.path.exists(farmJob.job['scene']):
+                    #no worker for a missing scene, a retry would not find it either
+                    farmJob.attempts.append({'status' : 'failed','time' : 0.0,'error' : 'scene file not found: {}'.format(farmJob.job['scene']),'retry' : False})
+                    logger.warning('farm: %s scene file not found: %s',farmJob.name(),farmJob.job['scene'])
+                    done.append(farmJob)
+                    continue
+                farmJob.launch(workDir,python,backend)
+                running.append(farmJob)
+            time.sleep(pollInterval)
+            for farmJob in list(running):
+                attempt = farmJob.poll()
+                if attempt is None:
+                    continue
+                running.remove(farmJob)
+                if attempt['status'] != 'ok' and attempt.get('retry',True) and len(farmJob.attempts) <= farmJob.job['retries']:
+                    logger.warning('farm: %s %s, retrying: %s',farmJob.name(),attempt['status'],attempt.get('error'))
+                    pending.append(farmJob)
+                else:
+                    logger.info('farm: %s %s in %.2fs',farmJob.name(),attempt['status'],attempt.get('time',0.0))
+                    done.append(farmJob)
+    finally:
+        for farmJob in running:
+            farmJob.process.kill()
+            farmJob.logFile.close()
+    entries = [j.report() for j in sorted(done,key=lambda j: jobs.index(j.job))]
+    #logs of failed jobs are worth keeping
+    if ownWorkDir and all([e['status'] == 'ok' for e in entries]):
+        shutil.rmtree(workDir,ignore_errors=True)
+        workDir = None
+    statuses = [e['status'] for e in entries]
+    return OrderedDict([
+        ('started',started),
+        ('backend',backend),
+        ('workers',workers),
+        ('wallTime',_clock() - start),
+        ('workDir',workDir),
+        ('summary',OrderedDict([
+            ('jobs',len(entries)),
+            ('ok',statuses.count('ok')),
+            ('failed',statuses.count('failed')),
+            ('timeout',statuses.count('timeout')),
+            ('retried',len([e for e in entries if e['attempts'] > 1])),
+            ('jobTime',sum([e['time'] or 0.0 for e in entries])),
+        ])),
+        ('jobs',entries),
+    ])
+
+# --------------------------------------------------------------
+# WORKER
+# --------------------------------------------------------------
+def runWorker(jobPath,resultPath,backend='openmaya'):
+    '''
+    open the scene of a job, run its recipes, save it and write the result file
+    return the process exit code
+    '''
+    with open(jobPath,'r') as f:
+        job = json.load(f)
+    result = OrderedDict([('name',job['name']),('status','failed'),('error',None),('steps',[])])
+    start = _clock()
+    startProfiling()
+    try:
+        try:
+            openScene(job['scene'],backend)
+        except (IOError,OSError,ValueError):
+            #a scene file that can not be read fails the same way on every attempt
+            result['retry'] = False
+            raise
+        for recipe in job['recipe']:
+            stepStart = _clock()
+            stats = getRecipe(recipe)(job['args'])
+            result['steps'].append(OrderedDict([('recipe',recipe),('time',_clock() - stepStart),('stats',stats)]))
+        saveScene(job,backend)
+        result['status'] = 'ok'
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__,e)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        report = stopProfiling()
+        result['profile'] = {'stages' : report['stages'],'counters' : report['counters']}
+        result['time'] = _clock() - start
+        with open(resultPath,'w') as f:
+            json.dump(result,f,indent=1,default=str)
+    return 0 if result['status'] == 'ok' else 1
+
+def openScene(path,backend):
+    '''
+    open a scene file on the backend, memory scenes are json skeleton specs {"skeleton", "size"}
+    '''
+    from .CR_Backend import setBackend
+    if not os.path.exists(path):
+        raise IOError('scene file not found: {}'.format(path))
+    if backend == 'memory':
+        from .CR_MemoryScene import MemoryScene,MemoryBackend
+        from .CR_Bench import SKELETONS
+        with open(path,'r') as f:
+            spec = json.load(f)
+        scene = MemoryScene()
+        setBackend(MemoryBackend(scene))
+        SKELETONS[spec['skeleton']](scene,spec['size'])
+        return
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    import maya.cmds as cmds
+    try:
+        cmds.file(path,open=True,force=True)
+    except RuntimeError as e:
+        #maya raises RuntimeError on corrupt or unreadable scene files
+        raise IOError('cannot open scene file {}: {}'.format(path,e))
+    setBackend(backend)
+
+def saveScene(job,backend):
+    '''
+    write the job output, memory scenes save a rig snapshot, maya scenes save the file
+    '''
+    output = job.get('output')
+    if backend == 'memory':
+        if output is not None:
+            from .CR_Serialize import saveRig
+            saveRig(output)
+        return
+    import maya.cmds as cmds
+    if output is not None:
+        cmds.file(rename=output)
+    elif not job.get('save'):
+        return
+    name = cmds.file(query=True,sceneName=True)
+    cmds.file(save=True,force=True,type='mayaBinary' if name.endswith('.mb') else 'mayaAscii')
+
+# --------------------------------------------------------------
+# RECIPES
+# --------------------------------------------------------------
+def recipeBindSkeleton(args):
+    '''
+    one BoundJoints system per chain of the joints not managed yet
+    '''
+    from .CR_Backend import pm,getBackend
+    from .CR_Utils import splitJointChains
+    from .CR_Units import BoundJoints
+    joints = pm.ls(type='joint')
+    backend = getBackend()
+    managed = [b or d for b,d in zip(backend.hasAttrs(joints,'bound'),backend.hasAttrs(joints,'driver'))]
+    chains = splitJointChains([j for j,m in zip(joints,managed) if not m])
+    bounds = [BoundJoints(c,c[0].name()) for c in chains if len(c) >= args.get('minJoints',1)]
+    return {'bound' : len(bounds)}
+
+def recipeCharacterDrivers(args):
+    '''
+    default drivers for every bound system of the scene, in one character batch
+    '''
+    from .CR_Utils import iterManagers
+    from .CR_Units import BoundJoints,createCharacterDrivers
+    bounds = [BoundJoints.from_manager(m) for m in iterManagers('bound')]
+    attributeList = args.get('attributes',['rotate'])
+    results = createCharacterDrivers([(b,attributeList) for b in bounds],args.get('suffix',''),args.get('mode','direct'))
+    errors = dict([(name,r['error']) for name,r in results.items() if r['error'] is not None])
+    if len(errors) > 0 and args.get('strict',True):
+        names = sorted(errors.keys())
+        raise RuntimeError('{} chains failed ({}), {}: {}'.format(len(names),', '.join(names),names[0],errors[names[0]]))
+    return {'drivers' : len(results) - len(errors),'errors' : errors}
+
+def recipeRebuild(args):
+    '''
+    rebuild the systems of a snapshot file (args["snapshot"])
+    '''
+    from .CR_Serialize import loadRig,rebuildRig
+    managers = rebuildRig(loadRig(args['snapshot']))
+    return dict([(kind,len(nodes)) for kind,nodes in managers.items()])
+
+def recipeSnapshot(args):
+    '''
+    save the snapshot of the scene rig (args["snapshot"])
+    '''
+    from .CR_Serialize import saveRig
+    data = saveRig(args['snapshot'],args.get('binary',False))
+    return dict([(kind,len(data[kind])) for kind in ('bound','driver','connector')])
+
+def recipeHealthCheck(args):
+    '''
+    publish gate, fail the job when the scene rig has any issue (unless strict is off)
+    '''
+    from .CR_Health import checkScene
+    report = checkScene()
+    if not report['ok'] and args.get('strict',True):
+        first = report['issues'][0]
+        raise RuntimeError('{} rig issues, {} {}: {}'.format(len(report['issues']),first['check'],first['node'],first['message']))
+    return {'issues' : report['issues'],'counts' : report['counts']}
+
+def recipeCollectGarbage(args):
+    '''
+    delete the CybeRig nodes no live system reaches (args["dryRun"] only reports)
+    '''
+    from .CR_Health import collectGarbage
+    report = collectGarbage(args.get('dryRun',False))
+    return {'removed' : report['removed'],'kept' : report['kept']}
+
+RECIPES = OrderedDict([
+    ('bindSkeleton',recipeBindSkeleton),
+    ('characterDrivers',recipeCharacterDrivers),
+    ('rebuild',recipeRebuild),
+    ('snapshot',recipeSnapshot),
+    ('healthCheck',recipeHealthCheck),
+    ('collectGarbage',recipeCollectGarbage),
+])
+
+def getRecipe(name):
+    '''
+    return a recipe function from its name or a 'package.module:function' path
+    '''
+    if name in RECIPES:
+        return RECIPES[name]
+    if ':' in name:
+        moduleName,funcName = name.split(':',1)
+        return getattr(importlib.import_module(moduleName),funcName)
+    raise ValueError('unknown recipe {}'.format(name))
+
+# --------------------------------------------------------------
+# COMMAND LINE
+# --------------------------------------------------------------
+def main(args=None):
+    parser = argparse.ArgumentParser(description='CybeRig batch rig farm')
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run',help='run every job of a manifest')
+    run.add_argument('manifest')
+    run.add_argument('--workers',type=int,default=4)
+    run.add_argument('--backend',default='openmaya',help='openmaya, cmds, pymel or memory')
+    run.add_argument('--python',default=None,help='worker interpreter, mayapy by default')
+    run.add_argument('--timeout',type=float,default=None,help='override the timeout of every job')
+    run.add_argument('--retries',type=int,default=None,help='override the retries of every job')
+    run.add_argument('--report',default=None,help='write the json report to this file')
+    worker = commands.add_parser('worker',help='run one job (used by run)')
+    worker.add_argument('job')
+    worker.add_argument('result')
+    worker.add_argument('--backend',default='openmaya')
+    options = parser.parse_args(args)
+
+    if options.command == 'worker':
+        return runWorker(options.job,options.result,options.backend)
+    if options.command != 'run':
+        parser.print_help()
+        return 2
+
+    jobs = loadManifest(options.manifest)
+    for job in jobs:
+        if options.timeout is not None:
+            job['timeout'] = options.timeout
+        if options.retries is not None:
+            job['retries'] = options.retries
+    report = runFarm(jobs,options.workers,options.backend,options.python)
+    text = json.dumps(report,indent=1,default=str)
+    if options.report is not None:
+        with open(options.report,'w') as f:
+            f.write(text)
+    summary = report['summary']
+    print('{} jobs: {} ok, {} failed, {} timeout, {} retried in {:.2f}s'.format(summary['jobs'],summary['ok'],summary['failed'],summary['timeout'],summary['retried'],report['wallTime']))
+    for entry in report['jobs']:
+        if entry['status'] != 'ok':
+            print('  {} {}: {}'.format(entry['name'],entry['status'],entry['error']))
+    return 0 if summary['ok'] == summary['jobs'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
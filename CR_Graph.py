@@ -0,0 +1,51 @@
+def buildChainForest(ids,parentMap,labels=None):
+    '''
+    split ids into ordered chains (top to bottom) using their parent relation
+    parentMap maps an id to its parent id (None at world), it may also hold
+    the ancestors of the top joints so gaps can be detected
+    a chain goes on through single children and stops at a branching joint,
+    every child of a branching joint starts a new chain
+    raise AttributeError on duplicates, gaps and cycles
+    '''
+    labels = labels if labels is not None else {}
+    idSet = set(ids)
+    if len(idSet) != len(ids):
+        raise AttributeError('joint list has duplicated joints, unable to reorder')
+
+    children = dict([(i,[]) for i in ids])
+    roots = []
+    for i in ids:
+        p = parentMap.get(i)
+        if p in idSet:
+            children[p].append(i)
+        else:
+            roots.append(i)
+
+    #a top joint with an ancestor in the list means a joint is missing in between
+    for r in roots:
+        seen = set()
+        p = parentMap.get(r)
+        while (p is not None) and (p not in seen):
+            if p in idSet:
+                raise AttributeError('gap in joint chain, joints between {} and {} are missing'.format(labels.get(p,p),labels.get(r,r)))
+            seen.add(p)
+            p = parentMap.get(p)
+
+    chains = []
+    visitedCount = 0
+    stack = list(reversed(roots))
+    while len(stack) > 0:
+        current = stack.pop()
+        chain = [current]
+        while len(children[current]) == 1:
+            current = children[current][0]
+            chain.append(current)
+        chains.append(chain)
+        visitedCount += len(chain)
+        stack.extend(reversed(children[current]))
+
+    if visitedCount != len(ids):
+        visited = set([i for chain in chains for i in chain])
+        cycle = [labels.get(i,i) for i in ids if i not in visited]
+        raise AttributeError('joints are parented in a cycle: {}'.format(cycle))
+    return chains
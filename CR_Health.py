@@ -0,0 +1,339 @@
+import time
+from collections import OrderedDict
+
+from .CR_Backend import cmds,getBackend
+from .CR_Graph import buildChainForest
+from .CR_Utils import MANAGERKINDS,getManagerRegistry,getNodes,releaseDriverManagerSlot,_slotIndex,_connectorIndex
+from .CR_Transaction import undoChunk
+from .CR_Profile import logger,span
+
+_clock = getattr(time,'perf_counter',time.time)
+
+HEALTHCHECKS = OrderedDict([
+    ('brokenChain','joints of a manager are not one single joint chain'),
+    ('emptyManager','bound or driver manager without any joint'),
+    ('missingMasterGroup','driver manager without its master group or master group offset'),
+    ('danglingConnector','connector manager missing its driver, its bound slot or its connector node'),
+    ('staleSlot','bound manager slot fed by something else than a connector manager'),
+    ('orphanConnector','connector node not owned by any connector manager'),
+    ('orphanHelper','matrix connector helper node not owned by any connector manager'),
+    ('danglingPlug','connector plug pair wired on one side only or outside its driver and bound joints'),
+])
+
+def checkScene():
+    '''
+    load the manager graph of the scene in one pass and report every problem found
+    a fixed amount of bulk queries whatever the amount of systems, nothing raises on the way
+    return the report dict {'ok','issues','counts','time'}, issues are {'check','node','message'}
+    '''
+    start = _clock()
+    issues = []
+    with span('load'):
+        names,boundNodes,driverJoints,masterGrps,connectorNodes,drvOfConnector,slotsOfConnector = _loadGraph()
+        slotSources = _boundSlotSources(names['bound'])
+        pairs = _connectorPairs([n for nodes in connectorNodes.values() for n in nodes])
+
+    with span('chains'):
+        _checkChains(boundNodes,issues)
+        _checkChains(driverJoints,issues)
+
+    with span('systems'):
+        for manager,(masterGrp,masterGrpOffset) in masterGrps.items():
+            missing = [a for a,n in (('masterGrp',masterGrp),('masterGrpOffset',masterGrpOffset)) if n is None]
+            if len(missing) > 0:
+                _report(issues,'missingMasterGroup',manager,'no {}'.format(' or '.join(missing)))
+
+        connectors = set(names['connector'])
+        for slot,source in slotSources:
+            if source not in connectors:
+                _report(issues,'staleSlot',slot,'fed by {} which is not a connector manager'.format(source))
+
+        bounds = set(names['bound'])
+        drivers = set(names['driver'])
+        for manager in names['connector']:
+            drvManager = drvOfConnector.get(manager)
+            slots = slotsOfConnector.get(manager,[])
+            boundManagers = [s.split('.')[0] for s in slots]
+            if drvManager is None or drvManager not in drivers:
+                _report(issues,'danglingConnector',manager,'no driver manager')
+            if len(slots) == 0 or any([b not in bounds for b in boundManagers]):
+                _report(issues,'danglingConnector',manager,'not hooked to a bound manager slot')
+            if len(connectorNodes[manager]) == 0:
+                _report(issues,'danglingConnector',manager,'no connector node')
+            drvSet = set(driverJoints.get(drvManager,[]))
+            bnSet = set([j for b in boundManagers for j in boundNodes.get(b,[])])
+            for node in connectorNodes[manager]:
+                _checkPairs(node,pairs.get(node,({},{})),drvSet,bnSet,issues)
+
+        for node in _orphanConnectors(connectorNodes):
+            _report(issues,'orphanConnector',node,'not owned by any connector manager')
+        for node in _orphanHelpers():
+            _report(issues,'orphanHelper',node,'not owned by any connector manager')
+
+    report = OrderedDict([
+        ('ok',len(issues) == 0),
+        ('issues',issues),
+        ('counts',OrderedDict([
+            ('bound',len(names['bound'])),
+            ('driver',len(names['driver'])),
+            ('connector',len(names['connector'])),
+            ('joints',sum([len(j) for j in boundNodes.values()]) + sum([len(j) for j in driverJoints.values()])),
+            ('pairs',sum([len(p[0]) for p in pairs.values()])),
+        ])),
+        ('time',_clock()-start),
+    ])
+    logger.info('health check: %d issues in %d systems (%.3fs)',len(issues),sum(report['counts'][k] for k in MANAGERKINDS),report['time'])
+    return report
+
+def formatReport(report):
+    '''
+    return the report as readable lines, one per issue
+    '''
+    lines = ['{} issues, {} bound, {} driver, {} connector systems, {} joints in {:.3f}s'.format(
+        len(report['issues']),report['counts']['bound'],report['counts']['driver'],
+        report['counts']['connector'],report['counts']['joints'],report['time'])]
+    for issue in report['issues']:
+        lines.append('  {:<20} {}: {}'.format(issue['check'],issue['node'],issue['message']))
+    return lines
+
+def _report(issues,check,node,message):
+    issues.append(OrderedDict([('check',check),('node',node),('message',message)]))
+
+# --------------------------------------------------------------
+# GARBAGE COLLECTION
+# --------------------------------------------------------------
+GARBAGEKINDS = ('boundManager','driverManager','connectorManager','connector','masterGrp')
+
+def collectGarbage(dryRun=False):
+    '''
+    delete every CybeRig node that no live system reaches, in one batched delete
+    live systems: bound and driver managers with joints, connector managers tied to both
+    dead managers, connector nodes and master groups outside live systems are garbage
+    master groups still holding driver joints of a live system are kept
+    dryRun only reports, return the report dict {'dryRun','removed','kept','count','time'}
+    '''
+    start = _clock()
+    with span('load'):
+        names,boundNodes,driverJoints,masterGrps,connectorNodes,drvOfConnector,slotsOfConnector = _loadGraph()
+
+    with span('reach'):
+        liveBounds = set([b for b in names['bound'] if len(boundNodes[b]) > 0])
+        liveDrivers = set([d for d in names['driver'] if len(driverJoints[d]) > 0])
+        liveConnectors = set()
+        for manager in names['connector']:
+            slots = slotsOfConnector.get(manager,[])
+            if (drvOfConnector.get(manager) in liveDrivers) and len(connectorNodes[manager]) > 0 and \
+                    len(slots) > 0 and all([s.split('.')[0] in liveBounds for s in slots]):
+                liveConnectors.add(manager)
+
+        removed = OrderedDict([(kind,[]) for kind in GARBAGEKINDS])
+        removed['boundManager'] = [b for b in names['bound'] if b not in liveBounds]
+        removed['driverManager'] = [d for d in names['driver'] if d not in liveDrivers]
+        removed['connectorManager'] = [c for c in names['connector'] if c not in liveConnectors]
+        #connector nodes of removed managers go with their matrix helper nodes
+        owned = _outputsOf(removed['connectorManager'],'cntMng')
+        removed['connector'] = [n for c in removed['connectorManager'] for n in owned[c]] + _orphanConnectors(connectorNodes) + _orphanHelpers()
+
+        liveGrps = set([g for d in liveDrivers for g in masterGrps[d] if g is not None])
+        groups = cmds.ls(['*.driverGrp','*.driverGrpOffset'],objectsOnly=True) or []
+        candidates = [g for g in OrderedDict.fromkeys(groups) if g not in liveGrps]
+        kept = _groupsHoldingJoints(candidates,[j for d in liveDrivers for j in driverJoints[d]])
+        removed['masterGrp'] = [g for g in candidates if g not in kept]
+
+    nodes = [n for kind in GARBAGEKINDS for n in removed[kind]]
+    if not dryRun and len(nodes) > 0:
+        with span('delete'):
+            #slots of live bound managers freed by dead connectors
+            freed = [s for c in removed['connectorManager'] for s in slotsOfConnector.get(c,[]) if s.split('.')[0] in liveBounds]
+            with undoChunk('CR_collectGarbage'):
+                getBackend().deleteNodes(nodes)
+            for slot in freed:
+                releaseDriverManagerSlot(getNodes([slot.split('.')[0]])[0],_slotIndex(slot))
+
+    report = OrderedDict([
+        ('dryRun',dryRun),
+        ('removed',removed),
+        ('kept',kept),
+        ('count',len(nodes)),
+        ('time',_clock()-start),
+    ])
+    logger.info('garbage collection: %s %d nodes (%.3fs)','would remove' if dryRun else 'removed',len(nodes),report['time'])
+    return report
+
+def _groupsHoldingJoints(groups,joints):
+    #groups with one of the joints below them, one parent pass
+    if len(groups) == 0 or len(joints) == 0:
+        return []
+    ids,parentMap,labels = getBackend().parentMap(groups+joints)
+    groupIds = dict(zip(ids[:len(groups)],groups))
+    holding = set()
+    for i in ids[len(groups):]:
+        p = parentMap.get(i)
+        while p is not None:
+            if p in groupIds:
+                holding.add(groupIds[p])
+            p = parentMap.get(p)
+    return [g for g in groups if g in holding]
+
+# --------------------------------------------------------------
+# BULK LOADS
+# --------------------------------------------------------------
+def _loadGraph():
+    #every manager with its joints, master groups, connector nodes and links, one query per plug kind
+    registry = getManagerRegistry()
+    names = dict([(kind,list(registry.iterNames(kind))) for kind in MANAGERKINDS])
+    boundNodes = _outputsOf(names['bound'],'boundMng')
+    driverNodes = _outputsOf(names['driver'],'drvMng')
+    connectorNodes = _withoutHelpers(_outputsOf(names['connector'],'cntMng'))
+    driverJoints,masterGrps = _splitDriverNodes(driverNodes)
+    drvOfConnector,slotsOfConnector = _connectorManagerLinks(names['connector'])
+    return names,boundNodes,driverJoints,masterGrps,connectorNodes,drvOfConnector,slotsOfConnector
+
+def _outputsOf(managers,attrName):
+    #destinations of every manager.attrName with one query
+    outputs = OrderedDict([(m,[]) for m in managers])
+    if len(managers) == 0:
+        return outputs
+    found = cmds.listConnections([m+'.'+attrName for m in managers],source=False,destination=True,connections=True) or []
+    for plug,node in zip(found[0::2],found[1::2]):
+        outputs.setdefault(plug.split('.')[0],[]).append(node)
+    return outputs
+
+def _withoutHelpers(connectorNodes):
+    #matrix connectors also own helper nodes, one attribute query when any manager has more than its connector
+    nodes = [n for ns in connectorNodes.values() if len(ns) > 1 for n in ns]
+    if len(nodes) == 0:
+        return connectorNodes
+    helpers = set([n for n,f in zip(nodes,getBackend().hasAttrs(nodes,'connectorHelper')) if f])
+    return OrderedDict([(m,[n for n in ns if n not in helpers]) for m,ns in connectorNodes.items()])
+
+def _splitDriverNodes(driverNodes):
+    #driver joints and master groups of every driver manager, one attribute query per marker
+    nodes = [n for ns in driverNodes.values() for n in ns]
+    backend = getBackend()
+    isGrp = iter(backend.hasAttrs(nodes,'driverGrp') if len(nodes) > 0 else [])
+    isOffset = iter(backend.hasAttrs(nodes,'driverGrpOffset') if len(nodes) > 0 else [])
+    joints = OrderedDict()
+    masterGrps = OrderedDict()
+    for manager,ns in driverNodes.items():
+        joints[manager] = []
+        masterGrp,masterGrpOffset = None,None
+        for n in ns:
+            g,o = next(isGrp),next(isOffset)
+            if g:
+                masterGrp = n
+            elif o:
+                masterGrpOffset = n
+            else:
+                joints[manager].append(n)
+        masterGrps[manager] = (masterGrp,masterGrpOffset)
+    return joints,masterGrps
+
+def _connectorManagerLinks(managers):
+    #driver manager feeding and bound slots fed by every connector manager
+    drvOfConnector = {}
+    slotsOfConnector = {}
+    if len(managers) == 0:
+        return drvOfConnector,slotsOfConnector
+    plugs = [m+'.Manager' for m in managers]
+    inputs = cmds.listConnections(plugs,source=True,destination=False,connections=True) or []
+    for plug,node in zip(inputs[0::2],inputs[1::2]):
+        drvOfConnector[plug.split('.')[0]] = node
+    outputs = cmds.listConnections(plugs,source=False,destination=True,connections=True,plugs=True) or []
+    for plug,slot in zip(outputs[0::2],outputs[1::2]):
+        slotsOfConnector.setdefault(plug.split('.')[0],[]).append(slot)
+    return drvOfConnector,slotsOfConnector
+
+def _boundSlotSources(managers):
+    #(slot plug,source node) of every wired Manager[] slot, old Manager0..9 slots too
+    if len(managers) == 0:
+        return []
+    plugs = cmds.ls([m+'.Manager' for m in managers] + [m+'.Manager'+str(x) for m in managers for x in range(0,10)]) or []
+    found = cmds.listConnections(plugs,source=True,destination=False,connections=True) or []
+    return list(zip(found[0::2],found[1::2]))
+
+def _orphanConnectors(connectorNodes):
+    #connector nodes no connector manager owns, found by their c[] or old c_### pair attributes
+    #so old transform connectors and the ones of referenced rigs (ns:connector_*) are found too
+    owned = set([n for nodes in connectorNodes.values() for n in nodes])
+    backend = getBackend()
+    names = OrderedDict.fromkeys([h.name() for a in ('c','c_000') for h in backend.nodesWithAttr(a)])
+    candidates = [n for n in names if n not in owned]
+    if len(candidates) == 0:
+        return []
+    #c is a common short attribute name, connectors also hold the connector attribute
+    return [n for n,f in zip(candidates,backend.hasAttrs(candidates,'connector')) if f]
+
+def _orphanHelpers():
+    #matrix connector helper nodes whose connectorHelper input from a connector manager is gone
+    backend = getBackend()
+    helpers = list(OrderedDict.fromkeys([h.name() for h in backend.nodesWithAttr('connectorHelper')]))
+    if len(helpers) == 0:
+        return []
+    return [h for h,wired in zip(helpers,backend.isDestination([(h,'connectorHelper') for h in helpers])) if not wired]
+
+def _connectorPairs(nodes):
+    #connector node: ({index: driver output},{index: bound input}), one query per direction
+    pairs = OrderedDict([(n,({},{})) for n in nodes])
+    if len(nodes) == 0:
+        return pairs
+    plugs = []
+    for n,hasMulti in zip(nodes,getBackend().hasAttrs(nodes,'c')):
+        if hasMulti:
+            plugs.append(n+'.c')
+        else:
+            #old connectors, one c_### attribute per pair
+            plugs.extend([n+'.'+a for a in cmds.listAttr(n,userDefined=True,string='c_*') or []])
+    if len(plugs) == 0:
+        return pairs
+    for side,kwargs in ((0,{'source' : True,'destination' : False}),(1,{'source' : False,'destination' : True})):
+        found = cmds.listConnections(plugs,connections=True,plugs=True,skipConversionNodes=True,**kwargs) or []
+        for plug,other in zip(found[0::2],found[1::2]):
+            pairs[plug.split('.')[0]][side][_connectorIndex(plug)] = other
+    return pairs
+
+# --------------------------------------------------------------
+# CHECKS
+# --------------------------------------------------------------
+def _checkChains(jointsOf,issues):
+    #one joint type query and one parent pass for the joints of every manager
+    allJoints = list(OrderedDict.fromkeys([j for joints in jointsOf.values() for j in joints]))
+    if len(allJoints) == 0:
+        for manager in jointsOf:
+            _report(issues,'emptyManager',manager,'no joints')
+        return
+    isJoint = set(cmds.ls(allJoints,type='joint') or [])
+    ids,parentMap,labels = getBackend().parentMap(allJoints)
+    idOf = dict(zip(allJoints,ids))
+    owner = {}
+    for manager,joints in jointsOf.items():
+        if len(joints) == 0:
+            _report(issues,'emptyManager',manager,'no joints')
+            continue
+        notJoints = [j for j in joints if j not in isJoint]
+        if len(notJoints) > 0:
+            _report(issues,'brokenChain',manager,'not joints: {}'.format(', '.join(notJoints)))
+            continue
+        shared = [j for j in joints if owner.setdefault(j,manager) != manager]
+        if len(shared) > 0:
+            _report(issues,'brokenChain',manager,'joints also managed by {}: {}'.format(owner[shared[0]],', '.join(shared)))
+        try:
+            chains = buildChainForest([idOf[j] for j in joints],parentMap,labels)
+        except AttributeError as e:
+            _report(issues,'brokenChain',manager,str(e))
+            continue
+        if len(chains) > 1:
+            _report(issues,'brokenChain',manager,'{} chains instead of one, starting at {}'.format(len(chains),', '.join([labels[c[0]] for c in chains])))
+
+def _checkPairs(node,pairs,drvJoints,bnJoints,issues):
+    drvOutputs,bnInputs = pairs
+    for index in sorted(set(drvOutputs) ^ set(bnInputs)):
+        side = 'driver output' if index in bnInputs else 'bound input'
+        _report(issues,'danglingPlug',node,'pair {} has no {}'.format(index,side))
+    for index in sorted(set(drvOutputs) & set(bnInputs)):
+        drvNode = drvOutputs[index].split('.')[0]
+        bnNode = bnInputs[index].split('.')[0]
+        if drvNode not in drvJoints:
+            _report(issues,'danglingPlug',node,'pair {} is driven by {}, not a joint of its driver'.format(index,drvOutputs[index]))
+        if bnNode not in bnJoints:
+            _report(issues,'danglingPlug',node,'pair {} drives {}, not a joint of its bound system'.format(index,bnInputs[index]))
@@ -0,0 +1,406 @@
+import math
+
+#optional, maya does not always ship it
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+#maya rotateOrder enum: xyz, yzx, zxy, xzy, yxz, zyx
+ROTATEORDERS = [(0,1,2),(1,2,0),(2,0,1),(0,2,1),(1,0,2),(2,1,0)]
+#smallest batch solved with numpy
+NUMPYBATCH = 32
+#second singular value under this ratio of the first, the points are on a line
+PLANETOLERANCE = 1e-10
+
+# --------------------------------------------------------------
+# 4x4 MATRICES (row vectors, same as maya: world = local * parentWorld)
+# --------------------------------------------------------------
+def identity():
+    return [[1.0,0.0,0.0,0.0],[0.0,1.0,0.0,0.0],[0.0,0.0,1.0,0.0],[0.0,0.0,0.0,1.0]]
+
+def multiply(a,b):
+    '''
+    return a * b
+    '''
+    return [[a[r][0]*b[0][c] + a[r][1]*b[1][c] + a[r][2]*b[2][c] + a[r][3]*b[3][c] for c in range(4)] for r in range(4)]
+
+def inverse(m):
+    '''
+    return the inverse of a 4x4 matrix (gauss-jordan with partial pivoting)
+    '''
+    a = [list(m[r]) + [1.0 if r == c else 0.0 for c in range(4)] for r in range(4)]
+    for c in range(4):
+        pivot = max(range(c,4),key=lambda r: abs(a[r][c]))
+        if abs(a[pivot][c]) < 1e-12:
+            raise ValueError('matrix is not invertible')
+        a[c],a[pivot] = a[pivot],a[c]
+        p = a[c][c]
+        a[c] = [v/p for v in a[c]]
+        for r in range(4):
+            if r != c and a[r][c] != 0.0:
+                f = a[r][c]
+                a[r] = [a[r][x] - f*a[c][x] for x in range(8)]
+    return [row[4:] for row in a]
+
+def translationMatrix(t):
+    m = identity()
+    m[3][0],m[3][1],m[3][2] = t[0],t[1],t[2]
+    return m
+
+def scaleMatrix(s):
+    m = identity()
+    m[0][0],m[1][1],m[2][2] = s[0],s[1],s[2]
+    return m
+
+def axisRotationMatrix(axis,degrees):
+    '''
+    return the rotation matrix of one axis (0,1,2), in degrees
+    '''
+    r = math.radians(degrees)
+    c,s = math.cos(r),math.sin(r)
+    m = identity()
+    i,j = [(1,2),(2,0),(0,1)][axis]
+    m[i][i],m[i][j] = c,s
+    m[j][i],m[j][j] = -s,c
+    return m
+
+def eulerToMatrix(rotate,rotateOrder=0):
+    '''
+    return the rotation matrix of euler angles in degrees, first axis of the order applied first
+    '''
+    m = identity()
+    for axis in ROTATEORDERS[rotateOrder]:
+        m = multiply(m,axisRotationMatrix(axis,rotate[axis]))
+    return m
+
+def matrixToEuler(m,rotateOrder=0):
+    '''
+    return the euler angles in degrees of the rotation part of a matrix
+    scale and shear are removed first
+    '''
+    r = orthonormalize(m)
+    order = ROTATEORDERS[rotateOrder]
+    #permute the axes so the order becomes xyz, odd permutations flip the angles
+    sign = 1.0 if rotateOrder < 3 else -1.0
+    p = [[r[order[i]][order[j]] for j in range(3)] for i in range(3)]
+    sy = max(-1.0,min(1.0,-p[0][2]))
+    y = math.asin(sy)
+    if abs(math.cos(y)) > 1e-9:
+        x = math.atan2(p[1][2],p[2][2])
+        z = math.atan2(p[0][1],p[0][0])
+    else:
+        x = math.atan2(-p[2][1],p[1][1])
+        z = 0.0
+    angles = [0.0,0.0,0.0]
+    for axis,value in zip(order,(x,y,z)):
+        angles[axis] = math.degrees(value)*sign
+    return angles
+
+def orthonormalize(m):
+    '''
+    return the pure rotation of a matrix, gram-schmidt on the x, y then z rows (maya shear order)
+    '''
+    rows = []
+    for i in range(3):
+        v = list(m[i][:3])
+        for u in rows:
+            d = v[0]*u[0] + v[1]*u[1] + v[2]*u[2]
+            v = [v[0]-d*u[0],v[1]-d*u[1],v[2]-d*u[2]]
+        length = math.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
+        rows.append([v[0]/length,v[1]/length,v[2]/length])
+    #keep a right handed frame when the matrix mirrors
+    cross = [rows[0][1]*rows[1][2]-rows[0][2]*rows[1][1],rows[0][2]*rows[1][0]-rows[0][0]*rows[1][2],rows[0][0]*rows[1][1]-rows[0][1]*rows[1][0]]
+    if cross[0]*rows[2][0] + cross[1]*rows[2][1] + cross[2]*rows[2][2] < 0:
+        rows[2] = [-v for v in rows[2]]
+    return [rows[0]+[0.0],rows[1]+[0.0],rows[2]+[0.0],[0.0,0.0,0.0,1.0]]
+
+def rigid(m):
+    '''
+    return the matrix without scale and shear: rotation and translation only
+    '''
+    r = orthonormalize(m)
+    r[3] = [m[3][0],m[3][1],m[3][2],1.0]
+    return r
+
+def translation(m):
+    return [m[3][0],m[3][1],m[3][2]]
+
+def composeMatrix(translate,rotate,scale=(1.0,1.0,1.0),rotateOrder=0,jointOrient=None,inverseScale=None):
+    '''
+    return the local matrix of a transform [S][R][T] or a joint [S][R][JO][IS][T]
+    '''
+    m = multiply(scaleMatrix(scale),eulerToMatrix(rotate,rotateOrder))
+    if jointOrient is not None:
+        m = multiply(m,eulerToMatrix(jointOrient))
+    if inverseScale is not None:
+        m = multiply(m,scaleMatrix([1.0/s for s in inverseScale]))
+    return multiply(m,translationMatrix(translate))
+
+def isClose(a,b,tolerance=1e-6):
+    '''
+    return True if two matrices match within tolerance
+    '''
+    return all([abs(a[r][c]-b[r][c]) <= tolerance for r in range(4) for c in range(4)])
+
+def alignLocal(world,parentWorld,rotateOrder=0,jointOrient=None,inverseScale=None):
+    '''
+    return translate,rotate putting a transform at the position and orientation of a world matrix
+    the transform keeps its own scale, same solve as a parentConstraint without offset
+    '''
+    local = multiply(world,inverse(parentWorld))
+    m = local
+    if inverseScale is not None:
+        m = multiply(m,scaleMatrix(inverseScale))
+    rotation = orthonormalize(m)
+    if jointOrient is not None:
+        rotation = multiply(rotation,inverse(eulerToMatrix(jointOrient)))
+    return translation(local),matrixToEuler(rotation,rotateOrder)
+
+def alignLocals(worlds,parentWorlds,rotateOrders,jointOrients,inverseScales):
+    '''
+    alignLocal over lists, jointOrients and inverseScales items are None for plain transforms
+    solved as arrays when numpy is there and the batch is big enough to pay for it
+    '''
+    if (_np is not None) and len(worlds) >= NUMPYBATCH:
+        return _npAlignLocals(worlds,parentWorlds,rotateOrders,jointOrients,inverseScales)
+    return [alignLocal(*args) for args in zip(worlds,parentWorlds,rotateOrders,jointOrients,inverseScales)]
+
+# --------------------------------------------------------------
+# PLANES AND AIM FRAMES
+# --------------------------------------------------------------
+def fitPlane(points):
+    '''
+    return the least squares (centroid,normal) plane of points, the smallest singular vector of the centered points
+    the normal follows the bend of the ordered points, it is None when the points do not span a plane
+    '''
+    count = len(points)
+    centroid = [sum([p[c] for p in points])/count for c in range(3)]
+    centered = [[p[c]-centroid[c] for c in range(3)] for p in points]
+    covariance = [[sum([v[i]*v[j] for v in centered]) for j in range(3)] for i in range(3)]
+    values,vectors = _symmetricEigen(covariance)
+    order = sorted(range(3),key=lambda i: -values[i])
+    if count < 3 or values[order[1]] <= PLANETOLERANCE*values[order[0]]:
+        return centroid,None
+    normal = [vectors[r][order[2]] for r in range(3)]
+    return centroid,_bendSign(points,normal)
+
+def fitPlanes(pointLists):
+    '''
+    fitPlane over lists of points, solved as arrays when numpy is there and the batch is big enough
+    '''
+    if (_np is not None) and len(pointLists) >= NUMPYBATCH:
+        return _npFitPlanes(pointLists)
+    return [fitPlane(p) for p in pointLists]
+
+def planeDistances(points,plane):
+    '''
+    return the signed distance of every point to a (centroid,normal) plane, 0.0 without normal
+    '''
+    centroid,normal = plane
+    if normal is None:
+        return [0.0]*len(points)
+    return [sum([(p[c]-centroid[c])*normal[c] for c in range(3)]) for p in points]
+
+def projectOnPlane(points,plane):
+    '''
+    return the points moved along the normal onto a (centroid,normal) plane
+    '''
+    normal = plane[1]
+    if normal is None:
+        return [list(p) for p in points]
+    return [[p[c]-d*normal[c] for c in range(3)] for p,d in zip(points,planeDistances(points,plane))]
+
+def aimMatrix(position,target,up,aimAxis='x',upAxis='y'):
+    '''
+    return the world matrix at position with aimAxis pointing at target and upAxis towards up
+    axes are 'x', 'y' or 'z', '-' in front flips them
+    '''
+    aim = _normalized([target[c]-position[c] for c in range(3)])
+    d = sum([up[c]*aim[c] for c in range(3)])
+    upVector = _normalized([up[c]-d*aim[c] for c in range(3)])
+    if (aim is None) or (upVector is None):
+        raise ValueError('cannot aim from {} to {} with up {}'.format(position,target,up))
+    a,aimSign = _axis(aimAxis)
+    u,upSign = _axis(upAxis)
+    if a == u:
+        raise ValueError('aim and up axis are both {}'.format('xyz'[a]))
+    rows = [None,None,None]
+    rows[a] = [v*aimSign for v in aim]
+    rows[u] = [v*upSign for v in upVector]
+    #third axis keeps the frame right handed
+    w = 3-a-u
+    first,second = (rows[(w+1)%3],rows[(w+2)%3])
+    rows[w] = _cross(first,second)
+    return [rows[0]+[0.0],rows[1]+[0.0],rows[2]+[0.0],[position[0],position[1],position[2],1.0]]
+
+def _axis(name):
+    #'x' -> (0,1.0), '-z' -> (2,-1.0)
+    sign = -1.0 if name.startswith('-') else 1.0
+    return 'xyz'.index(name.lstrip('-+')),sign
+
+def _cross(a,b):
+    return [a[1]*b[2]-a[2]*b[1],a[2]*b[0]-a[0]*b[2],a[0]*b[1]-a[1]*b[0]]
+
+def _normalized(v):
+    length = math.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
+    if length < 1e-12:
+        return None
+    return [v[0]/length,v[1]/length,v[2]/length]
+
+def _bendSign(points,normal):
+    #flip the normal to the side the ordered points turn around, a stable up for a chain
+    bend = [0.0,0.0,0.0]
+    for x in range(0,len(points)-2):
+        a = [points[x+1][c]-points[x][c] for c in range(3)]
+        b = [points[x+2][c]-points[x+1][c] for c in range(3)]
+        bend = [v+w for v,w in zip(bend,_cross(a,b))]
+    if sum([bend[c]*normal[c] for c in range(3)]) < 0:
+        return [-v for v in normal]
+    return normal
+
+def _symmetricEigen(a,sweeps=32):
+    #cyclic jacobi on a symmetric 3x3, return the eigen values and the eigen vectors as columns
+    a = [list(row) for row in a]
+    v = identity()
+    for sweep in range(0,sweeps):
+        if a[0][1]**2 + a[0][2]**2 + a[1][2]**2 < 1e-30:
+            break
+        for p,q in ((0,1),(0,2),(1,2)):
+            if a[p][q] == 0.0:
+                continue
+            theta = (a[q][q]-a[p][p])/(2.0*a[p][q])
+            t = (1.0 if theta >= 0.0 else -1.0)/(abs(theta) + math.sqrt(theta*theta + 1.0))
+            c = 1.0/math.sqrt(t*t + 1.0)
+            s = t*c
+            for k in range(3):
+                a[k][p],a[k][q] = c*a[k][p] - s*a[k][q],s*a[k][p] + c*a[k][q]
+            for k in range(3):
+                a[p][k],a[q][k] = c*a[p][k] - s*a[q][k],s*a[p][k] + c*a[q][k]
+            for k in range(3):
+                v[k][p],v[k][q] = c*v[k][p] - s*v[k][q],s*v[k][p] + c*v[k][q]
+    return [a[0][0],a[1][1],a[2][2]],[row[:3] for row in v[:3]]
+
+# --------------------------------------------------------------
+# MIRRORING (across the plane through the origin normal to an axis)
+# --------------------------------------------------------------
+def mirrorMatrices(matrices,axis='x',behavior=True):
+    '''
+    return world matrices mirrored across the plane normal to axis, x mirrors across yz
+    behavior negates the mirrored axes like mirrorJoint -mirrorBehavior, the frames stay right handed
+    otherwise the orientation is kept and only the positions are mirrored
+    '''
+    a = 'xyz'.index(axis)
+    if (_np is not None) and len(matrices) >= NUMPYBATCH:
+        return _npMirrorMatrices(matrices,a,behavior)
+    mirrored = []
+    for m in matrices:
+        rows = [list(row) for row in m]
+        if behavior:
+            for r in range(3):
+                rows[r] = [v if c == a else -v for c,v in enumerate(rows[r])]
+        rows[3][a] = -rows[3][a]
+        mirrored.append(rows)
+    return mirrored
+
+def mirrorPoints(pointLists,worlds,mirrored,axis='x'):
+    '''
+    return the object space points of shapes under worlds, moved under the mirrored worlds
+    so that they land mirrored across the plane normal to axis, one point list per world
+    '''
+    s = [1.0,1.0,1.0]
+    s['xyz'.index(axis)] = -1.0
+    mirror = scaleMatrix(s)
+    #object space under worlds -> mirrored world space -> object space under mirrored
+    changes = [multiply(multiply(w,mirror),inverse(m)) for w,m in zip(worlds,mirrored)]
+    if (_np is not None) and sum([len(p) for p in pointLists]) >= NUMPYBATCH:
+        return _npTransformPoints(pointLists,changes)
+    results = []
+    for points,c in zip(pointLists,changes):
+        results.append([tuple([p[0]*c[0][k] + p[1]*c[1][k] + p[2]*c[2][k] + c[3][k] for k in range(3)]) for p in points])
+    return results
+
+# --------------------------------------------------------------
+# NUMPY BATCHES
+# --------------------------------------------------------------
+def _npEulerToMatrices(angles,rotateOrders):
+    #(n,3) degrees -> (n,3,3) rotations
+    count = len(angles)
+    r = _np.radians(_np.asarray(angles,dtype=float))
+    c,s = _np.cos(r),_np.sin(r)
+    axes = _np.zeros((3,count,3,3))
+    for axis,(i,j) in enumerate([(1,2),(2,0),(0,1)]):
+        axes[axis,:,axis,axis] = 1.0
+        axes[axis,:,i,i] = c[:,axis]
+        axes[axis,:,i,j] = s[:,axis]
+        axes[axis,:,j,i] = -s[:,axis]
+        axes[axis,:,j,j] = c[:,axis]
+    orders = _np.asarray([ROTATEORDERS[o] for o in rotateOrders]).reshape(count,3)
+    rows = _np.arange(count)
+    m = axes[orders[:,0],rows]
+    m = _np.matmul(m,axes[orders[:,1],rows])
+    return _np.matmul(m,axes[orders[:,2],rows])
+
+def _npOrthonormalize(m):
+    #(n,3,3) -> (n,3,3), same gram-schmidt as orthonormalize
+    x = m[:,0]/_np.linalg.norm(m[:,0],axis=1)[:,None]
+    y = m[:,1] - _np.sum(m[:,1]*x,axis=1)[:,None]*x
+    y = y/_np.linalg.norm(y,axis=1)[:,None]
+    z = m[:,2] - _np.sum(m[:,2]*x,axis=1)[:,None]*x - _np.sum(m[:,2]*y,axis=1)[:,None]*y
+    z = z/_np.linalg.norm(z,axis=1)[:,None]
+    flip = _np.sum(_np.cross(x,y)*z,axis=1) < 0
+    z[flip] = -z[flip]
+    return _np.stack([x,y,z],axis=1)
+
+def _npAlignLocals(worlds,parentWorlds,rotateOrders,jointOrients,inverseScales):
+    count = len(worlds)
+    local = _np.matmul(_np.asarray(worlds,dtype=float),_np.linalg.inv(_np.asarray(parentWorlds,dtype=float)))
+    m = local[:,:3,:3].copy()
+    scales = _np.asarray([s if s is not None else (1.0,1.0,1.0) for s in inverseScales],dtype=float)
+    m = m*scales[:,None,:]
+    rotation = _npOrthonormalize(m)
+    orients = [o if o is not None else (0.0,0.0,0.0) for o in jointOrients]
+    #the inverse of a rotation is its transpose
+    rotation = _np.matmul(rotation,_np.transpose(_npEulerToMatrices(orients,[0]*count),(0,2,1)))
+    results = []
+    for x in range(0,count):
+        r = rotation[x]
+        rotate = matrixToEuler([list(r[0])+[0.0],list(r[1])+[0.0],list(r[2])+[0.0],[0.0,0.0,0.0,1.0]],rotateOrders[x])
+        results.append((list(local[x,3,:3]),rotate))
+    return results
+
+def _npFitPlanes(pointLists):
+    #covariance of every list with one reduceat, then one stacked svd
+    counts = _np.asarray([len(p) for p in pointLists])
+    starts = _np.concatenate([[0],_np.cumsum(counts)[:-1]])
+    points = _np.asarray([v for p in pointLists for v in p],dtype=float).reshape(-1,3)
+    centroids = _np.add.reduceat(points,starts,axis=0)/counts[:,None]
+    centered = points - _np.repeat(centroids,counts,axis=0)
+    covariances = _np.add.reduceat(centered[:,:,None]*centered[:,None,:],starts,axis=0)
+    u,singular,vt = _np.linalg.svd(covariances)
+    planes = []
+    for x in range(0,len(pointLists)):
+        centroid = list(centroids[x])
+        if counts[x] < 3 or singular[x,1] <= PLANETOLERANCE*singular[x,0]:
+            planes.append((centroid,None))
+        else:
+            planes.append((centroid,_bendSign(pointLists[x],list(u[x,:,2]))))
+    return planes
+
+def _npMirrorMatrices(matrices,axis,behavior):
+    m = _np.array(matrices,dtype=float).reshape(-1,4,4)
+    if behavior:
+        keep = m[:,:3,axis].copy()
+        m[:,:3,:3] = -m[:,:3,:3]
+        m[:,:3,axis] = keep
+    m[:,3,axis] = -m[:,3,axis]
+    return [[list(row) for row in x] for x in m]
+
+def _npTransformPoints(pointLists,matrices):
+    #every point of every list through the matrix of its list in one stacked product
+    counts = [len(p) for p in pointLists]
+    points = _np.concatenate([_np.asarray(p,dtype=float).reshape(-1,3) for p in pointLists])
+    m = _np.repeat(_np.asarray(matrices,dtype=float),counts,axis=0)
+    moved = _np.einsum('ni,nij->nj',points,m[:,:3,:3]) + m[:,3,:3]
+    ends = _np.cumsum(counts)
+    return [[tuple(p) for p in moved[e-c:e]] for c,e in zip(counts,ends)]
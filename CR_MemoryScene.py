@@ -0,0 +1,1159 @@
+import fnmatch
+import functools
+from collections import OrderedDict
+
+from . import CR_Math as crm
+from .CR_Transaction import TxNode,CurveData,stringTypes
+from .CR_Backend import SceneBackend
+
+COMPOUNDS = {
+    'translate' : ('translateX','translateY','translateZ'),
+    'rotate' : ('rotateX','rotateY','rotateZ'),
+    'scale' : ('scaleX','scaleY','scaleZ'),
+    'jointOrient' : ('jointOrientX','jointOrientY','jointOrientZ'),
+    'outputTranslate' : ('outputTranslateX','outputTranslateY','outputTranslateZ'),
+    'outputRotate' : ('outputRotateX','outputRotateY','outputRotateZ'),
+    'outputScale' : ('outputScaleX','outputScaleY','outputScaleZ'),
+}
+CHILDREN = dict([(c,(p,x)) for p,cs in COMPOUNDS.items() for x,c in enumerate(cs)])
+
+_TRANSFORMATTRS = {
+    'translate' : (0.0,0.0,0.0),
+    'rotate' : (0.0,0.0,0.0),
+    'scale' : (1.0,1.0,1.0),
+    'rotateOrder' : 0,
+    'visibility' : True,
+    'hiddenInOutliner' : False,
+}
+_JOINTATTRS = dict(_TRANSFORMATTRS,jointOrient=(0.0,0.0,0.0),segmentScaleCompensate=True,radius=1.0)
+
+#static attributes and their default values per node type
+NODEATTRS = {
+    'transform' : _TRANSFORMATTRS,
+    'joint' : _JOINTATTRS,
+    'parentConstraint' : _TRANSFORMATTRS,
+    'nurbsCurve' : {'lineWidth' : -1.0,'overrideEnabled' : False,'overrideColor' : 0,'visibility' : True,'cached' : None},
+    'network' : {},
+    'skinCluster' : {},
+    'unitConversion' : {'conversionFactor' : 1.0},
+    'decomposeMatrix' : {'inputMatrix' : None,'inputRotateOrder' : 0,'outputTranslate' : (0.0,0.0,0.0),
+                         'outputRotate' : (0.0,0.0,0.0),'outputScale' : (1.0,1.0,1.0)},
+    'multMatrix' : {'matrixSum' : None},
+}
+#static multi attributes per node type
+NODEMULTIS = {
+    'transform' : ('worldMatrix',),
+    'joint' : ('worldMatrix',),
+    'parentConstraint' : ('worldMatrix',),
+    'nurbsCurve' : ('worldMatrix',),
+    'skinCluster' : ('matrix',),
+    'multMatrix' : ('matrixIn',),
+}
+#attributes read from the dag instead of stored
+COMPUTED = ('worldMatrix','matrix','parentMatrix')
+TRANSFORMTYPES = ('transform','joint','parentConstraint')
+SHAPETYPES = ('nurbsCurve',)
+#attributes changing the world matrix of the node and its children
+XFORMATTRS = set(['translate','rotate','scale','jointOrient','rotateOrder','segmentScaleCompensate'])
+
+
+def _counted(label):
+    #count the call on the scene of the object
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self,*args,**kwargs):
+            self._scene.count(label)
+            return func(self,*args,**kwargs)
+        return wrapper
+    return decorator
+
+def _splitPath(attrPath):
+    #'Manager[3]' -> ('Manager',3), 'boundMng' -> ('boundMng',None)
+    if attrPath.endswith(']'):
+        name,index = attrPath[:-1].split('[')
+        return name,int(index)
+    return attrPath,None
+
+def _flatten(args):
+    items = []
+    for a in args:
+        if isinstance(a,(list,tuple)):
+            items.extend(_flatten(a))
+        elif a is not None:
+            items.append(a)
+    return items
+
+
+# --------------------------------------------------------------
+# NODES AND ATTRIBUTES
+# --------------------------------------------------------------
+class MemoryNode(object):
+    '''
+    node of a MemoryScene, mimics the part of the pymel node api CybeRig uses
+    also the node handle given to registries and callbacks (key, isValid, isType)
+    '''
+    def __init__(self,scene,nodeType,name,uuid):
+        self._scene = scene
+        self._type = nodeType
+        self._name = name
+        self._uuid = uuid
+        self._parent = None
+        self._children = []
+        self._values = dict(NODEATTRS.get(nodeType,{}))
+        self._multis = set(NODEMULTIS.get(nodeType,()))
+        self._dynamic = OrderedDict()
+        self._connected = set()
+        self._alive = True
+        self._world = None
+
+    def __str__(self):
+        return self._name
+
+    def __repr__(self):
+        return "MemoryNode('{}')".format(self._name)
+
+    def __getattr__(self,name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._hasAttr(name):
+            return MemoryAttribute(self,name)
+        raise AttributeError('{} has no attribute or method named {}'.format(self._name,name))
+
+    # pymel like methods
+    def name(self):
+        return self._name
+
+    def nodeName(self):
+        return self._name
+
+    @_counted('node.longName')
+    def longName(self):
+        return self._scene.longName(self)
+
+    fullPath = longName
+
+    @_counted('node.type')
+    def type(self):
+        return self._type
+
+    nodeType = type
+
+    @_counted('node.hasAttr')
+    def hasAttr(self,attrName):
+        return self._hasAttr(attrName)
+
+    @_counted('node.attr')
+    def attr(self,attrName):
+        if not self._hasAttr(attrName):
+            raise AttributeError('{} has no attribute named {}'.format(self._name,attrName))
+        return MemoryAttribute(self,attrName)
+
+    @_counted('node.addAttr')
+    def addAttr(self,attrName,attributeType='double',multi=False,**kwargs):
+        if self._hasAttr(attrName):
+            raise RuntimeError('{} already has an attribute named {}'.format(self._name,attrName))
+        self._scene.addAttr(self,attrName,kwargs.get('at',attributeType),multi or kwargs.get('m',False))
+
+    @_counted('node.deleteAttr')
+    def deleteAttr(self,attrName):
+        self._scene.deleteAttr(self,attrName)
+
+    @_counted('node.listAttr')
+    def listAttr(self,userDefined=False):
+        names = list(self._dynamic)
+        if not userDefined:
+            names = list(self._values) + list(self._multis) + names
+        return [MemoryAttribute(self,a) for a in names]
+
+    @_counted('node.rename')
+    def rename(self,name):
+        self._scene.rename(self,name)
+        return self
+
+    @_counted('node.getParent')
+    def getParent(self):
+        return self._parent
+
+    @_counted('node.getChildren')
+    def getChildren(self,type=None):
+        return [c for c in self._children if type is None or c._type == type]
+
+    @_counted('node.getShapes')
+    def getShapes(self):
+        return [c for c in self._children if c._type in SHAPETYPES]
+
+    @_counted('node.exists')
+    def exists(self):
+        return self._alive
+
+    # node handle methods
+    def key(self):
+        return self._uuid
+
+    def uuid(self):
+        return self._uuid
+
+    def plug(self,attrPath):
+        return MemoryAttribute(self,attrPath)
+
+    def isValid(self):
+        return self._alive
+
+    def isType(self,nodeType):
+        if nodeType == 'dependNode':
+            return True
+        if nodeType == 'transform':
+            return self._type in TRANSFORMTYPES
+        return self._type == nodeType
+
+    def node(self):
+        return self
+
+    # private methods
+    def _hasAttr(self,attrName):
+        name,index = _splitPath(attrName)
+        if index is not None:
+            return name in self._multis or (name in self._dynamic and self._dynamic[name][1])
+        return (name in self._values) or (name in self._multis) or (name in self._dynamic) or (name in COMPUTED and self._type in TRANSFORMTYPES) or (name in CHILDREN and CHILDREN[name][0] in self._values) or (name == 'inverseScale' and self._type == 'joint') or (name == 'controlPoints' and self._type == 'nurbsCurve')
+
+    def _isMulti(self,attrName):
+        return attrName in self._multis or (attrName in self._dynamic and self._dynamic[attrName][1])
+
+
+class MemoryAttribute(object):
+    '''
+    plug of a MemoryNode, mimics the part of the pymel attribute api CybeRig uses
+    '''
+    def __init__(self,node,attrPath):
+        self._node = node
+        self._path = attrPath
+        self._scene = node._scene
+
+    def __str__(self):
+        return self._node._name+'.'+self._path
+
+    def __repr__(self):
+        return "MemoryAttribute('{}')".format(str(self))
+
+    def __eq__(self,other):
+        return isinstance(other,MemoryAttribute) and other._node is self._node and other._path == self._path
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._node),self._path))
+
+    def __getitem__(self,index):
+        return MemoryAttribute(self._node,'{}[{}]'.format(self._path,index))
+
+    elementByLogicalIndex = __getitem__
+
+    def __rshift__(self,other):
+        self.connect(other)
+
+    def __floordiv__(self,other):
+        self.disconnect(other)
+
+    def name(self):
+        return str(self)
+
+    def node(self):
+        return self._node
+
+    plugNode = node
+
+    def attrName(self):
+        return _splitPath(self._path)[0]
+
+    def plugAttr(self):
+        return self._path
+
+    def isElement(self):
+        return self._path.endswith(']')
+
+    def index(self):
+        name,index = _splitPath(self._path)
+        if index is None:
+            raise TypeError('{} is not an element of a multi attribute'.format(self))
+        return index
+
+    def isMulti(self):
+        return not self.isElement() and self._node._isMulti(self._path)
+
+    @_counted('attr.getArrayIndices')
+    def getArrayIndices(self):
+        return self._scene.arrayIndices(self._node,self._path)
+
+    @_counted('attr.get')
+    def get(self):
+        return self._scene.getAttr(self._node,self._path)
+
+    @_counted('attr.set')
+    def set(self,*values):
+        value = values[0] if len(values) == 1 else tuple(values)
+        self._scene.setAttr(self._node,self._path,value)
+
+    @_counted('attr.connect')
+    def connect(self,other,force=True):
+        self._scene.connect(self._scene.toPlug(self),self._scene.toPlug(other))
+
+    @_counted('attr.disconnect')
+    def disconnect(self,other=None):
+        key = (self._node,self._path)
+        if other is not None:
+            self._scene.disconnect(key,self._scene.toPlug(other))
+            return
+        for src in self._scene.plugInputs(key):
+            self._scene.disconnect(src,key)
+        for dst in self._scene.plugOutputs(key):
+            self._scene.disconnect(key,dst)
+
+    @_counted('attr.inputs')
+    def inputs(self,plugs=False,type=None):
+        return self._scene.neighbours(self._scene.plugInputs((self._node,self._path)),plugs,type)
+
+    @_counted('attr.outputs')
+    def outputs(self,plugs=False,type=None):
+        return self._scene.neighbours(self._scene.plugOutputs((self._node,self._path)),plugs,type)
+
+    @_counted('attr.isDestination')
+    def isDestination(self):
+        return len(self._scene.plugInputs((self._node,self._path))) > 0
+
+    @_counted('attr.isSource')
+    def isSource(self):
+        return len(self._scene.plugOutputs((self._node,self._path))) > 0
+
+    @_counted('attr.isConnected')
+    def isConnected(self):
+        key = (self._node,self._path)
+        return len(self._scene.plugInputs(key)) + len(self._scene.plugOutputs(key)) > 0
+
+
+# --------------------------------------------------------------
+# SCENE
+# --------------------------------------------------------------
+class MemoryScene(object):
+    '''
+    pure python stand-in of a maya scene: dag, dynamic/multi attributes, connections,
+    world matrices and callbacks, enough to build and tear down CybeRig systems headless
+    every pm/cmds/api call made through it is counted in calls
+    '''
+    def __init__(self):
+        self.nodes = OrderedDict()
+        self.calls = {}
+        self.txOps = 0
+        self._inputs = {}
+        self._outputs = {}
+        self._selection = []
+        self._callbacks = OrderedDict()
+        self._nextUuid = 0
+        self._nextCallbackId = 0
+        self.pm = MemoryPm(self)
+        self.cmds = MemoryCmds(self)
+
+    # call counters
+    def count(self,label,amount=1):
+        self.calls[label] = self.calls.get(label,0) + amount
+
+    def callCount(self):
+        '''
+        return the amount of scene calls so far
+        '''
+        return sum(self.calls.values())
+
+    def resetCalls(self):
+        self.calls = {}
+        self.txOps = 0
+
+    # nodes
+    def createNode(self,nodeType,name,parent=None):
+        '''
+        create a node, shapes without a parent get a transform like maya does
+        '''
+        if nodeType in SHAPETYPES and parent is None:
+            parent = self.createNode('transform',name)
+            name = name+'Shape'
+        node = MemoryNode(self,nodeType,self.uniqueName(name),self._nextUuid)
+        self._nextUuid += 1
+        self.nodes[node._name] = node
+        if parent is not None:
+            node._parent = parent
+            parent._children.append(node)
+        self._fire('nodeAdded',node)
+        return node
+
+    def uniqueName(self,name):
+        if name not in self.nodes:
+            return name
+        base = name.rstrip('0123456789')
+        x = 1
+        while base+str(x) in self.nodes:
+            x += 1
+        return base+str(x)
+
+    def rename(self,node,name):
+        name = name.split('|')[-1]
+        if name == node._name:
+            return
+        del self.nodes[node._name]
+        node._name = self.uniqueName(name)
+        self.nodes[node._name] = node
+        self._fire('nameChanged',node)
+
+    def delete(self,node):
+        '''
+        delete a node and its dag children
+        '''
+        if not node._alive:
+            return
+        stack = [node]
+        doomed = []
+        while len(stack) > 0:
+            n = stack.pop()
+            doomed.append(n)
+            stack.extend(n._children)
+        if node._parent is not None:
+            node._parent._children.remove(node)
+        for n in reversed(doomed):
+            for path in list(n._connected):
+                key = (n,path)
+                for src in self.plugInputs(key):
+                    self.disconnect(src,key)
+                for dst in self.plugOutputs(key):
+                    self.disconnect(key,dst)
+            self._fire('nodeRemoved',n)
+            n._alive = False
+            n._children = []
+            self.nodes.pop(n._name,None)
+            if n in self._selection:
+                self._selection.remove(n)
+
+    def node(self,obj):
+        '''
+        return the node of a name (short or long), a node or a TxNode free object
+        '''
+        if isinstance(obj,MemoryNode):
+            return obj
+        name = str(obj).split('|')[-1]
+        if name not in self.nodes:
+            raise ValueError('No object matches name: {}'.format(obj))
+        return self.nodes[name]
+
+    def longName(self,node):
+        names = []
+        n = node
+        while n is not None:
+            names.append(n._name)
+            n = n._parent
+        return '|'+'|'.join(reversed(names))
+
+    def setParent(self,node,parent,preserve=True):
+        '''
+        reparent a node, None is the world, its world matrix is kept unless preserve is False
+        '''
+        world = self.worldMatrix(node) if preserve else None
+        if node._parent is not None:
+            node._parent._children.remove(node)
+        node._parent = parent
+        if parent is not None:
+            parent._children.append(node)
+        self._dirty(node)
+        if preserve and node._type in TRANSFORMTYPES:
+            self.setWorldMatrix(node,world,keepScale=False)
+
+    # attributes
+    def addAttr(self,node,attrName,attrType='double',multi=False):
+        node._dynamic[attrName] = (attrType,multi)
+        if not multi:
+            node._values[attrName] = '' if attrType == 'string' else 0.0
+
+    def deleteAttr(self,node,attrName):
+        if attrName not in node._dynamic:
+            raise RuntimeError('{} has no dynamic attribute named {}'.format(node._name,attrName))
+        for path in list(node._connected):
+            if _splitPath(path)[0] == attrName:
+                key = (node,path)
+                for src in self.plugInputs(key):
+                    self.disconnect(src,key)
+                for dst in self.plugOutputs(key):
+                    self.disconnect(key,dst)
+        del node._dynamic[attrName]
+        for path in [p for p in node._values if _splitPath(p)[0] == attrName]:
+            del node._values[path]
+
+    def getAttr(self,node,attrPath):
+        name,index = _splitPath(attrPath)
+        if name in COMPUTED:
+            if name == 'worldMatrix':
+                return self.worldMatrix(node)
+            if name == 'matrix':
+                return self.localMatrix(node)
+            return self.worldMatrix(node._parent) if node._parent is not None else crm.identity()
+        if attrPath in CHILDREN:
+            parent,x = CHILDREN[attrPath]
+            return node._values[parent][x]
+        if name == 'controlPoints' and node._type == 'nurbsCurve':
+            return tuple(node._values['cached'].points[index])
+        if attrPath == 'inverseScale' and node._type == 'joint':
+            #like a joint made with pm.joint, parent joint scale is connected to it
+            parent = node._parent
+            return parent._values['scale'] if (parent is not None) and parent._type == 'joint' else (1.0,1.0,1.0)
+        if attrPath in node._values:
+            return node._values[attrPath]
+        if node._hasAttr(attrPath):
+            return 0.0
+        raise AttributeError('{} has no attribute named {}'.format(node._name,attrPath))
+
+    def setAttr(self,node,attrPath,value):
+        if attrPath in CHILDREN:
+            parent,x = CHILDREN[attrPath]
+            values = list(node._values[parent])
+            values[x] = float(value)
+            node._values[parent] = tuple(values)
+            attrPath = parent
+        elif attrPath in COMPOUNDS:
+            node._values[attrPath] = tuple([float(v) for v in value])
+        elif attrPath.startswith('controlPoints[') and node._type == 'nurbsCurve':
+            #curve data may be a shared template, never edit it in place
+            data = node._values['cached']
+            points = [tuple(p) for p in data.points]
+            points[_splitPath(attrPath)[1]] = tuple([float(v) for v in value])
+            node._values['cached'] = CurveData(points,data.knots,data.degree,data.form)
+        elif node._hasAttr(attrPath) and attrPath not in COMPUTED:
+            node._values[attrPath] = value
+        else:
+            raise AttributeError('{} has no settable attribute named {}'.format(node._name,attrPath))
+        if attrPath in XFORMATTRS:
+            self._dirty(node)
+
+    def evaluate(self,plug):
+        '''
+        return the value of a plug pulled through its input connections, like a maya getAttr
+        decomposeMatrix and multMatrix outputs are computed, other plugs give their stored value
+        '''
+        node,attrPath = self.toPlug(plug)
+        if (node,attrPath) in self._inputs:
+            return self.evaluate(self._inputs[(node,attrPath)])
+        if attrPath in CHILDREN:
+            parent,x = CHILDREN[attrPath]
+            return self.evaluate((node,parent))[x]
+        if attrPath in COMPOUNDS and any([(node,c) in self._inputs for c in COMPOUNDS[attrPath]]):
+            return tuple([self.evaluate((node,c)) for c in COMPOUNDS[attrPath]])
+        if node._type == 'multMatrix' and attrPath == 'matrixSum':
+            m = crm.identity()
+            for x in self.arrayIndices(node,'matrixIn'):
+                m = crm.multiply(m,self.evaluate((node,'matrixIn[{}]'.format(x))))
+            return m
+        if node._type == 'decomposeMatrix' and attrPath in ('outputTranslate','outputRotate','outputScale'):
+            m = self.evaluate((node,'inputMatrix'))
+            if attrPath == 'outputTranslate':
+                return tuple(crm.translation(m))
+            if attrPath == 'outputRotate':
+                return tuple(crm.matrixToEuler(m,int(self.evaluate((node,'inputRotateOrder')))))
+            return tuple([sum([v*v for v in m[x][:3]])**0.5 for x in range(3)])
+        return self.getAttr(node,attrPath)
+
+    def arrayIndices(self,node,attrName):
+        indices = set()
+        for path in list(node._connected) + list(node._values):
+            name,index = _splitPath(path)
+            if name == attrName and index is not None:
+                indices.add(index)
+        return sorted(indices)
+
+    # connections
+    def toPlug(self,plug):
+        '''
+        return the (node,attrPath) key of a MemoryAttribute, a plug name or a key
+        '''
+        if isinstance(plug,MemoryAttribute):
+            return (plug._node,plug._path)
+        if isinstance(plug,tuple):
+            return (self.node(plug[0]),plug[1])
+        nodeName,attrPath = str(plug).split('.',1)
+        return (self.node(nodeName),attrPath)
+
+    def connect(self,src,dst):
+        '''
+        connect two plug keys, an existing input of dst is replaced
+        '''
+        for node,path in (src,dst):
+            if not node._hasAttr(path):
+                raise AttributeError('{} has no attribute named {}'.format(node._name,path))
+        if self._inputs.get(dst) == src:
+            return
+        if dst in self._inputs:
+            self.disconnect(self._inputs[dst],dst)
+        self._inputs[dst] = src
+        self._outputs.setdefault(src,OrderedDict())[dst] = None
+        src[0]._connected.add(src[1])
+        dst[0]._connected.add(dst[1])
+        self._fire('connection',src[0],dst[0],True)
+
+    def disconnect(self,src,dst):
+        if self._inputs.get(dst) != src:
+            return
+        del self._inputs[dst]
+        outputs = self._outputs[src]
+        del outputs[dst]
+        if len(outputs) == 0:
+            del self._outputs[src]
+            if src not in self._inputs:
+                src[0]._connected.discard(src[1])
+        if dst not in self._outputs:
+            dst[0]._connected.discard(dst[1])
+        self._fire('connection',src[0],dst[0],False)
+
+    def plugInputs(self,key):
+        '''
+        return the source keys of a plug, the elements of a multi included
+        '''
+        return [self._inputs[k] for k in self._plugKeys(key) if k in self._inputs]
+
+    def plugOutputs(self,key):
+        '''
+        return the destination keys of a plug, the elements of a multi included
+        '''
+        keys = []
+        for k in self._plugKeys(key):
+            keys.extend(self._outputs.get(k,()))
+        return keys
+
+    def neighbours(self,keys,plugs=False,type=None):
+        if type is not None:
+            keys = [k for k in keys if k[0].isType(type)]
+        if plugs:
+            return [MemoryAttribute(n,p) for n,p in keys]
+        return [n for n,p in keys]
+
+    # matrices
+    def localMatrix(self,node):
+        if node._type not in TRANSFORMTYPES:
+            return crm.identity()
+        v = node._values
+        if node._type != 'joint':
+            return crm.composeMatrix(v['translate'],v['rotate'],v['scale'],v['rotateOrder'])
+        return crm.composeMatrix(v['translate'],v['rotate'],v['scale'],v['rotateOrder'],v['jointOrient'],self._inverseScale(node))
+
+    def worldMatrix(self,node):
+        '''
+        return the cached world matrix of a node, computed top down from the first cached ancestor
+        '''
+        if node._world is not None:
+            return node._world
+        path = []
+        n = node
+        while (n is not None) and (n._world is None):
+            path.append(n)
+            n = n._parent
+        world = n._world if n is not None else crm.identity()
+        for n in reversed(path):
+            world = crm.multiply(self.localMatrix(n),world)
+            n._world = world
+        return world
+
+    def setWorldMatrix(self,node,world,keepScale=True):
+        '''
+        set translate/rotate (and scale unless keepScale) so the node matches a world matrix
+        '''
+        parentWorld = self.worldMatrix(node._parent) if node._parent is not None else crm.identity()
+        v = node._values
+        isJoint = node._type == 'joint'
+        inverseScale = self._inverseScale(node) if isJoint else None
+        if not keepScale:
+            m = crm.multiply(world,crm.inverse(parentWorld))
+            if inverseScale is not None:
+                m = crm.multiply(m,crm.scaleMatrix(inverseScale))
+            v['scale'] = tuple([sum([m[r][c]**2 for c in range(3)])**0.5 for r in range(3)])
+        translate,rotate = crm.alignLocal(world,parentWorld,v['rotateOrder'],v['jointOrient'] if isJoint else None,inverseScale)
+        v['translate'],v['rotate'] = tuple(translate),tuple(rotate)
+        self._dirty(node)
+
+    # callbacks
+    def addCallback(self,event,func,nodeType=None):
+        self._nextCallbackId += 1
+        self._callbacks[self._nextCallbackId] = (event,func,nodeType)
+        return self._nextCallbackId
+
+    def removeCallback(self,callbackId):
+        self._callbacks.pop(callbackId,None)
+
+    def clear(self):
+        '''
+        new scene: every node is gone and the scene cleared callbacks are fired
+        '''
+        self._fire('sceneCleared')
+        for node in self.nodes.values():
+            node._alive = False
+        self.nodes = OrderedDict()
+        self._inputs = {}
+        self._outputs = {}
+        self._selection = []
+
+    # private methods
+    def _plugKeys(self,key):
+        node,path = key
+        if node._isMulti(path):
+            return [(node,p) for p in node._connected if _splitPath(p)[0] == path]
+        return [key]
+
+    def _inverseScale(self,node):
+        parent = node._parent
+        if node._values.get('segmentScaleCompensate') and (parent is not None) and parent._type == 'joint':
+            return parent._values['scale']
+        return None
+
+    def _dirty(self,node):
+        stack = [node]
+        while len(stack) > 0:
+            n = stack.pop()
+            n._world = None
+            #a child without cached world has no cached descendants either
+            stack.extend([c for c in n._children if c._world is not None])
+
+    def _fire(self,event,*args):
+        if len(self._callbacks) == 0:
+            return
+        for e,func,nodeType in list(self._callbacks.values()):
+            if e != event:
+                continue
+            if nodeType is not None and not args[0].isType(nodeType):
+                continue
+            func(*args)
+
+
+# --------------------------------------------------------------
+# PM / CMDS FACADES
+# --------------------------------------------------------------
+class MemoryPm(object):
+    '''
+    the pymel.core functions CybeRig calls, on a MemoryScene
+    '''
+    def __init__(self,scene):
+        self._scene = scene
+
+    @_counted('pm.PyNode')
+    def PyNode(self,obj):
+        return self._pyNode(obj)
+
+    def _pyNode(self,obj):
+        if isinstance(obj,(MemoryNode,MemoryAttribute)):
+            return obj
+        if '.' in str(obj):
+            node,path = self._scene.toPlug(str(obj))
+            if not node._hasAttr(path):
+                raise ValueError('No object matches name: {}'.format(obj))
+            return MemoryAttribute(node,path)
+        return self._scene.node(obj)
+
+    @_counted('pm.objExists')
+    def objExists(self,name):
+        return str(name).split('.')[0].split('|')[-1] in self._scene.nodes
+
+    @_counted('pm.ls')
+    def ls(self,*args,**kwargs):
+        return [self._pyNode(n) for n in self._scene.cmds._ls(args,kwargs)]
+
+    @_counted('pm.select')
+    def select(self,*args,**kwargs):
+        scene = self._scene
+        if kwargs.get('cl') or kwargs.get('clear'):
+            scene._selection = []
+            return
+        nodes = [scene.node(n) for n in _flatten(args)]
+        if kwargs.get('add'):
+            scene._selection.extend([n for n in nodes if n not in scene._selection])
+        else:
+            scene._selection = nodes
+
+    @_counted('pm.selected')
+    def selected(self):
+        return list(self._scene._selection)
+
+    @_counted('pm.group')
+    def group(self,*args,**kwargs):
+        scene = self._scene
+        name = kwargs.get('name',kwargs.get('n','group1'))
+        parent = kwargs.get('parent',kwargs.get('p'))
+        grp = scene.createNode('transform',name,scene.node(parent) if parent is not None else None)
+        if not (kwargs.get('empty') or kwargs.get('em')):
+            members = [scene.node(n) for n in _flatten(args)] if len(args) > 0 else list(scene._selection)
+            for n in members:
+                scene.setParent(n,grp)
+        scene._selection = [grp]
+        return grp
+
+    @_counted('pm.joint')
+    def joint(self,*args,**kwargs):
+        scene = self._scene
+        name = kwargs.get('name',kwargs.get('n','joint1'))
+        parent = None
+        if len(scene._selection) > 0 and scene._selection[-1]._type in TRANSFORMTYPES:
+            parent = scene._selection[-1]
+        j = scene.createNode('joint',name,parent)
+        position = kwargs.get('position',kwargs.get('p'))
+        if position is not None:
+            world = crm.translationMatrix(position)
+            scene.setWorldMatrix(j,world)
+        scene._selection = [j]
+        return j
+
+    @_counted('pm.parent')
+    def parent(self,*args,**kwargs):
+        scene = self._scene
+        nodes = [scene.node(n) for n in _flatten(args)]
+        relative = kwargs.get('r') or kwargs.get('relative') or kwargs.get('s') or kwargs.get('shape')
+        if kwargs.get('w') or kwargs.get('world'):
+            parent = None
+        else:
+            parent = nodes.pop()
+        for n in nodes:
+            if n._parent is not parent:
+                scene.setParent(n,parent,preserve=not relative)
+        return nodes
+
+    @_counted('pm.delete')
+    def delete(self,*args):
+        for n in _flatten(args):
+            node = n._node if isinstance(n,MemoryAttribute) else n
+            if isinstance(node,MemoryNode) and not node._alive:
+                continue
+            self._scene.delete(self._scene.node(node))
+
+    @_counted('pm.parentConstraint')
+    def parentConstraint(self,*args,**kwargs):
+        '''
+        snap the last node on the first one (no offset), return a constraint node under it
+        '''
+        scene = self._scene
+        nodes = [scene.node(n) for n in _flatten(args)]
+        base,target = nodes[0],nodes[-1]
+        #position and orientation only, the target keeps its own scale
+        scene.setWorldMatrix(target,crm.rigid(scene.worldMatrix(base)))
+        constraint = scene.createNode('parentConstraint',target._name+'_parentConstraint1',target)
+        return constraint
+
+    @_counted('pm.circle')
+    def circle(self,*args,**kwargs):
+        name = kwargs.get('name',kwargs.get('n','nurbsCircle1'))
+        shape = self._scene.createNode('nurbsCurve',name)
+        return [shape._parent]
+
+    @_counted('pm.curve')
+    def curve(self,*args,**kwargs):
+        name = kwargs.get('name',kwargs.get('n','curve1'))
+        shape = self._scene.createNode('nurbsCurve',name)
+        points = [tuple(p) for p in kwargs.get('p',kwargs.get('point',[]))]
+        knots = kwargs.get('k',kwargs.get('knot',range(0,len(points))))
+        shape._values['cached'] = CurveData(points,list(knots),kwargs.get('d',kwargs.get('degree',3)))
+        return shape._parent
+
+
+class MemoryCmds(object):
+    '''
+    the maya.cmds functions CybeRig calls, on a MemoryScene
+    results are names, None for empty queries like maya
+    '''
+    def __init__(self,scene):
+        self._scene = scene
+
+    @_counted('cmds.ls')
+    def ls(self,*args,**kwargs):
+        return self._ls(args,kwargs)
+
+    @_counted('cmds.objExists')
+    def objExists(self,name):
+        return str(name).split('.')[0].split('|')[-1] in self._scene.nodes
+
+    @_counted('cmds.listConnections')
+    def listConnections(self,*args,**kwargs):
+        scene = self._scene
+        source = kwargs.get('source',kwargs.get('s',True))
+        destination = kwargs.get('destination',kwargs.get('d',True))
+        connections = kwargs.get('connections',kwargs.get('c',False))
+        plugs = kwargs.get('plugs',kwargs.get('p',False))
+        nodeType = kwargs.get('type',kwargs.get('t'))
+        result = []
+        for item in _flatten(args):
+            if '.' in str(item):
+                keys = scene._plugKeys(scene.toPlug(item))
+            else:
+                node = scene.node(item)
+                keys = [(node,p) for p in sorted(node._connected)]
+            for key in keys:
+                others = []
+                if source and key in scene._inputs:
+                    others.append(scene._inputs[key])
+                if destination:
+                    others.extend(scene._outputs.get(key,()))
+                for other in others:
+                    if nodeType is not None and not other[0].isType(nodeType):
+                        continue
+                    if connections:
+                        result.append(key[0]._name+'.'+key[1])
+                    result.append(other[0]._name+'.'+other[1] if plugs else other[0]._name)
+        return result if len(result) > 0 else None
+
+    @_counted('cmds.listAttr')
+    def listAttr(self,*args,**kwargs):
+        node = self._scene.node(_flatten(args)[0])
+        pattern = kwargs.get('string',kwargs.get('st','*'))
+        if kwargs.get('userDefined',kwargs.get('ud',False)):
+            names = list(node._dynamic)
+        else:
+            names = list(node._values) + list(node._multis) + list(node._dynamic)
+        names = [n for n in names if fnmatch.fnmatchcase(n,pattern)]
+        return names if len(names) > 0 else None
+
+    @_counted('cmds.getAttr')
+    def getAttr(self,plugName):
+        node,path = self._scene.toPlug(plugName)
+        value = self._scene.getAttr(node,path)
+        if path in COMPOUNDS:
+            return [tuple(value)]
+        if _splitPath(path)[0] in COMPUTED:
+            return [v for row in value for v in row]
+        return value
+
+    @_counted('cmds.setAttr')
+    def setAttr(self,plugName,*values,**kwargs):
+        node,path = self._scene.toPlug(plugName)
+        self._scene.setAttr(node,path,values[0] if len(values) == 1 else tuple(values))
+
+    @_counted('cmds.delete')
+    def delete(self,*args):
+        for n in _flatten(args):
+            if str(n).split('|')[-1] in self._scene.nodes:
+                self._scene.delete(self._scene.node(n))
+
+    @_counted('cmds.deleteAttr')
+    def deleteAttr(self,*args,**kwargs):
+        item = str(_flatten(args)[0])
+        if '.' in item:
+            nodeName,attrName = item.split('.',1)
+        else:
+            nodeName,attrName = item,kwargs.get('attribute',kwargs.get('at'))
+        self._scene.deleteAttr(self._scene.node(nodeName),attrName)
+
+    @_counted('cmds.skinCluster')
+    def skinCluster(self,*args,**kwargs):
+        if not (kwargs.get('query') or kwargs.get('q')):
+            raise RuntimeError('only skinCluster queries are supported on a memory scene')
+        node = self._scene.node(_flatten(args)[0])
+        return [n._name for n,p in self._scene.plugInputs((node,'matrix'))] or None
+
+    @_counted('cmds.undoInfo')
+    def undoInfo(self,*args,**kwargs):
+        return None
+
+    def _ls(self,args,kwargs):
+        scene = self._scene
+        objectsOnly = kwargs.get('objectsOnly',kwargs.get('o',False))
+        longNames = kwargs.get('long',kwargs.get('l',False))
+        nodeType = kwargs.get('type',kwargs.get('typ'))
+        items = _flatten(args)
+        if len(items) == 0:
+            items = ['*']
+        result = []
+        for item in items:
+            item = str(item)
+            nodeName,attrPath = item,None
+            if '.' in item:
+                nodeName,attrPath = item.split('.',1)
+            nodeName = nodeName.split('|')[-1]
+            if any([c in nodeName for c in '*?[']):
+                nodes = [n for name,n in scene.nodes.items() if fnmatch.fnmatchcase(name,nodeName)]
+            else:
+                nodes = [scene.nodes[nodeName]] if nodeName in scene.nodes else []
+            for n in nodes:
+                if nodeType is not None and not n.isType(nodeType):
+                    continue
+                if attrPath is not None and not n._hasAttr(attrPath):
+                    continue
+                name = scene.longName(n) if longNames else n._name
+                if attrPath is not None and not objectsOnly:
+                    name = name+'.'+attrPath
+                result.append(name)
+        return list(OrderedDict.fromkeys(result))
+
+
+# --------------------------------------------------------------
+# EXECUTOR AND BACKEND
+# --------------------------------------------------------------
+class MemoryExecutor(object):
+    '''
+    flush transactions straight into a MemoryScene, one counted call per flush
+    '''
+    def __init__(self,scene):
+        self.scene = scene
+        self.chunks = []
+
+    def execute(self,txName,ops):
+        scene = self.scene
+        scene.count('tx.flush')
+        scene.txOps += len(ops)
+        created = OrderedDict()
+
+        def resolve(node):
+            if isinstance(node,TxNode):
+                return created[node]
+            return scene.node(node)
+
+        def plug(p):
+            if isinstance(p,tuple):
+                return (resolve(p[0]),p[1])
+            return scene.toPlug(p)
+
+        for op in ops:
+            if op[0] == 'createNode':
+                node = op[1]
+                parent = resolve(node.parent) if node.parent is not None else None
+                created[node] = scene.createNode(node.nodeType,node.iname,parent)
+        for op in ops:
+            if op[0] == 'addAttr':
+                _,node,attrName,attrType,multi,ifMissing = op
+                node = resolve(node)
+                if ifMissing and node._hasAttr(attrName):
+                    continue
+                scene.addAttr(node,attrName,attrType,multi)
+        for op in ops:
+            if op[0] == 'setAttr':
+                value = op[3]
+                if isinstance(value,list):
+                    value = tuple(value)
+                scene.setAttr(resolve(op[1]),op[2],value)
+            elif op[0] == 'connect':
+                scene.connect(plug(op[1]),plug(op[2]))
+            elif op[0] == 'disconnect':
+                scene.disconnect(plug(op[1]),plug(op[2]))
+        return created
+
+    def openChunk(self,name):
+        self.scene.count('cmds.undoInfo')
+        self.chunks.append(name)
+
+    def closeChunk(self):
+        self.scene.count('cmds.undoInfo')
+
+
+class MemoryBackend(SceneBackend):
+    '''
+    scene backend running every CR call on a MemoryScene, no maya needed
+    each bulk call counts as one scene call
+    '''
+    name = 'memory'
+
+    def __init__(self,scene=None):
+        self.scene = scene if scene is not None else MemoryScene()
+        self.pm = self.scene.pm
+        self.cmds = self.scene.cmds
+
+    def executor(self):
+        return MemoryExecutor(self.scene)
+
+    def setParents(self,nodes,parent=None,preserve=True):
+        scene = self.scene
+        scene.count('backend.setParents')
+        parent = scene.node(parent) if parent is not None else None
+        for n in [scene.node(n) for n in nodes]:
+            if n._parent is not parent:
+                scene.setParent(n,parent,preserve)
+
+    def deleteNodes(self,nodes):
+        scene = self.scene
+        scene.count('backend.deleteNodes')
+        for n in nodes:
+            if isinstance(n,MemoryNode):
+                scene.delete(n)
+            elif str(n).split('|')[-1] in scene.nodes:
+                scene.delete(scene.node(n))
+
+    def hasAttrs(self,nodes,attrName):
+        self.scene.count('backend.hasAttrs')
+        return [self.scene.node(n)._hasAttr(attrName) for n in nodes]
+
+    def getAttrs(self,plugs):
+        scene = self.scene
+        scene.count('backend.getAttrs')
+        return [scene.getAttr(*scene.toPlug(p)) for p in plugs]
+
+    def worldMatrices(self,nodes,exclusive=False):
+        scene = self.scene
+        scene.count('backend.worldMatrices')
+        matrices = []
+        for n in nodes:
+            n = scene.node(n)
+            if exclusive:
+                n = n._parent
+            matrices.append([list(row) for row in scene.worldMatrix(n)] if n is not None else crm.identity())
+        return matrices
+
+    def curvePoints(self,shapes):
+        scene = self.scene
+        scene.count('backend.curvePoints')
+        return [[tuple([float(v) for v in p]) for p in scene.node(s)._values['cached'].points] for s in shapes]
+
+    def curveData(self,shapes):
+        scene = self.scene
+        scene.count('backend.curveData')
+        curves = []
+        for s in shapes:
+            cached = scene.node(s)._values['cached']
+            points = [tuple([float(v) for v in p]) for p in cached.points]
+            curves.append(CurveData(points,[float(k) for k in cached.knots],cached.degree,cached.form))
+        return curves
+
+    def parentMap(self,nodeList):
+        scene = self.scene
+        scene.count('api.parentMap')
+        ids = []
+        parentMap = {}
+        labels = {}
+        nodes = [scene.node(n) for n in nodeList]
+        for n in nodes:
+            ids.append(n._uuid)
+            labels[n._uuid] = n._name
+            parentMap[n._uuid] = n._parent._uuid if n._parent is not None else None
+        idSet = set(ids)
+        for n in nodes:
+            p = n._parent
+            if p is None or p._uuid in idSet:
+                continue
+            while (p is not None) and (p._uuid not in parentMap):
+                parentMap[p._uuid] = p._parent._uuid if p._parent is not None else None
+                p = p._parent
+        return ids,parentMap,labels
+
+    def nodesWithAttr(self,attrName):
+        self.scene.count('api.nodesWithAttr')
+        return [n for n in self.scene.nodes.values() if n._hasAttr(attrName)]
+
+    def nodeHandles(self,nodes):
+        self.scene.count('api.nodeHandles')
+        return [self.scene.node(n) for n in nodes]
+
+    def isDestination(self,plugs):
+        scene = self.scene
+        scene.count('backend.isDestination')
+        return [len(scene.plugInputs(scene.toPlug(p))) > 0 for p in plugs]
+
+    def addCallbacks(self,nodeAdded=None,nodeRemoved=None,nameChanged=None,connectionChanged=None,sceneCleared=None,nodeType='transform'):
+        scene = self.scene
+        ids = []
+        if nodeAdded is not None:
+            ids.append(scene.addCallback('nodeAdded',nodeAdded,nodeType))
+        if nodeRemoved is not None:
+            ids.append(scene.addCallback('nodeRemoved',nodeRemoved,nodeType))
+        if nameChanged is not None:
+            ids.append(scene.addCallback('nameChanged',nameChanged))
+        if connectionChanged is not None:
+            ids.append(scene.addCallback('connection',connectionChanged))
+        if sceneCleared is not None:
+            ids.append(scene.addCallback('sceneCleared',sceneCleared))
+        return ids
+
+    def removeCallbacks(self,ids):
+        for i in ids:
+            self.scene.removeCallback(i)
@@ -0,0 +1,136 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('CybeRig')
+logger.addHandler(logging.NullHandler())
+
+_clock = getattr(time,'perf_counter',time.time)
+_profiler = None
+
+
+class BuildProfiler(object):
+    '''
+    collect timed spans of build stages and counters of created nodes/attributes/connections
+    '''
+    def __init__(self):
+        self.start = _clock()
+        self.end = None
+        self.timeline = []
+        self.counters = {}
+        self.depth = 0
+
+    def addSpan(self,name,start,elapsed,depth):
+        self.timeline.append((name,start-self.start,elapsed,depth))
+
+    def count(self,counter,amount=1):
+        self.counters[counter] = self.counters.get(counter,0) + amount
+
+    def report(self):
+        '''
+        return the report dict: per stage totals, the span timeline and the counters
+        '''
+        stages = {}
+        for name,start,elapsed,depth in self.timeline:
+            stage = stages.setdefault(name,{'calls' : 0,'total' : 0.0,'max' : 0.0})
+            stage['calls'] += 1
+            stage['total'] += elapsed
+            stage['max'] = max(stage['max'],elapsed)
+        end = self.end if self.end is not None else _clock()
+        return {
+            'wallTime' : end - self.start,
+            'stages' : stages,
+            'timeline' : [{'name' : n,'start' : s,'elapsed' : e,'depth' : d} for n,s,e,d in self.timeline],
+            'counters' : dict(self.counters),
+        }
+
+    def save(self,path):
+        '''
+        write the report as a json file
+        '''
+        with open(path,'w') as f:
+            json.dump(self.report(),f,indent=2,sort_keys=True)
+
+
+class _Span(object):
+    def __init__(self,profiler,name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.depth = self.profiler.depth
+        self.profiler.depth += 1
+        self.start = _clock()
+        return self
+
+    def __exit__(self,excType,excValue,tb):
+        elapsed = _clock() - self.start
+        self.profiler.depth -= 1
+        self.profiler.addSpan(self.name,self.start,elapsed,self.depth)
+        return False
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,tb):
+        return False
+
+_nullSpan = _NullSpan()
+
+def span(name):
+    '''
+    time the block as a build stage while profiling, a shared no-op otherwise
+    '''
+    if _profiler is None:
+        return _nullSpan
+    return _Span(_profiler,name)
+
+def count(counter,amount=1):
+    '''
+    add to a counter while profiling
+    '''
+    if _profiler is not None:
+        _profiler.count(counter,amount)
+
+def startProfiling():
+    '''
+    start collecting spans and counters, return the profiler
+    '''
+    global _profiler
+    _profiler = BuildProfiler()
+    return _profiler
+
+def stopProfiling(path=None):
+    '''
+    stop collecting and return the report dict, also written to path if given
+    '''
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler is None:
+        return None
+    profiler.end = _clock()
+    if path is not None:
+        profiler.save(path)
+    return profiler.report()
+
+def getProfiler():
+    '''
+    return the running profiler, None when profiling is off
+    '''
+    return _profiler
+
+@contextmanager
+def profileBuild(path=None):
+    '''
+    profile everything done in the block, the report is written to path if given
+    '''
+    profiler = startProfiling()
+    try:
+        yield profiler
+    finally:
+        if _profiler is profiler:
+            stopProfiling(path)
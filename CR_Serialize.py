@@ -0,0 +1,224 @@
+import json
+import struct
+import zlib
+
+from .CR_Backend import getBackend
+from .CR_Utils import *
+from .CR_Transaction import GraphTransaction,undoChunk
+
+SNAPSHOT_VERSION = 1
+BINARY_MAGIC = b'CRIG'
+
+# --------------------------------------------------------------
+# SNAPSHOT
+# --------------------------------------------------------------
+def snapshotRig():
+    '''
+    return a dict describing every bound, driver and connector system of the scene
+    '''
+    data = {
+        'version' : SNAPSHOT_VERSION,
+        'bound' : [],
+        'driver' : [],
+        'connector' : [],
+    }
+    for manager in iterManagers('bound'):
+        jntList = reorderSingleChainJointList(manager.boundMng.outputs())
+        data['bound'].append({
+            'manager' : manager.name(),
+            'name' : manager.name().replace('MNG_BOUND_',''),
+            'joints' : [str(j) for j in jntList],
+        })
+
+    for manager in iterManagers('driver'):
+        data['driver'].append(_snapshotDriver(manager))
+
+    for manager in iterManagers('connector'):
+        data['connector'].append(_snapshotConnector(manager))
+    return data
+
+def _snapshotDriver(manager):
+    jntList = []
+    masterGrp = None
+    masterGrpOffset = None
+    for n in manager.drvMng.outputs():
+        if n.hasAttr('driverGrp'):
+            masterGrp = n
+        elif n.hasAttr('driverGrpOffset'):
+            masterGrpOffset = n
+        else:
+            jntList.append(n)
+    jntList = reorderSingleChainJointList(jntList)
+
+    joints = _readTransforms(jntList,('translate','rotate','scale','jointOrient','rotateOrder'))
+
+    driverData = {
+        'manager' : manager.name(),
+        'name' : manager.name().replace('MNG_DRIVER_',''),
+        'joints' : joints,
+        'masterGrp' : None,
+        'masterGrpOffset' : None,
+    }
+    if (masterGrp is not None) and (masterGrpOffset is not None):
+        driverData['masterGrp'],driverData['masterGrpOffset'] = _readTransforms([masterGrp,masterGrpOffset],('translate','rotate','scale'))
+        parent = masterGrpOffset.getParent()
+        driverData['masterGrpOffset']['parent'] = str(parent) if parent is not None else None
+    return driverData
+
+def _snapshotConnector(manager):
+    drvManager = manager.Manager.inputs()
+    slots = manager.Manager.outputs(plugs=True)
+    connectorData = {
+        'manager' : manager.name(),
+        'name' : manager.name().replace('MNG_CONNECTOR_',''),
+        'driver' : drvManager[0].name() if len(drvManager) > 0 else None,
+        'bound' : slots[0].node().name() if len(slots) > 0 else None,
+        'slot' : slots[0].index() if (len(slots) > 0 and slots[0].isElement()) else None,
+        'mode' : getConnectorMode(manager),
+        'outputs' : [],
+        'inputs' : [],
+    }
+    #matrix connectors are saved as their channel pairs, the rebuild makes the helpers again
+    for connectorNode in getConnectorNodes(manager):
+        drvOutputs,bnInputs = getConnectorChannelPairs(connectorNode)
+        connectorData['outputs'].extend(drvOutputs)
+        connectorData['inputs'].extend(bnInputs)
+    return connectorData
+
+def _readTransforms(nodes,attrs):
+    #every value of every node in one backend read
+    values = getBackend().getAttrs([(n,a) for n in nodes for a in attrs])
+    transforms = []
+    for x in range(0,len(nodes)):
+        transformData = {'name' : str(nodes[x]).split('|')[-1]}
+        for y in range(0,len(attrs)):
+            value = values[x*len(attrs)+y]
+            transformData[attrs[y]] = list(value) if isinstance(value,tuple) else value
+        transforms.append(transformData)
+    return transforms
+
+# --------------------------------------------------------------
+# FILE FORMAT
+# --------------------------------------------------------------
+def encodeRig(data,binary=False):
+    '''
+    return the snapshot as bytes, plain json or the compact binary form
+    binary form: magic, version (unsigned short) then zlib compressed json
+    '''
+    body = json.dumps(data,separators=(',',':'),sort_keys=True).encode('utf-8')
+    if not binary:
+        return body
+    return BINARY_MAGIC + struct.pack('>H',data['version']) + zlib.compress(body,9)
+
+def decodeRig(payload):
+    '''
+    return the snapshot dict of bytes written by encodeRig
+    '''
+    if payload[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+        offset = len(BINARY_MAGIC)
+        version = struct.unpack('>H',payload[offset:offset+2])[0]
+        _checkVersion(version)
+        payload = zlib.decompress(payload[offset+2:])
+    data = json.loads(payload.decode('utf-8'))
+    _checkVersion(data.get('version'))
+    return data
+
+def saveRig(path,binary=False,data=None):
+    '''
+    write the snapshot of the scene (or the given one) to a file
+    '''
+    if data is None:
+        data = snapshotRig()
+    with open(path,'wb') as f:
+        f.write(encodeRig(data,binary))
+    return data
+
+def loadRig(path):
+    '''
+    return the snapshot dict stored in a file, json or binary
+    '''
+    with open(path,'rb') as f:
+        return decodeRig(f.read())
+
+def _checkVersion(version):
+    if (version is None) or (version > SNAPSHOT_VERSION):
+        raise ValueError('unsupported CybeRig snapshot version: {}'.format(version))
+
+# --------------------------------------------------------------
+# REBUILD
+# --------------------------------------------------------------
+def rebuildRig(data):
+    '''
+    rebuild every system of a snapshot in one transaction
+    the bound joints must exist in the scene, everything else is created
+    return the created manager nodes by kind
+    '''
+    with undoChunk('CR_rebuildRig'):
+        with GraphTransaction('CR_rebuildRig') as tx:
+            managers = {'bound' : {}, 'driver' : {}, 'connector' : {}}
+            created = {}
+            orients = {}
+
+            for boundData in data['bound']:
+                manager = addBoundManagerNode(boundData['name'],tx)
+                for j in boundData['joints']:
+                    tx.addAttr(j,'bound')
+                    tx.connect((manager,'boundMng'),(j,'bound'))
+                managers['bound'][boundData['manager']] = manager
+
+            for driverData in data['driver']:
+                managers['driver'][driverData['manager']] = _queueDriver(tx,driverData,created,orients)
+
+            nextSlots = {}
+            for connectorData in data['connector']:
+                bnManager = managers['bound'].get(connectorData['bound'])
+                drvManager = managers['driver'].get(connectorData['driver'])
+                if (bnManager is None) or (drvManager is None):
+                    raise ValueError('connector {} is not tied to a saved bound and driver system'.format(connectorData['name']))
+                slotIndex = connectorData['slot']
+                if slotIndex is None:
+                    slotIndex = nextSlots.get(connectorData['bound'],0)
+                nextSlots[connectorData['bound']] = max(nextSlots.get(connectorData['bound'],0),slotIndex+1)
+                slot = (bnManager,'Manager[{}]'.format(slotIndex))
+                drvOutputs = [_rebuildPlug(p,created) for p in connectorData['outputs']]
+                bnInputs = [_rebuildPlug(p,created) for p in connectorData['inputs']]
+                manager,connector = addConnectorNodes(connectorData['name'],drvManager,slot,drvOutputs,bnInputs,tx,
+                                                      connectorData.get('mode','direct'),orients)
+                managers['connector'][connectorData['manager']] = manager
+
+    return dict([(kind,[tx.resolve(m) for m in nodes.values()]) for kind,nodes in managers.items()])
+
+def _queueDriver(tx,driverData,created,orients):
+    manager = addDriverManagerNode(driverData['name'],tx)
+    parent = None
+    masterGrpData = driverData['masterGrp']
+    masterGrpOffsetData = driverData['masterGrpOffset']
+    if (masterGrpData is not None) and (masterGrpOffsetData is not None):
+        masterGrp,masterGrpOffset = addMasterGrpNodes(driverData['name'],manager,tx,masterGrpOffsetData['parent'])
+        _queueTransform(tx,masterGrpOffset,masterGrpOffsetData,('translate','rotate','scale'))
+        _queueTransform(tx,masterGrp,masterGrpData,('translate','rotate','scale'))
+        parent = masterGrp
+
+    for jointData in driverData['joints']:
+        j = tx.createNode('joint',jointData['name'],parent)
+        _queueTransform(tx,j,jointData,('translate','rotate','scale','jointOrient'))
+        tx.setAttr(j,'rotateOrder',jointData['rotateOrder'])
+        tx.addAttr(j,'driver')
+        tx.connect((manager,'drvMng'),(j,'driver'))
+        created[jointData['name']] = j
+        #matrix connectors take the orient out of the driver matrix, see addConnectorNodes
+        orients[j] = tuple(jointData['jointOrient'])
+        parent = j
+    return manager
+
+def _queueTransform(tx,node,transformData,attrs):
+    for a in attrs:
+        tx.setAttr(node,a,tuple(transformData[a]))
+
+def _rebuildPlug(plugName,created):
+    #plugs of nodes created by this rebuild point at their TxNode
+    nodeName,attrName = plugName.split('.',1)
+    node = created.get(nodeName.split('|')[-1])
+    if node is None:
+        return plugName
+    return (node,attrName)
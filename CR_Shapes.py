@@ -0,0 +1,144 @@
+import json
+import math
+from collections import OrderedDict
+
+from .CR_Backend import getBackend
+from .CR_Transaction import GraphTransaction,CurveData
+from .CR_Math import _np
+
+#linear controller shapes, the knots are 0..n-1
+LINEARSHAPES = OrderedDict([
+    ('square',[(-1,0,1),(-1,0,-1),(1,0,-1),(1,0,1),(-1,0,1)]),
+    ('sphere',[(-1,0,0),(-0.66,0,-0.66),(0,0,-1),(0.66,0,-0.66),(1,0,0),(0.66,0,0.66),(0,0,1),(-0.66,0,0.66),(-1,0,0),(-0.66,0.66,0),(0,1,0),(0.66,0.66,0),(1,0,0),(0.66,-0.66,0),(0,-1,0),(-0.66,-0.66,0),(-1,0,0),(-0.66,0.66,0),(0,1,0),(0,0.66,0.66),(0,0,1),(0,-0.66,0.66),(0,-1,0),(0,-0.66,-0.66),(0,0,-1),(0,0.66,-0.66),(0,1,0)]),
+    ('cube',[(1,-1,1),(1,-1,-1),(-1,-1,-1),(-1,-1,1),(1,-1,1),(1,1,1),(1,1,-1),(-1,1,-1),(-1,1,1),(1,1,1),(-1,1,1),(-1,-1,1),(-1,-1,-1),(-1,1,-1),(1,1,-1),(1,-1,-1)]),
+    ('arrow',[(-0.5,0,-1),(-0.5,0,0.25),(-1,0,0.25),(0,0,1),(1,0,0.25),(0.5,0,0.25),(0.5,0,-1),(-0.5,0,-1)]),
+    ('cross',[(-0.33333,0,1),(-0.33333,0,0.333333),(-1,0,0.333333),(-1,0,-0.333333),(-0.33333,0,-0.333333),(-0.33333,0,-1),(0.333333,0,-1),(0.333333,0,-0.333333),(1,0,-0.333333),(1,0,0.333333),(0.333333,0,0.333333),(0.333333,0,1),(-0.33333,0,1)]),
+    ('diamond',[(0,0,1),(-1,0,0),(0,0,-1),(1,0,0),(0,0,1),(0,1,0),(0,0,-1),(0,-1,0),(0,0,1),(1,0,0),(0,1,0),(-1,0,0),(0,-1,0),(1,0,0)]),
+])
+
+def _circlePoints(sections=8):
+    #same cvs as pm.circle(nr=[1,0,0]) of radius 1, the first degree cvs repeat at the end
+    points = []
+    for x in range(0,sections):
+        angle = -2*math.pi*(x+1)/sections
+        points.append((0.0,1.108194*math.sin(angle),-1.108194*math.cos(angle)))
+    return points+points[:3]
+
+
+class ShapeLibrary(object):
+    '''
+    controller shape templates, each one compiled once to point/knot arrays
+    user shapes are loaded from json files {name: {points, knots, degree, form}}
+    '''
+    def __init__(self):
+        self.templates = OrderedDict()
+        self.add('circle',_circlePoints(),range(-2,11),3,CurveData.PERIODIC)
+        for name,points in LINEARSHAPES.items():
+            self.add(name,points)
+
+    def add(self,name,points,knots=None,degree=1,form=CurveData.OPEN):
+        '''
+        compile a shape template, knots default to 0..n-1 for linear curves
+        '''
+        if knots is None:
+            knots = range(0,len(points))
+        if _np is not None:
+            points = _np.array(points,dtype=float).reshape(-1,3)
+            knots = _np.array(list(knots),dtype=float)
+        else:
+            points = [tuple([float(v) for v in p]) for p in points]
+            knots = [float(k) for k in knots]
+        self.templates[name] = CurveData(points,knots,degree,form)
+
+    def get(self,name):
+        if name not in self.templates:
+            raise ValueError('unknown controller shape {}'.format(name))
+        return self.templates[name]
+
+    def names(self):
+        return list(self.templates.keys())
+
+    def scaled(self,name,size):
+        '''
+        return the curve data of a shape scaled by size, the template is shared
+        '''
+        template = self.get(name)
+        if _np is not None:
+            points = template.points*size
+        else:
+            points = [(p[0]*size,p[1]*size,p[2]*size) for p in template.points]
+        return CurveData(points,template.knots,template.degree,template.form)
+
+    def load(self,path):
+        '''
+        add the shapes of a json file, return their names
+        '''
+        with open(path,'r') as f:
+            data = json.load(f,object_pairs_hook=OrderedDict)
+        for name,shape in data.items():
+            self.add(name,shape['points'],shape.get('knots'),shape.get('degree',1),shape.get('form',CurveData.OPEN))
+        return list(data.keys())
+
+    def save(self,path,names=None):
+        '''
+        write shapes to a json file loadable with load, every shape by default
+        '''
+        data = OrderedDict()
+        for name in (names if names is not None else self.names()):
+            template = self.get(name)
+            data[name] = OrderedDict([
+                ('points',[[float(v) for v in p] for p in template.points]),
+                ('knots',[float(k) for k in template.knots]),
+                ('degree',template.degree),
+                ('form',template.form),
+            ])
+        with open(path,'w') as f:
+            json.dump(data,f,indent=1)
+
+_shapeLibrary = None
+
+def getShapeLibrary():
+    '''
+    return the shared shape library, created on first use
+    '''
+    global _shapeLibrary
+    if _shapeLibrary is None:
+        _shapeLibrary = ShapeLibrary()
+    return _shapeLibrary
+
+def boneLengths(joints):
+    '''
+    return the distance of every joint to the next one in one matrix read
+    the last joint takes the length of the bone before it
+    '''
+    if len(joints) == 0:
+        return []
+    positions = [m[3][:3] for m in getBackend().worldMatrices(joints)]
+    lengths = []
+    for x in range(0,len(positions)-1):
+        a,b = positions[x],positions[x+1]
+        lengths.append(math.sqrt((b[0]-a[0])**2 + (b[1]-a[1])**2 + (b[2]-a[2])**2))
+    lengths.append(lengths[-1] if len(lengths) > 0 else 1.0)
+    return lengths
+
+def attachShapes(joints,shape='circle',size=1.0,boneScale=None,transaction=None,sizes=None):
+    '''
+    give every joint a controller shape, created right under the joint in one transaction
+    boneScale sizes each shape from its bone length instead of size, sizes gives each shape its own size
+    queued on the transaction if given, return the shapes otherwise
+    '''
+    library = getShapeLibrary()
+    if sizes is None and boneScale is not None:
+        sizes = [l*boneScale for l in boneLengths(joints)]
+    elif sizes is None:
+        sizes = [size]*len(joints)
+    tx = transaction if transaction is not None else GraphTransaction('CR_attachShapes')
+    shapes = []
+    for j,s in zip(joints,sizes):
+        shapeNode = tx.createNode('nurbsCurve',j.name()+'Shape',j)
+        tx.setAttr(shapeNode,'cached',library.scaled(shape,s))
+        shapes.append(shapeNode)
+    if transaction is not None:
+        return shapes
+    tx.commit()
+    return [tx.resolve(s) for s in shapes]
@@ -0,0 +1,504 @@
+import os
+import time
+from contextlib import contextmanager
+
+from .CR_Profile import span,count
+
+try:
+    import maya.cmds as cmds
+    import maya.api.OpenMaya as om
+    import pymel.core as pm
+except ImportError:
+    #no maya in this session, only the recording executor is usable
+    cmds = None
+    om = None
+    pm = None
+
+try:
+    stringTypes = (basestring,)
+except NameError:
+    stringTypes = (str,)
+
+_clock = getattr(time,'perf_counter',time.time)
+
+FLUSH_PLUGIN = 'CR_TransactionCmd'
+FLUSH_COMMAND = 'crFlushTransaction'
+
+_pendingJobs = []
+_defaultExecutor = None
+
+
+class TxNode(object):
+    '''
+    placeholder of a node queued in a transaction
+    it is resolved to a scene node once the transaction is committed
+    '''
+    def __init__(self,nodeType,name,parent=None):
+        self.nodeType = nodeType
+        self.iname = name
+        self.parent = parent
+
+    def name(self):
+        return self.iname
+
+    def __repr__(self):
+        return 'TxNode({}, {})'.format(self.nodeType,self.iname)
+
+
+class CurveData(object):
+    '''
+    nurbs curve geometry, the value of the cached plug of a nurbsCurve shape
+    form follows MFnNurbsCurve: open, closed or periodic
+    '''
+    OPEN = 1
+    CLOSED = 2
+    PERIODIC = 3
+
+    def __init__(self,points,knots,degree=1,form=OPEN):
+        self.points = points
+        self.knots = knots
+        self.degree = degree
+        self.form = form
+
+    def __repr__(self):
+        return 'CurveData({} points, degree {})'.format(len(self.points),self.degree)
+
+
+class GraphTransaction(object):
+    '''
+    queue node creation, dynamic attributes, values and connections
+    then flush all of them in one batch (one modifier, one undo chunk)
+
+    nodes are either scene nodes or TxNode returned by createNode
+    plugs are either (node,'attr') tuples or scene plugs like pymel attributes
+    '''
+    def __init__(self,name='CybeRig',executor=None):
+        self.iname = name
+        self.executor = executor if executor is not None else getDefaultExecutor()
+        self.ops = []
+        self.attrKeys = set()
+        self.resolved = {}
+        self.flushTime = 0.0
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,tb):
+        if excType is None and not self.committed:
+            self.commit()
+        return False
+
+    # queue methods
+    def createNode(self,nodeType,name,parent=None):
+        '''
+        queue a new node, parent can be a scene node or another TxNode
+        '''
+        node = TxNode(nodeType,name,parent)
+        self.ops.append(('createNode',node))
+        return node
+
+    def addAttr(self,node,attrName,attrType='double',multi=False,ifMissing=True):
+        '''
+        queue a dynamic attribute, skipped at flush time if it already exists
+        '''
+        #scene nodes are keyed by name, the same node may come as different objects
+        key = (node if isinstance(node,TxNode) else str(node),attrName)
+        if key in self.attrKeys:
+            return
+        self.attrKeys.add(key)
+        self.ops.append(('addAttr',node,attrName,attrType,multi,ifMissing))
+
+    def setAttr(self,node,attrName,value):
+        '''
+        queue an attribute value, tuples/lists set the compound children
+        '''
+        self.ops.append(('setAttr',node,attrName,value))
+
+    def connect(self,src,dst):
+        '''
+        queue a connection, an existing input of dst is replaced like pymel >>
+        '''
+        self.ops.append(('connect',src,dst))
+
+    def disconnect(self,src,dst):
+        '''
+        queue a disconnection, skipped at flush time if the plugs are not connected
+        '''
+        self.ops.append(('disconnect',src,dst))
+
+    def mark(self):
+        '''
+        return a point of the queue rollback can go back to
+        '''
+        return len(self.ops)
+
+    def rollback(self,mark):
+        '''
+        drop every operation queued after mark
+        '''
+        for op in self.ops[mark:]:
+            if op[0] == 'addAttr':
+                node = op[1]
+                self.attrKeys.discard((node if isinstance(node,TxNode) else str(node),op[2]))
+        del self.ops[mark:]
+
+    # flush methods
+    def commit(self):
+        '''
+        flush every queued operation through the executor
+        '''
+        if self.committed:
+            raise RuntimeError('transaction {} is already committed'.format(self.iname))
+        start = _clock()
+        with span('flush'):
+            self.resolved = self.executor.execute(self.iname,self.ops)
+        self.flushTime = _clock() - start
+        self.committed = True
+
+        opCounts = self.opCounts()
+        count('flushes')
+        count('nodes',opCounts.get('createNode',0))
+        count('attributes',opCounts.get('addAttr',0))
+        count('connections',opCounts.get('connect',0))
+        return self.resolved
+
+    def resolve(self,node):
+        '''
+        return the scene node of a TxNode, scene nodes are returned as is
+        '''
+        if isinstance(node,TxNode):
+            if not self.committed:
+                raise RuntimeError('transaction {} is not committed yet'.format(self.iname))
+            return self.resolved[node]
+        return node
+
+    # get methods
+    def opCount(self):
+        '''
+        return the amount of queued operations
+        '''
+        return len(self.ops)
+
+    def opCounts(self):
+        '''
+        return the amount of queued operations per kind
+        '''
+        counts = {}
+        for op in self.ops:
+            counts[op[0]] = counts.get(op[0],0) + 1
+        return counts
+
+
+# --------------------------------------------------------------
+# EXECUTORS
+# --------------------------------------------------------------
+class RecordingExecutor(object):
+    '''
+    fake executor recording the flushed operations without any scene
+    used to measure op counts and flush time outside of maya
+    '''
+    def __init__(self):
+        self.flushes = []
+        self.chunks = []
+        self.names = set()
+
+    def execute(self,txName,ops):
+        self.flushes.append((txName,list(ops)))
+        resolved = {}
+        for op in ops:
+            if op[0] == 'createNode':
+                resolved[op[1]] = self._uniqueName(op[1].iname)
+        return resolved
+
+    def openChunk(self,name):
+        self.chunks.append(name)
+
+    def closeChunk(self):
+        pass
+
+    def _uniqueName(self,name):
+        uniqueName = name
+        x = 1
+        while uniqueName in self.names:
+            uniqueName = name + str(x)
+            x += 1
+        self.names.add(uniqueName)
+        return uniqueName
+
+    def opCount(self):
+        '''
+        return the amount of operations flushed so far
+        '''
+        return sum([len(ops) for _,ops in self.flushes])
+
+    def flushCount(self):
+        '''
+        return the amount of flushes so far
+        '''
+        return len(self.flushes)
+
+
+class MayaExecutor(object):
+    '''
+    flush the operations through one MDagModifier inside one undo chunk
+    the modifier runs in the crFlushTransaction command so it is undoable
+    scene nodes and plugs are looked up through handles, a backend HandleCache, when given
+    '''
+    def __init__(self,handles=None):
+        self.handles = handles
+
+    def execute(self,txName,ops):
+        if cmds is None:
+            raise RuntimeError('maya is not available, set a default executor first')
+        loadFlushCommand()
+        job = ModifierJob(ops,self.handles)
+        _pendingJobs.append(job)
+        self.openChunk(txName)
+        try:
+            getattr(cmds,FLUSH_COMMAND)()
+        finally:
+            self.closeChunk()
+        return dict([(node,pm.PyNode(path)) for node,path in job.created.items()])
+
+    def openChunk(self,name):
+        cmds.undoInfo(openChunk=True,chunkName=name)
+
+    def closeChunk(self):
+        cmds.undoInfo(closeChunk=True)
+
+
+def loadFlushCommand():
+    '''
+    load the plugin holding the undoable flush command
+    '''
+    if not cmds.pluginInfo(FLUSH_PLUGIN,query=True,loaded=True):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),FLUSH_PLUGIN+'.py')
+        cmds.loadPlugin(path,quiet=True)
+
+def popPendingJob():
+    '''
+    return the oldest job waiting for the flush command
+    '''
+    return _pendingJobs.pop(0)
+
+def getDefaultExecutor():
+    '''
+    return the executor used by transactions created without one
+    '''
+    global _defaultExecutor
+    if _defaultExecutor is None:
+        _defaultExecutor = MayaExecutor()
+    return _defaultExecutor
+
+def setDefaultExecutor(executor):
+    '''
+    set the executor used by transactions created without one
+    '''
+    global _defaultExecutor
+    _defaultExecutor = executor
+
+@contextmanager
+def undoChunk(name='CybeRig',executor=None):
+    '''
+    group everything done in the block, transactions included, in one undo chunk
+    '''
+    executor = executor if executor is not None else getDefaultExecutor()
+    executor.openChunk(name)
+    try:
+        yield
+    finally:
+        executor.closeChunk()
+
+
+# --------------------------------------------------------------
+# MODIFIER JOB
+# --------------------------------------------------------------
+class ModifierJob(object):
+    '''
+    run the operations of one transaction through a single MDagModifier
+    phases: nodes, attributes, then values and connections
+    '''
+    def __init__(self,ops,handles=None):
+        self.ops = ops
+        self.handles = handles
+        self.modifier = om.MDagModifier()
+        self.objects = {}
+        self.created = {}
+
+    def doIt(self):
+        mod = self.modifier
+        nodeOps = [op for op in self.ops if op[0] == 'createNode']
+        attrOps = [op for op in self.ops if op[0] == 'addAttr']
+        plugOps = [op for op in self.ops if op[0] in ('setAttr','connect','disconnect')]
+
+        for _,node in nodeOps:
+            parent = om.MObject.kNullObj
+            if node.parent is not None:
+                parent = self._mobject(node.parent)
+            try:
+                obj = mod.createNode(node.nodeType,parent)
+            except (RuntimeError,TypeError):
+                #not a dag node
+                obj = om.MDGModifier.createNode(mod,node.nodeType)
+            mod.renameNode(obj,node.iname)
+            self.objects[node] = obj
+        mod.doIt()
+
+        for _,node,attrName,attrType,multi,ifMissing in attrOps:
+            obj = self._mobject(node)
+            if ifMissing and om.MFnDependencyNode(obj).hasAttribute(attrName):
+                continue
+            mod.addAttribute(obj,createAttribute(attrName,attrType,multi))
+        mod.doIt()
+
+        for op in plugOps:
+            if op[0] == 'setAttr':
+                setPlugValue(mod,findPlug(self._mobject(op[1]),op[2]),op[3])
+            elif op[0] == 'disconnect':
+                src = self._plug(op[1])
+                dst = self._plug(op[2])
+                if dst.isDestination and dst.source() == src:
+                    mod.disconnect(src,dst)
+            else:
+                src = self._plug(op[1])
+                dst = self._plug(op[2])
+                if dst.isDestination:
+                    mod.disconnect(dst.source(),dst)
+                mod.connect(src,dst)
+        mod.doIt()
+
+        for node,obj in self.objects.items():
+            if obj.hasFn(om.MFn.kDagNode):
+                self.created[node] = om.MFnDagNode(obj).fullPathName()
+            else:
+                self.created[node] = om.MFnDependencyNode(obj).name()
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+    def _mobject(self,node):
+        if node not in self.objects:
+            if self.handles is not None:
+                self.objects[node] = self.handles.nodeHandles([node])[0].object()
+            else:
+                sel = om.MSelectionList()
+                sel.add(str(node))
+                self.objects[node] = sel.getDependNode(0)
+        return self.objects[node]
+
+    def _plug(self,plug):
+        if not isinstance(plug,tuple):
+            plug = tuple(str(plug).split('.',1))
+        if isinstance(plug[0],TxNode) or self.handles is None:
+            return findPlug(self._mobject(plug[0]),plug[1])
+        return self.handles.plug(plug[0],plug[1])
+
+
+def findPlug(obj,attrPath):
+    '''
+    return the MPlug of a node from an attribute path like 'Manager[3]' or 'worldMatrix[0]'
+    '''
+    fn = om.MFnDependencyNode(obj)
+    plug = None
+    for part in attrPath.split('.'):
+        name,index = part,None
+        if part.endswith(']'):
+            name,index = part[:-1].split('[')
+        if plug is None:
+            plug = fn.findPlug(name,False)
+        else:
+            plug = plug.child(fn.attribute(name))
+        if index is not None:
+            plug = plug.elementByLogicalIndex(int(index))
+    return plug
+
+def createAttribute(attrName,attrType='double',multi=False):
+    '''
+    create the attribute MObject for a dynamic attribute
+    the default type is double, same as addAttr without type
+    '''
+    if attrType == 'message':
+        fn = om.MFnMessageAttribute()
+        attr = fn.create(attrName,attrName)
+    elif attrType == 'matrix':
+        fn = om.MFnMatrixAttribute()
+        attr = fn.create(attrName,attrName)
+    elif attrType == 'string':
+        fn = om.MFnTypedAttribute()
+        attr = fn.create(attrName,attrName,om.MFnData.kString)
+    else:
+        numericTypes = {
+            'double' : om.MFnNumericData.kDouble,
+            'float' : om.MFnNumericData.kFloat,
+            'long' : om.MFnNumericData.kInt,
+            'bool' : om.MFnNumericData.kBoolean,
+        }
+        fn = om.MFnNumericAttribute()
+        attr = fn.create(attrName,attrName,numericTypes[attrType])
+    fn.array = multi
+    return attr
+
+def setPlugValue(mod,plug,value):
+    '''
+    queue a plug value on the modifier, angles in degrees and distances in ui units
+    '''
+    if isinstance(value,CurveData):
+        data = om.MFnNurbsCurveData().create()
+        points = om.MPointArray([om.MPoint(p[0],p[1],p[2]) for p in value.points])
+        om.MFnNurbsCurve().create(points,[float(k) for k in value.knots],value.degree,value.form,False,False,data)
+        mod.newPlugValue(plug,data)
+    elif isinstance(value,(tuple,list)) and isinstance(value[0],(tuple,list)):
+        #nested 4x4 rows are a matrix value
+        matrix = om.MMatrix([float(v) for row in value for v in row])
+        mod.newPlugValue(plug,om.MFnMatrixData().create(matrix))
+    elif isinstance(value,(tuple,list)):
+        for x in range(0,len(value)):
+            setPlugValue(mod,plug.child(x),value[x])
+    elif isinstance(value,bool):
+        mod.newPlugValueBool(plug,value)
+    elif isinstance(value,int):
+        mod.newPlugValueInt(plug,value)
+    elif isinstance(value,stringTypes):
+        mod.newPlugValueString(plug,value)
+    else:
+        attr = plug.attribute()
+        unitType = None
+        if attr.hasFn(om.MFn.kUnitAttribute):
+            unitType = om.MFnUnitAttribute(attr).unitType()
+        if unitType == om.MFnUnitAttribute.kAngle:
+            mod.newPlugValueMAngle(plug,om.MAngle(value,om.MAngle.kDegrees))
+        elif unitType == om.MFnUnitAttribute.kDistance:
+            mod.newPlugValueMDistance(plug,om.MDistance(value,om.MDistance.uiUnit()))
+        else:
+            mod.newPlugValueDouble(plug,value)
+
+def getPlugValue(plug):
+    '''
+    return the value of a plug, compounds as tuples, angles in degrees and distances in ui units
+    '''
+    if plug.isCompound:
+        return tuple([getPlugValue(plug.child(x)) for x in range(0,plug.numChildren())])
+    attr = plug.attribute()
+    if attr.hasFn(om.MFn.kUnitAttribute):
+        unitType = om.MFnUnitAttribute(attr).unitType()
+        if unitType == om.MFnUnitAttribute.kAngle:
+            return plug.asMAngle().asUnits(om.MAngle.kDegrees)
+        if unitType == om.MFnUnitAttribute.kDistance:
+            return plug.asMDistance().asUnits(om.MDistance.uiUnit())
+        return plug.asDouble()
+    if attr.hasFn(om.MFn.kNumericAttribute):
+        numericType = om.MFnNumericAttribute(attr).numericType()
+        if numericType == om.MFnNumericData.kBoolean:
+            return plug.asBool()
+        if numericType in (om.MFnNumericData.kByte,om.MFnNumericData.kChar,om.MFnNumericData.kShort,om.MFnNumericData.kInt):
+            return plug.asInt()
+        return plug.asDouble()
+    if attr.hasFn(om.MFn.kEnumAttribute):
+        return plug.asShort()
+    if attr.hasFn(om.MFn.kTypedAttribute):
+        return plug.asString()
+    return plug.asDouble()
@@ -0,0 +1,52 @@
+'''
+maya plugin registering the undoable command that flushes CR transactions
+loaded on demand by CR_Transaction.loadFlushCommand
+'''
+import os
+import importlib
+
+import maya.api.OpenMaya as om
+
+def maya_useNewAPI():
+    '''
+    tell maya this plugin uses the python api 2.0
+    '''
+    pass
+
+def _transactionModule():
+    #maya loads this file as a standalone module, reach the package one for the job queue
+    package = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+    return importlib.import_module(package+'.CR_Transaction')
+
+class FlushTransactionCmd(om.MPxCommand):
+    '''
+    run the pending modifier job and keep it for undo/redo
+    '''
+    kCmdName = 'crFlushTransaction'
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.job = None
+
+    @staticmethod
+    def creator():
+        return FlushTransactionCmd()
+
+    def doIt(self,args):
+        self.job = _transactionModule().popPendingJob()
+        self.job.doIt()
+
+    def undoIt(self):
+        self.job.undoIt()
+
+    def redoIt(self):
+        self.job.redoIt()
+
+    def isUndoable(self):
+        return True
+
+def initializePlugin(plugin):
+    om.MFnPlugin(plugin,'CybeRig','1.0').registerCommand(FlushTransactionCmd.kCmdName,FlushTransactionCmd.creator)
+
+def uninitializePlugin(plugin):
+    om.MFnPlugin(plugin).deregisterCommand(FlushTransactionCmd.kCmdName)
@@ -0,0 +1,501 @@
+from collections import OrderedDict
+import time
+
+from .CR_Backend import cmds
+from .CR_Utils import MANAGERKINDS,getManagerRegistry
+from .CR_Units import BoundJoints,DriverSystem,ConnectorSystem
+from .CR_Profile import logger
+
+try:
+    from PySide2 import QtCore,QtWidgets
+except ImportError:
+    #no Qt in this session (batch, farm), only the SystemIndex can be used
+    QtCore = None
+    QtWidgets = None
+
+try:
+    from shiboken2 import wrapInstance
+    import maya.OpenMayaUI as omui
+except ImportError:
+    wrapInstance = None
+    omui = None
+
+_clock = getattr(time,'perf_counter',time.time)
+
+#seconds of work per timer tick, keeps maya responsive while the browser fills
+TIMESLICE = 0.01
+#rows inserted per fetch
+FETCHCHUNK = 200
+#rows waiting to be resolved, the oldest requests are dropped first
+RESOLVEQUEUE = 400
+
+SYSTEMCLASSES = OrderedDict([
+    ('bound',BoundJoints),
+    ('driver',DriverSystem),
+    ('connector',ConnectorSystem),
+])
+
+#info dict key and header of each column, the first column is the system name
+COLUMNS = {
+    'bound' : (('name','Name'),('jntCount','Joints'),('startJnt','Start'),('endJnt','End'),('parent','Parent'),('skinNodeList','Skins'),('connectorPlugs','Connectors')),
+    'driver' : (('name','Name'),('jntCount','Joints'),('startJnt','Start'),('endJnt','End'),('parent','Parent'),('connectorPlugs','Connectors')),
+    'connector' : (('name','Name'),('mode','Mode'),('bound_manager','Bound'),('driver_manager','Driver'),('inputs','Channels')),
+}
+
+# --------------------------------------------------------------
+# SYSTEM INDEX
+# --------------------------------------------------------------
+class SystemIndex(object):
+    '''
+    cached rows of the systems of one kind for the browser, without any Qt
+    rows are manager names taken from the manager registry, then kept current by its events
+    info dicts are resolved one row at a time on request and kept until a manager connection changes
+    '''
+    def __init__(self,kind,registry=None):
+        if kind not in MANAGERKINDS:
+            raise ValueError('unknown system kind %s' % kind)
+        self.kind = kind
+        self.prefix = MANAGERKINDS[kind][0]
+        self.registry = registry if registry is not None else getManagerRegistry()
+        self.rows = []
+        self.rowOf = {}
+        self.waiting = OrderedDict()
+        self.infos = {}
+        self.systems = {}
+        self.events = []
+        self.registry.addListener(self._event)
+
+    def reset(self):
+        '''
+        drop every row and cached info, the registry names wait to be fetched again
+        '''
+        registry = getManagerRegistry()
+        if registry is not self.registry:
+            #another scene backend, follow its registry
+            self.registry.removeListener(self._event)
+            self.registry = registry
+            self.registry.addListener(self._event)
+        self.rows = []
+        self.rowOf = {}
+        self.infos.clear()
+        self.systems.clear()
+        #the names read here already cover the events recorded so far
+        self.waiting = OrderedDict.fromkeys(self.registry.iterNames(self.kind))
+        self.events = []
+
+    def detach(self):
+        '''
+        stop listening to the registry
+        '''
+        self.registry.removeListener(self._event)
+        self.events = []
+
+    def canFetch(self):
+        '''
+        return True if some names wait to be added as rows
+        '''
+        return len(self.waiting) > 0
+
+    def nextNames(self,amount=FETCHCHUNK):
+        '''
+        return the next names waiting to be added as rows, see insert
+        '''
+        names = []
+        for name in self.waiting:
+            if len(names) == amount:
+                break
+            names.append(name)
+        return names
+
+    def insert(self,names):
+        '''
+        append the names as rows
+        '''
+        for name in names:
+            self.waiting.pop(name,None)
+            self.rowOf[name] = len(self.rows)
+            self.rows.append(name)
+
+    def removeRow(self,row):
+        '''
+        remove the row and forget its cached info
+        '''
+        name = self.rows.pop(row)
+        self.rowOf.pop(name)
+        for n in self.rows[row:]:
+            self.rowOf[n] -= 1
+        self._forget(name)
+
+    def renameRow(self,row,name):
+        '''
+        show the row under its new manager name
+        '''
+        oldName = self.rows[row]
+        self.rowOf.pop(oldName)
+        self._forget(oldName)
+        self.rows[row] = name
+        self.rowOf[name] = row
+
+    def label(self,row):
+        '''
+        return the system name of the row, read from the manager name only
+        '''
+        return self.rows[row][len(self.prefix):]
+
+    def info(self,row):
+        '''
+        return the cached info dict of the row, None if never resolved
+        the dict may be stale, isCurrent tells, see resolve
+        '''
+        entry = self.infos.get(self.rows[row])
+        if entry is None:
+            return None
+        return entry[1]
+
+    def isCurrent(self,row):
+        '''
+        return True if the cached info of the row was resolved since the last connection change
+        '''
+        entry = self.infos.get(self.rows[row])
+        return entry is not None and entry[0] == self._stamp()
+
+    def resolve(self,row):
+        '''
+        read the info dict of the row from the scene and cache it
+        broken systems get an info dict with their error only
+        '''
+        name = self.rows[row]
+        system = self.systems.get(name)
+        if system is None:
+            manager = self.registry.getManager(self.kind,name)
+            if manager is None:
+                return None
+            system = SYSTEMCLASSES[self.kind].from_manager(manager)
+            self.systems[name] = system
+        stamp = self._stamp()
+        try:
+            if self.kind == 'connector':
+                info = system.getConnectorsInfo()
+            else:
+                info = system.getJointsInfo()
+        except Exception as e:
+            logger.warning('cannot read the %s system %s: %s' % (self.kind,name,e))
+            info = {'name':self.label(row),'error':str(e)}
+        self.infos[name] = (stamp,info)
+        return info
+
+    def takeEvents(self):
+        '''
+        return the registry events recorded since the last call
+        '''
+        events = self.events
+        self.events = []
+        return events
+
+    # private methods
+    def _stamp(self):
+        return (self.registry,self.registry.generation())
+
+    def _forget(self,name):
+        self.infos.pop(name,None)
+        self.systems.pop(name,None)
+
+    def _event(self,event,kind,name):
+        #connections of the other kinds change the names shown here too (connector managers)
+        if kind is None or kind == self.kind or event == 'changed':
+            #builds send a change per connection, one is enough
+            if len(self.events) > 0 and self.events[-1] == (event,kind,name):
+                return
+            self.events.append((event,kind,name))
+
+# --------------------------------------------------------------
+# QT MODEL
+# --------------------------------------------------------------
+_TableModel = QtCore.QAbstractTableModel if QtCore is not None else object
+_Widget = QtWidgets.QWidget if QtWidgets is not None else object
+
+class SystemModel(_TableModel):
+    '''
+    virtual table of the systems of one kind
+    rows are fetched in chunks and the info of a row is only read once a view asks for it,
+    the reads and fetches run on a timer in short time slices
+    '''
+    def __init__(self,kind,parent=None):
+        super(SystemModel,self).__init__(parent)
+        self.systemIndex = SystemIndex(kind)
+        self.columns = COLUMNS[kind]
+        #rows asked for by the views, the latest requests are resolved first
+        self.requested = OrderedDict()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self._work)
+        self.systemIndex.registry.addListener(self._schedule)
+        self.refresh()
+
+    def refresh(self):
+        '''
+        read the rows again from the registry, for changes the scene events do not cover (joint renames)
+        '''
+        self.beginResetModel()
+        self.systemIndex.registry.removeListener(self._schedule)
+        self.systemIndex.reset()
+        self.systemIndex.registry.addListener(self._schedule)
+        self.requested.clear()
+        self.endResetModel()
+        self._schedule()
+
+    def detach(self):
+        '''
+        stop listening to the scene, to be called before the model is deleted
+        '''
+        self.timer.stop()
+        self.systemIndex.registry.removeListener(self._schedule)
+        self.systemIndex.detach()
+
+    def systemName(self,row):
+        '''
+        return the manager name of the row
+        '''
+        return self.systemIndex.rows[row]
+
+    # qt overrides
+    def rowCount(self,parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.systemIndex.rows)
+
+    def columnCount(self,parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def headerData(self,section,orientation,role=None):
+        if orientation == QtCore.Qt.Horizontal and role in (None,QtCore.Qt.DisplayRole):
+            return self.columns[section][1]
+        return None
+
+    def canFetchMore(self,parent=None):
+        if parent is not None and parent.isValid():
+            return False
+        return self.systemIndex.canFetch()
+
+    def fetchMore(self,parent=None):
+        if parent is not None and parent.isValid():
+            return
+        names = self.systemIndex.nextNames()
+        if len(names) == 0:
+            return
+        first = len(self.systemIndex.rows)
+        self.beginInsertRows(QtCore.QModelIndex(),first,first+len(names)-1)
+        self.systemIndex.insert(names)
+        self.endInsertRows()
+
+    def data(self,index,role=None):
+        if not index.isValid():
+            return None
+        if role is None:
+            role = QtCore.Qt.DisplayRole
+        if role not in (QtCore.Qt.DisplayRole,QtCore.Qt.ToolTipRole):
+            return None
+        row = index.row()
+        key = self.columns[index.column()][0]
+        if key == 'name' and role == QtCore.Qt.DisplayRole:
+            #names are known without the scene, filtering reads them for every row
+            return self.systemIndex.label(row)
+        info = self.systemIndex.info(row)
+        if not self.systemIndex.isCurrent(row):
+            #shown stale until resolved by the timer
+            self._request(row)
+        if info is None:
+            return None
+        if role == QtCore.Qt.ToolTipRole:
+            return _infoText(info)
+        return _cellText(info.get(key))
+
+    # private methods
+    def _schedule(self,*args):
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def _request(self,row):
+        name = self.systemIndex.rows[row]
+        self.requested.pop(name,None)
+        self.requested[name] = None
+        if len(self.requested) > RESOLVEQUEUE:
+            self.requested.popitem(last=False)
+        self._schedule()
+
+    def _work(self):
+        start = _clock()
+        self._applyEvents()
+        while self.canFetchMore() and _clock()-start < TIMESLICE:
+            self.fetchMore()
+        while len(self.requested) > 0 and _clock()-start < TIMESLICE:
+            name = self.requested.popitem()[0]
+            row = self.systemIndex.rowOf.get(name)
+            if row is None or self.systemIndex.isCurrent(row):
+                continue
+            self.systemIndex.resolve(row)
+            self.dataChanged.emit(self.index(row,0),self.index(row,len(self.columns)-1))
+        if len(self.systemIndex.events) == 0 and not self.canFetchMore() and len(self.requested) == 0:
+            self.timer.stop()
+
+    def _applyEvents(self):
+        if len(self.systemIndex.registry.pending) > 0:
+            #new scene nodes, the managers among them come back as added events
+            self.systemIndex.registry.flush()
+        changed = False
+        for event,kind,name in self.systemIndex.takeEvents():
+            if event == 'cleared':
+                self.refresh()
+                return
+            if event == 'added':
+                if name not in self.systemIndex.rowOf:
+                    self.systemIndex.waiting[name] = None
+            elif event == 'removed':
+                self.systemIndex.waiting.pop(name,None)
+                row = self.systemIndex.rowOf.get(name)
+                if row is not None:
+                    self.beginRemoveRows(QtCore.QModelIndex(),row,row)
+                    self.systemIndex.removeRow(row)
+                    self.endRemoveRows()
+            elif event == 'renamed':
+                oldName,newName = name
+                row = self.systemIndex.rowOf.get(oldName)
+                if row is not None:
+                    self.systemIndex.renameRow(row,newName)
+                    self.dataChanged.emit(self.index(row,0),self.index(row,len(self.columns)-1))
+                elif oldName in self.systemIndex.waiting:
+                    self.systemIndex.waiting.pop(oldName)
+                    self.systemIndex.waiting[newName] = None
+            elif event == 'changed':
+                changed = True
+        if changed and len(self.systemIndex.rows) > 0:
+            #the views ask again for the rows they show, only those are read
+            self.dataChanged.emit(self.index(0,0),self.index(len(self.systemIndex.rows)-1,len(self.columns)-1))
+
+def _cellText(value):
+    if isinstance(value,(list,tuple)):
+        if len(value) > 0 and len(value) <= 3:
+            return ', '.join([str(v) for v in value])
+        return str(len(value))
+    if value is None:
+        return ''
+    return str(value)
+
+def _infoText(info):
+    if info is None:
+        return None
+    lines = []
+    for key in sorted(info):
+        value = info[key]
+        if isinstance(value,(list,tuple)):
+            value = ', '.join([str(v) for v in value])
+        lines.append('%s: %s' % (key,value))
+    return '\n'.join(lines)
+
+# --------------------------------------------------------------
+# BROWSER PANEL
+# --------------------------------------------------------------
+class SystemBrowser(_Widget):
+    '''
+    panel listing the bound, driver and connector systems of the scene, one tab per kind
+    double click a row to select its joints (its manager for connectors)
+    '''
+    def __init__(self,parent=None):
+        super(SystemBrowser,self).__init__(parent)
+        self.setWindowTitle('CybeRig Systems')
+        self.setWindowFlags(QtCore.Qt.Window)
+        self.models = OrderedDict()
+        self.proxies = OrderedDict()
+
+        self.filterEdit = QtWidgets.QLineEdit(self)
+        self.filterEdit.setPlaceholderText('filter names')
+        self.refreshButton = QtWidgets.QPushButton('Refresh',self)
+        self.tabs = QtWidgets.QTabWidget(self)
+
+        for kind in SYSTEMCLASSES:
+            model = SystemModel(kind,self)
+            #filtering only reads the name column, which needs no scene query
+            proxy = QtCore.QSortFilterProxyModel(self)
+            proxy.setSourceModel(model)
+            proxy.setFilterKeyColumn(0)
+            proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+            view = QtWidgets.QTableView(self)
+            view.setModel(proxy)
+            view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+            view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+            view.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+            view.verticalHeader().hide()
+            view.horizontalHeader().setStretchLastSection(True)
+            view.doubleClicked.connect(self._selectSystem)
+            self.models[kind] = model
+            self.proxies[kind] = proxy
+            self.tabs.addTab(view,kind.capitalize())
+
+        topLayout = QtWidgets.QHBoxLayout()
+        topLayout.addWidget(self.filterEdit)
+        topLayout.addWidget(self.refreshButton)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(topLayout)
+        layout.addWidget(self.tabs)
+
+        self.filterEdit.textChanged.connect(self._filter)
+        self.refreshButton.clicked.connect(self.refresh)
+
+    def refresh(self):
+        '''
+        read every kind again from the registry
+        '''
+        for model in self.models.values():
+            model.refresh()
+
+    def closeEvent(self,event):
+        for model in self.models.values():
+            model.detach()
+        super(SystemBrowser,self).closeEvent(event)
+
+    # private methods
+    def _filter(self,text):
+        for proxy in self.proxies.values():
+            proxy.setFilterFixedString(text)
+
+    def _selectSystem(self,proxyIndex):
+        kind = list(self.models)[self.tabs.currentIndex()]
+        model = self.models[kind]
+        row = self.proxies[kind].mapToSource(proxyIndex).row()
+        info = model.systemIndex.info(row)
+        if info is None or not model.systemIndex.isCurrent(row):
+            info = model.systemIndex.resolve(row)
+        nodes = [model.systemName(row)]
+        if info is not None and len(info.get('jointList',[])) > 0:
+            nodes = info['jointList']
+        cmds.select(nodes,replace=True)
+
+_browser = None
+
+def _mayaMainWindow():
+    if omui is None or wrapInstance is None:
+        return None
+    pointer = omui.MQtUtil.mainWindow()
+    if pointer is None:
+        return None
+    return wrapInstance(int(pointer),QtWidgets.QWidget)
+
+def show():
+    '''
+    open the system browser, a single panel per session
+    '''
+    global _browser
+    if QtWidgets is None:
+        raise RuntimeError('the system browser needs PySide2')
+    if _browser is not None:
+        try:
+            _browser.close()
+            _browser.deleteLater()
+        except RuntimeError:
+            #the panel was already deleted by Qt
+            pass
+    _browser = SystemBrowser(_mayaMainWindow())
+    _browser.show()
+    return _browser
@@ -1,6 +1,11 @@
-import pymel.core as pm
+from collections import OrderedDict
 
+from .CR_Backend import cmds,plugName
 from .CR_Utils import *
+from .CR_Utils import _slotIndex
+from .CR_Transaction import GraphTransaction,CurveData,undoChunk
+from .CR_Profile import logger,span
+from . import CR_Math as crm
 
 class BoundJoints(object):
     '''
@@ -11,26 +16,13 @@ class BoundJoints(object):
 
         self.jointList = jointList
 
-        if len(self.jointList) > 0:
-            self.startJnt = self.jointList[0]
-            self.endJnt = self.jointList[-1]
-            self.parent = self.startJnt.getParent()
-        else:
-            self.startJnt = None
-            self.endJnt = None
-            self.parent = None
-
         if manager is None:
             self.manager = self._createManager(self.iname) #create fresh manager
             self.iname = self.manager.name().replace('MNG_BOUND_','')
+            self.connectorPlugs = []
         else:
             self.manager = manager
-
-        self.jointCount = self.getJointsCount()
-        self.connectorPlugs = []
-        self.skinNodeList = []
-        self.constructSkinList()
-        #create manager
+        #parent, connector plugs and skin nodes are read on first access
 
     @classmethod
     def from_values(cls,*args):
@@ -38,20 +30,31 @@ class BoundJoints(object):
 
     @classmethod
     def from_manager(cls,manager):
-        jntList = getJntsFromBoundManager(manager)
-        name = manager.name().replace('MNG_BOUND_','')
-        return cls(jntList,name,manager)
+        '''
+        wrap a bound manager of the scene, only its name is read here
+        the joints and everything else are read on first access
+        '''
+        bound = cls.__new__(cls)
+        bound.manager = manager
+        bound.iname = manager.name().replace('MNG_BOUND_','')
+        return bound
+
+    @classmethod
+    def listFromSkin(cls,skinNode):
+        '''
+        return the BoundJoints systems feeding this skinCluster
+        '''
+        return [cls.from_manager(m) for m in getBoundManagersFromSkin(skinNode)]
 
     # private methods
     def _createManager(self,name):
-        manager = addBoundManagerNode(name)
-        print('start to connect')
-        for j in self.jointList:
-            if not j.hasAttr('bound'):
-                j.addAttr('bound')
-            print('connect {} to {}'.format(manager,j))
-            manager.boundMng >> j.bound
-        return manager
+        logger.debug('create bound manager %s',name)
+        with GraphTransaction('CR_createBoundManager') as tx:
+            manager = addBoundManagerNode(name,tx)
+            for j in self.jointList:
+                tx.addAttr(j,'bound')
+                tx.connect((manager,'boundMng'),(j,'bound'))
+        return tx.resolve(manager)
 
     def _setManager(self,manager):
         #clear manager first
@@ -63,115 +66,313 @@ class BoundJoints(object):
         self.manager = manager
         self.iname = self.manager.name().replace('MNG_BOUND_','')
 
+    # lazy attributes
+    @managerProperty
+    def jointList(self):
+        return getJntsFromBoundManager(self.manager)
+
+    @managerProperty
+    def parent(self):
+        return self.startJnt.getParent() if self.startJnt is not None else None
+
+    @managerProperty
+    def connectorPlugs(self):
+        return getConnectorsFromBoundManager(self.manager)
+
+    @managerProperty
+    def skinNodeList(self):
+        return self._skinNodes()
+
+    @property
+    def startJnt(self):
+        return self.jointList[0] if len(self.jointList) > 0 else None
+
+    @property
+    def endJnt(self):
+        return self.jointList[-1] if len(self.jointList) > 0 else None
+
+    @property
+    def jointCount(self):
+        return self.getJointsCount()
+
     #construct method
     def constructSkinList(self):
         '''
         listing all the skin node link to this joint chain
         '''
-        self.skinNodeList = []
-        for j in self.jointList:
-            skinNodes = [s for s in j.worldMatrix[0].outputs() if s.type() == 'skinCluster']
-            for sn in skinNodes:
-                self.skinNodeList.append(sn)
-            self.skinNodeList = list(set(self.skinNodeList))
+        self.skinNodeList = self._skinNodes()
+
+    def _skinNodes(self):
+        skinNodes = getSkinClusterCache().getSkinClusters(self.jointList)
+        return getNodes(skinNodes)
 
     #create methods
-    def createDefaultDriver(self,attributeList,suffix=''): #migrate this to connector
+    def createDefaultDriver(self,attributeList,suffix='',mode='direct'): #migrate this to connector
         '''
         create driver chains that basically a direct connection
+        mode is the connector mode, one of CONNECTORMODES
         '''
-        #check attribute list first
-        for a in attributeList:
-            for j in self.jointList:
-                if not j.hasAttr(a):
-                    raise Exception('attribute does not exists!')
+        with holdManagerProperties():
+            #check attribute list first
+            with span('validate'):
+                backend = getBackend()
+                for a in attributeList:
+                    if not all(backend.hasAttrs(self.jointList,a)):
+                        raise Exception('attribute does not exists!')
+
+            with undoChunk('CR_createDefaultDriver'):
+                return self._createDefaultDriver(attributeList,suffix,mode)
 
+    def _createDefaultDriver(self,attributeList,suffix,mode):
         driverName = 'drv_'+self.iname + suffix
         #duplicate jnt chain
-        drvJnts = duplicateSingleChain(self.jointList)
-        #rename
-        for dj in drvJnts:
-            dj.rename(dj.name().replace('dup_','drv_') + suffix)
+        with span('duplicate'):
+            drvJnts = duplicateSingleChain(self.jointList)
+            #rename
+            for dj in drvJnts:
+                dj.rename(dj.name().replace('dup_','drv_') + suffix)
         #create driver object
         driverDict = {'driver_jnts' : drvJnts}
-        print(drvJnts)
-        drv = DriverSystem(driverDict,driverName,None)
+        logger.debug('driver joints: %s',drvJnts)
+        with span('masterGroup'):
+            drv = DriverSystem(driverDict,driverName,None)
         #rearrange master group
-        print('start to rearrange')
-        masterGrp,masterGroupOffset = drv.getMasterGrpList()
-        pm.parent(drv.startJnt,w=True)
-        if self.startJnt.getParent() is not None:
-            alignTransform(self.startJnt.getParent(),masterGroupOffset)
-        else:
-            masterGroupOffset.translate.set(0,0,0)
-            masterGroupOffset.rotate.set(0,0,0)
-            masterGroupOffset.scale.set(1,1,1)
-        pm.parent(drv.startJnt,masterGrp)
+        with span('align'):
+            backend = getBackend()
+            masterGrp,masterGroupOffset = drv.getMasterGrpList()
+            backend.setParents([drv.startJnt])
+            if self.startJnt.getParent() is not None:
+                alignTransform(self.startJnt.getParent(),masterGroupOffset)
+            else:
+                plugs = [(masterGroupOffset,a) for a in ('translate','rotate','scale')]
+                backend.setAttrs(plugs,[(0,0,0),(0,0,0),(1,1,1)])
+            backend.setParents([drv.startJnt],masterGrp)
         #create connector object
-        bnManager = self.manager
-        drvManager = drv.manager
-        drvOutputs = []
-        bnInputs = []
-        for a in attributeList:
-            for dj in drv.driverJnts:
-                drvOutput = pm.PyNode(dj.name()+'.'+a)
-                drvOutputs.append(drvOutput)
-            for j in self.jointList:
-                bnInput = pm.PyNode(j.name()+'.'+a)
-                bnInputs.append(bnInput)
-        con = ConnectorSystem(bnManager,drvManager,drvOutputs,bnInputs,'con_'+self.iname+suffix)
-        self.connectorPlugs.append(con.getManager())
-        drv.connectorPlugs.append(con.getManager())
-        
+        with span('connect'):
+            bnManager = self.manager
+            drvManager = drv.manager
+            drvOutputs,bnInputs = connectorPairs(drv.driverJnts,self.jointList,attributeList,mode)
+            con = ConnectorSystem(bnManager,drvManager,drvOutputs,bnInputs,'con_'+self.iname+suffix,mode=mode)
+        with span('register'):
+            self.connectorPlugs.append(con.getManager())
+            drv.connectorPlugs.append(con.getManager())
+        logger.info('created driver %s and connector %s for %s',drv.name(),con.name(),self.iname)
+
+        return drv,con
+
+    def createPrefabDriver(self,attributeList,suffix='',mode='direct',shape=None,size=1.0,boneScale=None):
+        '''
+        createDefaultDriver plus joint controllers (see createJointController), stamped from a prefab template
+        chains of the same signature share their template, see PrefabCache
+        every node is created and placed in one transaction, no alignment solve
+        shape None builds no controller
+        '''
+        with holdManagerProperties():
+            with span('validate'):
+                backend = getBackend()
+                for a in attributeList:
+                    if not all(backend.hasAttrs(self.jointList,a)):
+                        raise Exception('attribute does not exists!')
+                if not isSingleChain(self.jointList):
+                    raise Exception('input joint list is NOT a single chain')
+
+            with undoChunk('CR_createPrefabDriver'):
+                return self._createPrefabDriver(attributeList,suffix,mode,shape,size,boneScale)
+
+    def _createPrefabDriver(self,attributeList,suffix,mode,shape,size,boneScale):
+        with span('template'):
+            parent = self.parent
+            nodes = list(self.jointList) if parent is None else [parent]+list(self.jointList)
+            worlds = getBackend().worldMatrices(nodes)
+            parentWorld = worlds.pop(0) if parent is not None else None
+            translates,rotates,sizes = getPrefabCache().lookup(worlds,parentWorld,attributeList,mode,shape,size,boneScale)
+
+        with span('stamp'):
+            slot = getEmptyDriverManagerSlot(self.manager)
+            try:
+                with GraphTransaction('CR_createPrefabDriver') as tx:
+                    drvNodes = _queueDriver(tx,self,suffix)
+                    _placeDriver(tx,drvNodes,parentWorld,translates,rotates)
+                    if shape is not None:
+                        attachShapes(drvNodes[0],shape,transaction=tx,sizes=sizes)
+                    drvOutputs,bnInputs = connectorPairs(drvNodes[0],self.jointList,attributeList,mode)
+                    cntNodes = addConnectorNodes('con_'+self.iname+suffix,drvNodes[1],slot,drvOutputs,bnInputs,tx,mode)
+            except Exception:
+                releaseDriverManagerSlot(self.manager,_slotIndex(plugName(slot)))
+                raise
+
+        with span('register'):
+            drv,con = _registerDriver(tx,self,drvNodes,drvOutputs,bnInputs,cntNodes,mode)
+        logger.info('stamped driver %s and connector %s for %s',drv.name(),con.name(),self.iname)
+
         return drv,con
 
+    def mirrorDriver(self,connectorIndex=0,counterpart=None,axis='x',behavior=True,suffix=''):
+        '''
+        build the driver and connector at connectorIndex again on the counterpart bound system,
+        mirrored across the plane normal to axis, see mirrorDrivers
+        return the counterpart BoundJoints,DriverSystem,ConnectorSystem
+        '''
+        result = list(mirrorDrivers([self],connectorIndex,axis,behavior,suffix,[counterpart]).values())[0]
+        if result['error'] is not None:
+            raise Exception(result['error'])
+        return result['bound'],result['driver'],result['connector']
+
     # break connections
     def deleteConnection(self,connectorIndex):
         '''
         this method will delete the connector while retaining the driver
         '''
-        connector = self.connectorPlugs[connectorIndex]
-        connectorSystem = ConnectorSystem.from_manager(connector)
-        connectorSystem._delete()
-        self.connectorPlugs.pop(connectorIndex)
+        with holdManagerProperties():
+            connector = self.connectorPlugs[connectorIndex]
+            connectorSystem = ConnectorSystem.from_manager(connector)
+            connectorSystem._delete()
+            self.connectorPlugs.pop(connectorIndex)
 
     def deleteConnections(self):
         '''
         this method will delete all connectors while retaining the driver
         '''
-        for x in range(0,len(self.connectorPlugs)):
-            connector = self.connectorPlugs[x]
-            connectorSystem = ConnectorSystem.from_manager(connector)
-            connectorSystem._delete()
-        self.connectorPlugs = [] #clean up
+        with holdManagerProperties():
+            for x in range(0,len(self.connectorPlugs)):
+                connector = self.connectorPlugs[x]
+                connectorSystem = ConnectorSystem.from_manager(connector)
+                connectorSystem._delete()
+            self.connectorPlugs = [] #clean up
 
     def deleteDriver(self,connectorIndex):
         '''
         this method will delete the driver and connector system entirely
         '''
-        connector = self.connectorPlugs[connectorIndex]
-        print(connector)
-        connectorSystem = ConnectorSystem.from_manager(connector)
-        driverManger = connectorSystem.getDrvManager()
-        driverSystem = DriverSystem.from_manager(driverManger)
-        connectorSystem._delete()
-        driverSystem._delete()
-
-        self.connectorPlugs.pop(connectorIndex)
-
-    def deleteDrivers(self):
-        '''
-        this method will delete the drivers and connectors system entirely
-        '''
-        for x in range(0,len(self.connectorPlugs)):
-            connector = self.connectorPlugs[x]
+        with holdManagerProperties():
+            connector = self.connectorPlugs[connectorIndex]
+            logger.debug('delete driver of connector %s',connector)
             connectorSystem = ConnectorSystem.from_manager(connector)
             driverManger = connectorSystem.getDrvManager()
             driverSystem = DriverSystem.from_manager(driverManger)
             connectorSystem._delete()
             driverSystem._delete()
 
-        self.connectorPlugs = [] #clean up
+            self.connectorPlugs.pop(connectorIndex)
+
+    def deleteDrivers(self):
+        '''
+        this method will delete the drivers and connectors system entirely
+        '''
+        with holdManagerProperties():
+            for x in range(0,len(self.connectorPlugs)):
+                connector = self.connectorPlugs[x]
+                connectorSystem = ConnectorSystem.from_manager(connector)
+                driverManger = connectorSystem.getDrvManager()
+                driverSystem = DriverSystem.from_manager(driverManger)
+                connectorSystem._delete()
+                driverSystem._delete()
+
+            self.connectorPlugs = [] #clean up
+
+    # patch methods
+    def reconcile(self,attributeList,connectorIndex=0,suffix=''):
+        '''
+        patch the driver and connector at connectorIndex to drive attributeList on the current joints
+        only the plug pairs that changed are wired, kept driver joints keep their controllers and keys
+        compound connectors fold attributeList like they were built, matrix connectors are rebuilt instead
+        driver joints are added for new bound joints and deleted for removed ones
+        return the summary dict of the changes
+        '''
+        with holdManagerProperties():
+            with undoChunk('CR_reconcile'):
+                return self._reconcile(attributeList,connectorIndex,suffix)
+
+    def _reconcile(self,attributeList,connectorIndex,suffix):
+        con = ConnectorSystem.from_manager(self.connectorPlugs[connectorIndex])
+        drv = DriverSystem.from_manager(con.getDrvManager())
+        connector = con.connectorNodes[0]
+        if isLegacyConnector(connector):
+            raise AttributeError('{} still uses one attribute per plug pair, rebuild it first'.format(connector))
+        if con.mode == 'matrix':
+            raise AttributeError('{} is a matrix connector, rebuild it instead'.format(connector))
+        if con.mode == 'compound':
+            attributeList = compoundAttributes(attributeList)
+        summary = OrderedDict([(k,0) for k in ('added','removed','rewired','unchanged','jointsAdded','jointsRemoved','reparented')])
+
+        with span('diff'):
+            current = getConnectorPairMap(connector)
+            #driver joint of every bound joint, from the wired pairs first then by name
+            driverJnts = OrderedDict([(str(dj),dj) for dj in drv.driverJnts])
+            drivenBy = {}
+            for drvPlug,bnPlug in current.values():
+                dj = driverJnts.get(drvPlug.split('.')[0])
+                if dj is not None:
+                    drivenBy.setdefault(bnPlug.split('.')[0],dj)
+            pairing = [drivenBy.get(str(j),driverJnts.get('drv_'+j.name()+suffix)) for j in self.jointList]
+            keptNames = set([str(dj) for dj in pairing if dj is not None])
+            removed = [dj for name,dj in driverJnts.items() if name not in keptNames]
+
+        with span('patch'):
+            with GraphTransaction('CR_reconcile') as tx:
+                added = []
+                parent = drv.masterGrp
+                for x in range(0,len(self.jointList)):
+                    if pairing[x] is None:
+                        j = self.jointList[x]
+                        pairing[x] = tx.createNode('joint','drv_'+j.name()+suffix,parent)
+                        tx.addAttr(pairing[x],'driver')
+                        tx.connect((drv.manager,'drvMng'),(pairing[x],'driver'))
+                        added.append(x)
+                    parent = pairing[x]
+                isNew = set(added)
+
+                desired = OrderedDict()
+                for a in attributeList:
+                    for x in range(0,len(self.jointList)):
+                        src = (pairing[x],a) if x in isNew else str(pairing[x].attr(a))
+                        desired[str(self.jointList[x].attr(a))] = src
+                wired = dict([(bnPlug,(index,drvPlug)) for index,(drvPlug,bnPlug) in current.items()])
+
+                freeIndices = []
+                for bnPlug,(index,drvPlug) in wired.items():
+                    if bnPlug not in desired:
+                        tx.disconnect(drvPlug,(connector,'c[{}]'.format(index)))
+                        tx.disconnect((connector,'c[{}]'.format(index)),bnPlug)
+                        freeIndices.append(index)
+                        summary['removed'] += 1
+                freeIndices.sort(reverse=True)
+                nextIndex = max(current.keys())+1 if len(current) > 0 else 0
+                for bnPlug,src in desired.items():
+                    if bnPlug in wired:
+                        index,drvPlug = wired[bnPlug]
+                        if src == drvPlug:
+                            summary['unchanged'] += 1
+                            continue
+                        tx.connect(src,(connector,'c[{}]'.format(index)))
+                        summary['rewired'] += 1
+                        continue
+                    if len(freeIndices) > 0:
+                        index = freeIndices.pop()
+                    else:
+                        index = nextIndex
+                        nextIndex += 1
+                    tx.connect(src,(connector,'c[{}]'.format(index)))
+                    tx.connect((connector,'c[{}]'.format(index)),bnPlug)
+                    summary['added'] += 1
+
+        with span('joints'):
+            backend = getBackend()
+            pairing = [tx.resolve(dj) for dj in pairing]
+            if len(added) > 0:
+                alignTransforms([self.jointList[x] for x in added],[pairing[x] for x in added])
+            #kept driver joints follow the bound chain, children of removed joints move up first
+            ids,parentMap,labels = backend.parentMap([drv.masterGrp]+pairing)
+            moves = [x for x in range(0,len(pairing)) if (x not in isNew) and parentMap[ids[x+1]] != ids[x]]
+            for x in moves:
+                backend.setParents([pairing[x]],pairing[x-1] if x > 0 else drv.masterGrp)
+            backend.deleteNodes(removed)
+            summary['jointsAdded'] = len(added)
+            summary['jointsRemoved'] = len(removed)
+            summary['reparented'] = len(moves)
+
+        logger.info('reconciled %s: %s',con.name(),', '.join(['{} {}'.format(v,k) for k,v in summary.items()]))
+        return summary
 
     # set methods
     def setJointList(self,jointList):
@@ -179,18 +380,8 @@ class BoundJoints(object):
         set joint list to be handle by this object
         '''
         self.jointList = jointList
-        self.jointCount = self.getJointsCount()
         self._setManager(self.manager)
-
-        if len(self.jointList) > 0:
-            self.startJnt = self.jointList[0]
-            self.endJnt = self.jointList[-1]
-            self.parent = self.startJnt.getParent()
-        else:
-            self.startJnt = None
-            self.endJnt = None
-            self.parent = None
-
+        self.parent = self.startJnt.getParent() if self.startJnt is not None else None
         self.constructSkinList()
 
 
@@ -316,17 +507,13 @@ class DriverSystem(object):
         '''
         self.iname = name
         
-        if driverDict.has_key('driver_jnts'):
+        if 'driver_jnts' in driverDict:
             self.driverJnts = driverDict['driver_jnts']
             #print(self.driverJnts)
-            if len(self.driverJnts) > 0:
-                self.startJnt = self.driverJnts[0]
-                self.endJnt = self.driverJnts[-1]       
-            else:
+            if len(self.driverJnts) == 0:
                 raise Exception('No driver joints found!')
             
             self.parent = None
-            self.jointCount = self.getJointsCount()
             self.connectorPlugs = []
             if manager is None:
                 self.manager = self._createManager(self.iname) #create fresh manager
@@ -334,7 +521,7 @@ class DriverSystem(object):
             else:
                 self.manager = manager
                 self.iname = self.manager.name().replace('MNG_DRIVER_','')
-                self.masterGrp,self.masterGrpOffset = self._getMasterGrp()
+                #master groups are read on first access
 
 
         else:
@@ -347,28 +534,80 @@ class DriverSystem(object):
 
     @classmethod
     def from_manager(cls,manager):
-        jntList = getJntsFromDriverManager(manager)
+        '''
+        wrap a driver manager of the scene, only its name is read here
+        the joints and master groups are read on first access
+        '''
+        drv = cls.__new__(cls)
+        drv.parent = None
+        drv.connectorPlugs = []
+        drv.manager = manager
+        drv.iname = manager.name().replace('MNG_DRIVER_','')
+        return drv
+
+    @classmethod
+    def from_nodes(cls,driverJnts,manager,masterGrp,masterGrpOffset):
+        '''
+        wrap driver nodes that are already built and wired, no scene query
+        '''
+        drv = cls.__new__(cls)
+        drv.driverJnts = driverJnts
+        drv.parent = None
+        drv.connectorPlugs = []
+        drv.manager = manager
+        drv.iname = manager.name().replace('MNG_DRIVER_','')
+        drv.masterGrp = masterGrp
+        drv.masterGrpOffset = masterGrpOffset
+        return drv
+
+    # lazy attributes
+    @managerProperty
+    def driverJnts(self):
+        jntList = getJntsFromDriverManager(self.manager)
         try:
-            jntList = reorderSingleChainJointList(jntList)
+            return reorderSingleChainJointList(jntList)
         except AttributeError:
-            pass
-        driverDict = {'driver_jnts' : jntList}
-        name = manager.name().replace('MNG_DRIVER_','')
-        return cls(driverDict,name,manager)
+            return jntList
 
-    def _createManager(self,name):
-        manager = addDriverManagerNode(name)
-        self.manager = manager
+    @managerProperty
+    def _masterGrps(self):
+        return self._getMasterGrp()
 
-        print('start to connect')
-        for j in self.driverJnts:
-            if not j.hasAttr('driver'):
-                j.addAttr('driver')
-            print('connect {} to {}'.format(manager,j))
-            manager.drvMng >> j.driver
-        
-        self.masterGrp,self.masterGrpOffset = self.makeMasterGrp() #make new offset group if we create new manager         
-        return manager
+    @managerProperty
+    def masterGrp(self):
+        return self._masterGrps[0]
+
+    @managerProperty
+    def masterGrpOffset(self):
+        return self._masterGrps[1]
+
+    @property
+    def startJnt(self):
+        return self.driverJnts[0] if self.driverJnts else None
+
+    @property
+    def endJnt(self):
+        return self.driverJnts[-1] if self.driverJnts else None
+
+    @property
+    def jointCount(self):
+        return self.getJointsCount()
+
+    def _createManager(self,name):
+        logger.debug('create driver manager %s',name)
+        with GraphTransaction('CR_createDriverManager') as tx:
+            manager = addDriverManagerNode(name,tx)
+            for j in self.driverJnts:
+                tx.addAttr(j,'driver')
+                tx.connect((manager,'drvMng'),(j,'driver'))
+            #make new offset group if we create new manager
+            masterGrp,masterGrpOffset = addMasterGrpNodes(self.iname,manager,tx)
+
+        self.manager = tx.resolve(manager)
+        self.masterGrp = tx.resolve(masterGrp)
+        self.masterGrpOffset = tx.resolve(masterGrpOffset)
+        self._placeMasterGrp(self.masterGrp,self.masterGrpOffset)
+        return self.manager
 
     def _setManager(self,manager):
         #clear manager first
@@ -386,16 +625,13 @@ class DriverSystem(object):
         masterGrpOffset = None
         for n in self.manager.drvMng.outputs():
             if n.hasAttr('driverGrp'):
-                self.masterGrp = n
+                masterGrp = n
             if n.hasAttr('driverGrpOffset'):
-                self.masterGrpOffset = n
+                masterGrpOffset = n
 
         if (masterGrp is None) or (masterGrpOffset is None):
             n_masterGrp,n_masterGrpOffset = self.makeMasterGrp()
-            if masterGrp is not None:
-                pm.delete(masterGrp)
-            if masterGrpOffset is not None:
-                pm.delete(masterGrpOffset)
+            getBackend().deleteNodes([n for n in (masterGrp,masterGrpOffset) if n is not None])
             return n_masterGrp,n_masterGrpOffset
         else:
             return masterGrp,masterGrpOffset
@@ -405,16 +641,12 @@ class DriverSystem(object):
         '''
         delete and clean up this driver system
         '''
-        pm.delete(self.manager)
-        pm.delete(self.masterGrpOffset)
+        getBackend().deleteNodes([self.manager,self.masterGrpOffset])
         self.iname = None
         self.driverJnts = None
-        self.startJnt = None
-        self.endJnt = None
         self.masterGrp = None
         self.masterGrpOffset = None
         self.parent = None
-        self.jointCount = None
         self.connectorPlugs = None
         self.manager = None
 
@@ -422,43 +654,34 @@ class DriverSystem(object):
         '''
         create a master group for this entire system
         '''
-        masterGrp = pm.group(empty=True,n='masterGrp_'+self.iname)
-        masterGrpOffset = pm.group(n=masterGrp.name()+'Offset')
-        #
-        alignTransform(self.startJnt,masterGrpOffset)
-        pm.parent(self.startJnt,masterGrp)
-        #
-        masterGrp.addAttr('driverGrp')
-        masterGrpOffset.addAttr('driverGrpOffset')
-        self.manager.drvMng >> masterGrp.driverGrp
-        self.manager.drvMng >> masterGrpOffset.driverGrpOffset
+        with GraphTransaction('CR_makeMasterGrp') as tx:
+            masterGrp,masterGrpOffset = addMasterGrpNodes(self.iname,self.manager,tx)
+        masterGrp = tx.resolve(masterGrp)
+        masterGrpOffset = tx.resolve(masterGrpOffset)
+        self._placeMasterGrp(masterGrp,masterGrpOffset)
         return masterGrp,masterGrpOffset
+
+    def _placeMasterGrp(self,masterGrp,masterGrpOffset):
+        #alignment needs the nodes in the scene, so it runs after the flush
+        alignTransform(self.startJnt,masterGrpOffset)
+        getBackend().setParents([self.startJnt],masterGrp)
         
     # rigging methods
-    def createJointController(self,shape='circle'):
-        for j in self.driverJnts:
-            c = shapeGenerate(shape,'temp_'+j.name())
-            cShape = c.getChildren()[0]
-            cShape.rename(j.name()+'Shape')
-            pm.parent(cShape,j,r=True,s=True)
-            pm.delete(c)
+    def createJointController(self,shape='circle',size=1.0,boneScale=None):
+        '''
+        give every driver joint a controller shape in one transaction
+        boneScale sizes each shape from its bone length instead of size
+        '''
+        return attachShapes(self.driverJnts,shape,size,boneScale)
     
     # set methods
     def setDriverJnts(self,drvJnts):
         self.driverJnts = drvJnts
-        self.jointCount = self.getJointsCount()
         #self._setManager(self.manager)
 
-        if len(self.jointList) > 0:
-            self.startJnt = self.jointList[0]
-            self.endJnt = self.jointList[-1]
-        else:
-            self.startJnt = None
-            self.endJnt = None
-
     def setParent(self,parentNode):
         self.parent = parentNode
-        pm.parent(self.masterGrpOffset,self.parent)
+        getBackend().setParents([self.masterGrpOffset],self.parent)
 
     # get methods
     def name(self):
@@ -559,9 +782,10 @@ class ConnectorSystem(object):
     '''
     This base class handles generic connector system (direct connection)
     '''
-    def __init__(self,bnManager,drvManager,drvOutputs=[],bnJntInputs=[],name='Default',manager=None):
+    def __init__(self,bnManager,drvManager,drvOutputs=[],bnJntInputs=[],name='Default',manager=None,mode='direct'):
         '''
         Connector should NOT be built from manager
+        mode is one of CONNECTORMODES, see addConnectorNodes
         '''
         self.iname = name
         self.bnJntInputs = bnJntInputs
@@ -569,17 +793,18 @@ class ConnectorSystem(object):
         self.bnManager = bnManager
         self.drvManager = drvManager
         #
-        self.manager = None
-        self.connectorNodes = []
 
         if manager is None:
+            self.manager = None
+            self.mode = mode
+            self.connectorNodes = []
             if len(bnJntInputs) == len(drvOutputs):
                 self._setup()
             else:
                 raise Exception('driver and driven plugs does not match!')
         else:
             self.manager = manager
-            self.connectorNodes.append(self.manager.cntMng.outputs()[0])
+            #connector nodes are read on first access
 
         #continue tmr, build connector from connector name
 
@@ -588,41 +813,91 @@ class ConnectorSystem(object):
         return cls(args)
 
     @classmethod
-    def from_manager(cls,manager):
-        drvOutputs,bnJntInputs = getIOFromDefaultConnector(manager)[0]
-        drvManager = manager.Manager.inputs()[0]
-        bnManager = manager.Manager.outputs()[0]
-        name = manager.name().replace('MNG_CONNECTOR_','')
-        return cls(bnManager,drvManager,drvOutputs,bnJntInputs,name,manager)
+    def from_nodes(cls,bnManager,drvManager,drvOutputs,bnJntInputs,manager,connector,mode='direct'):
+        '''
+        wrap connector nodes that are already built and wired, no scene query
+        '''
+        con = cls.__new__(cls)
+        con.bnManager = bnManager
+        con.drvManager = drvManager
+        con.drvOutputs = drvOutputs
+        con.bnJntInputs = bnJntInputs
+        con.manager = manager
+        con.iname = manager.name().replace('MNG_CONNECTOR_','')
+        con.mode = mode
+        con.connectorNodes = [connector]
+        return con
 
-    def _setup(self):
+    @classmethod
+    def from_manager(cls,manager):
         '''
-        set up for the generic direct connection
+        wrap a connector manager of the scene, only its name is read here
+        the plugs, tied managers and connector nodes are read on first access
         '''
-        connector = pm.group(empty=True,name=('connector_'+self.iname ))
-        connector.hiddenInOutliner.set(True)
-        for x in range(0,len(self.bnJntInputs)):
-            attrName = 'c_'+str(x).zfill(3)
-            connector.addAttr(attrName)
-            attr = pm.PyNode(connector.name()+'.'+attrName)
-            self.drvOutputs[x] >> attr
-            attr >> self.bnJntInputs[x]
+        con = cls.__new__(cls)
+        con.manager = manager
+        con.iname = manager.name().replace('MNG_CONNECTOR_','')
+        return con
+
+    # lazy attributes
+    @managerProperty
+    def _connectorIO(self):
+        return getIOFromDefaultConnector(self.manager)[0]
+
+    @managerProperty
+    def drvOutputs(self):
+        return self._connectorIO[0]
+
+    @managerProperty
+    def bnJntInputs(self):
+        return self._connectorIO[1]
+
+    @managerProperty
+    def drvManager(self):
+        return self.manager.Manager.inputs()[0]
+
+    @managerProperty
+    def bnManager(self):
+        return self.manager.Manager.outputs()[0]
+
+    @managerProperty
+    def _splitNodes(self):
+        return splitConnectorNodes(self.manager)
 
-        self.manager = addConnectorManagerNode(self.iname)
-        connector.addAttr('connector')
-        self.manager.cntMng >> connector.connector
+    @managerProperty
+    def connectorNodes(self):
+        return self._splitNodes[0][:1]
 
-        self.drvManager.Manager >> self.manager.Manager
-        self.manager.Manager >> getEmptyDriverManagerSlot(self.bnManager)
+    @managerProperty
+    def helperNodes(self):
+        return self._splitNodes[1]
 
-        self.connectorNodes.append(connector)
+    @managerProperty
+    def mode(self):
+        return getConnectorMode(self.manager)
+
+    def _setup(self):
+        '''
+        set up for the generic direct connection
+        '''
+        slot = getEmptyDriverManagerSlot(self.bnManager)
+        try:
+            with GraphTransaction('CR_setupConnector') as tx:
+                manager,connector = addConnectorNodes(self.iname,self.drvManager,slot,self.drvOutputs,self.bnJntInputs,tx,self.mode)
+        except Exception:
+            releaseDriverManagerSlot(self.bnManager,_slotIndex(plugName(slot)))
+            raise
+        self.manager = tx.resolve(manager)
+        self.connectorNodes.append(tx.resolve(connector))
 
     def _delete(self):
         '''
         delete and clean up this connector system
         '''
-        pm.delete(self.manager)
-        pm.delete(self.connectorNodes)
+        for slot in self.manager.Manager.outputs(plugs=True):
+            if slot.isElement():
+                releaseDriverManagerSlot(slot.node(),slot.index())
+        getBackend().deleteNodes([self.manager]+self.connectorNodes+self.helperNodes)
 
         self.iname = None
         self.bnJntInputs = None
@@ -673,8 +948,8 @@ class ConnectorSystem(object):
         '''
         name = self.iname
         #manager = self.manager
-        bnJntInputs = [i.name() for i in self.bnJntInputs]
-        drvJntInputs = [i.name() for i in self.drvOutputs]
+        bnJntInputs = [plugName(i) for i in self.bnJntInputs]
+        drvJntInputs = [plugName(i) for i in self.drvOutputs]
         if self.bnManager is not None:
             bnManager = self.bnManager.name()
         else:
@@ -692,10 +967,339 @@ class ConnectorSystem(object):
             'outputs' : drvJntInputs,
             'bound_manager' : bnManager,
             'driver_manager' : drvManager,
+            'mode' : self.mode,
         }
 
         return infoDict
 
 
 # Rig building functions
+def createCharacterDrivers(chains,suffix='',mode='direct'):
+    '''
+    createDefaultDriver for every (BoundJoints,attributeList) of a character in one batched pass
+    validation is one bulk query, all drivers are built in one transaction, aligned in one pass
+    and all connectors are wired in a second transaction
+    return an OrderedDict bound name: {'bound','driver','connector','error'}
+    a chain failing validation or queuing gets its error and the others are still built
+    '''
+    with holdManagerProperties():
+        return _createCharacterDrivers(chains,suffix,mode)
+
+def _createCharacterDrivers(chains,suffix,mode):
+    results = OrderedDict()
+    for bound,attributeList in chains:
+        results[bound.name()] = {'bound' : bound,'driver' : None,'connector' : None,'error' : None}
+
+    with span('validate'):
+        valid = _validateChains(chains,results)
+
+    with undoChunk('CR_createCharacterDrivers'):
+        with span('drivers'):
+            built = []
+            with GraphTransaction('CR_createCharacterDrivers') as tx:
+                for bound,attributeList in valid:
+                    mark = tx.mark()
+                    try:
+                        built.append((bound,attributeList,_queueDriver(tx,bound,suffix)))
+                    except Exception as e:
+                        tx.rollback(mark)
+                        results[bound.name()]['error'] = str(e)
+
+        with span('align'):
+            bases = []
+            targets = []
+            for bound,_,(drvJnts,manager,masterGrp,masterGrpOffset) in built:
+                if bound.parent is not None:
+                    bases.append(bound.parent)
+                    targets.append(tx.resolve(masterGrpOffset))
+                bases.extend(bound.jointList)
+                targets.extend([tx.resolve(j) for j in drvJnts])
+            alignTransforms(bases,targets)
+
+        with span('connect'):
+            drivers = []
+            slots = []
+            orphans = []
+            try:
+                with GraphTransaction('CR_createCharacterConnectors') as ctx:
+                    for bound,attributeList,drvNodes in built:
+                        drvJnts,manager,masterGrp,masterGrpOffset = drvNodes
+                        mark = ctx.mark()
+                        slot = None
+                        try:
+                            drv = DriverSystem.from_nodes([tx.resolve(j) for j in drvJnts],tx.resolve(manager),
+                                                          tx.resolve(masterGrp),tx.resolve(masterGrpOffset))
+                            drvOutputs,bnInputs = connectorPairs(drv.driverJnts,bound.jointList,attributeList,mode)
+                            slot = getEmptyDriverManagerSlot(bound.manager)
+                            slotIndex = _slotIndex(plugName(slot))
+                            cntManager,connector = addConnectorNodes('con_'+bound.iname+suffix,drv.manager,slot,drvOutputs,bnInputs,ctx,mode)
+                            drivers.append((bound,drv,drvOutputs,bnInputs,cntManager,connector))
+                            slots.append((bound.manager,slotIndex))
+                        except Exception as e:
+                            ctx.rollback(mark)
+                            if slot is not None:
+                                releaseDriverManagerSlot(bound.manager,slotIndex)
+                            #a driver without its connector is garbage
+                            orphans.extend(_driverNodes(tx,drvNodes))
+                            results[bound.name()]['error'] = str(e)
+            except Exception:
+                #nothing was connected, every reserved slot is free again and every driver is garbage
+                for bnManager,slotIndex in slots:
+                    releaseDriverManagerSlot(bnManager,slotIndex)
+                getBackend().deleteNodes([n for b in built for n in _driverNodes(tx,b[2])])
+                raise
+            if len(orphans) > 0:
+                getBackend().deleteNodes(orphans)
+
+        with span('register'):
+            for bound,drv,drvOutputs,bnInputs,cntManager,connector in drivers:
+                con = ConnectorSystem.from_nodes(bound.manager,drv.manager,drvOutputs,bnInputs,ctx.resolve(cntManager),ctx.resolve(connector),mode)
+                bound.connectorPlugs.append(con.getManager())
+                drv.connectorPlugs.append(con.getManager())
+                results[bound.name()]['driver'] = drv
+                results[bound.name()]['connector'] = con
+
+    logger.info('created %d character drivers, %d failed',len(drivers),len([r for r in results.values() if r['error'] is not None]))
+    return results
+
+def _validateChains(chains,results):
+    #every attribute of every chain checked with one query per attribute name
+    jointsPerAttr = OrderedDict()
+    for bound,attributeList in chains:
+        for a in attributeList:
+            jointsPerAttr.setdefault(a,[]).extend(bound.jointList)
+    hasAttr = dict([(a,iter(getBackend().hasAttrs(joints,a))) for a,joints in jointsPerAttr.items()])
+    singles = iter(isSingleChains([bound.jointList for bound,_ in chains]))
+    valid = []
+    for bound,attributeList in chains:
+        missing = [a for a in attributeList if not all([next(hasAttr[a]) for j in bound.jointList])]
+        single = next(singles)
+        if len(bound.jointList) == 0:
+            results[bound.name()]['error'] = 'no joints in chain'
+        elif len(missing) > 0:
+            results[bound.name()]['error'] = 'attribute does not exists! {}'.format(', '.join(missing))
+        elif not single:
+            results[bound.name()]['error'] = 'input joint list is NOT a single chain'
+        else:
+            valid.append((bound,attributeList))
+    return valid
+
+def mirrorDrivers(bounds,connectorIndex=0,axis='x',behavior=True,suffix='',counterparts=None):
+    '''
+    build the driver and connector at connectorIndex of every bound system again on its counterpart,
+    mirrored across the plane normal to axis (x mirrors left and right across yz)
+    the counterpart is the bound system named by mirrorName, else the one whose start joint sits on the
+    mirrored start joint, else a new bound system on the joints named by mirrorName
+    counterparts gives them instead, None items are looked up
+    driver joint matrices and controller cvs are mirrored in bulk, behavior like mirrorJoint -mirrorBehavior,
+    every driver and connector is built in one transaction with the attributes and mode of its source
+    return an OrderedDict source bound name: {'bound','driver','connector','error'}
+    '''
+    with holdManagerProperties():
+        with undoChunk('CR_mirrorDrivers'):
+            return _mirrorDrivers(bounds,connectorIndex,axis,behavior,suffix,counterparts)
+
+def _mirrorDrivers(bounds,connectorIndex,axis,behavior,suffix,counterparts):
+    backend = getBackend()
+    results = OrderedDict()
+    sources = []
+    with span('sources'):
+        for x,bound in enumerate(bounds):
+            results[bound.name()] = {'bound' : None,'driver' : None,'connector' : None,'error' : None}
+            if connectorIndex >= len(bound.connectorPlugs):
+                results[bound.name()]['error'] = 'no connector at index {}'.format(connectorIndex)
+                continue
+            con = ConnectorSystem.from_manager(bound.connectorPlugs[connectorIndex])
+            drv = DriverSystem.from_manager(con.getDrvManager())
+            attributeList = list(OrderedDict.fromkeys([plugName(p).split('.',1)[1] for p in con.bnJntInputs]))
+            counterpart = counterparts[x] if counterparts is not None else None
+            sources.append([bound,drv,con.mode,attributeList,counterpart])
+
+    with span('counterparts'):
+        _findCounterparts(sources,axis,results)
+        sources = [s for s in sources if s[4] is not None]
+        checks = OrderedDict()
+        for bound,drv,mode,attributeList,counterpart in sources:
+            checks[counterpart.name()] = {'error' : None}
+            if len(counterpart.jointList) != len(drv.driverJnts):
+                checks[counterpart.name()]['error'] = '{} has {} joints, the driver has {}'.format(counterpart.name(),len(counterpart.jointList),len(drv.driverJnts))
+        valid = set([c.name() for c,_ in _validateChains([(s[4],s[3]) for s in sources if checks[s[4].name()]['error'] is None],checks)])
+        for bound,drv,mode,attributeList,counterpart in sources:
+            if counterpart.name() not in valid:
+                results[bound.name()]['error'] = checks[counterpart.name()]['error']
+        sources = [s for s in sources if s[4].name() in valid]
+        for counterpart in [s[4] for s in sources if s[4].manager is None]:
+            counterpart.manager = counterpart._createManager(counterpart.iname)
+            counterpart.iname = counterpart.manager.name().replace('MNG_BOUND_','')
+
+    with span('mirror'):
+        #one read for every driver joint, counterpart joint and counterpart parent
+        parents = [s[4].parent for s in sources]
+        nodes = []
+        for (bound,drv,mode,attributeList,counterpart),parent in zip(sources,parents):
+            nodes.extend(drv.driverJnts)
+            nodes.extend(counterpart.jointList)
+        worlds = iter(backend.worldMatrices(nodes+[p for p in parents if p is not None]))
+        drvWorlds,boundWorlds = [],[]
+        for bound,drv,mode,attributeList,counterpart in sources:
+            drvWorlds.append([next(worlds) for j in drv.driverJnts])
+            boundWorlds.append([next(worlds) for j in counterpart.jointList])
+        parentWorlds = [next(worlds) if p is not None else None for p in parents]
+        mirrored = iter(crm.mirrorMatrices([m for chain in drvWorlds for m in chain],axis,behavior))
+        mirrored = [[crm.rigid(next(mirrored)) for m in chain] for chain in drvWorlds]
+        for (bound,drv,mode,attributeList,counterpart),chain,boundChain in zip(sources,mirrored,boundWorlds):
+            if any([_distance(m,b) > MIRRORTOLERANCE for m,b in zip(chain,boundChain)]):
+                logger.warning('the mirrored driver of %s does not sit on %s',bound.name(),counterpart.name())
+
+        #driver joint locals, every chain in one solve
+        worldList,parentList = [],[]
+        for chain,parentWorld in zip(mirrored,parentWorlds):
+            worldList.extend(chain)
+            parentList.extend([crm.rigid(parentWorld) if parentWorld is not None else crm.identity()]+chain[:-1])
+        amount = len(worldList)
+        solved = iter(crm.alignLocals(worldList,parentList,[0]*amount,[None]*amount,[None]*amount))
+        driverLocals = [[next(solved) for m in chain] for chain in mirrored]
+
+        #controller cvs follow their joint, all the shapes in one read and one transform
+        shapeLists = [[dj.getShapes() for dj in s[1].driverJnts] for s in sources]
+        shapes = [sh for shapeList in shapeLists for jointShapes in shapeList for sh in jointShapes]
+        curves = iter(backend.curveData(shapes))
+        curveLists = [[[next(curves) for sh in jointShapes] for jointShapes in shapeList] for shapeList in shapeLists]
+        flat = [(c,drvWorlds[x][y],mirrored[x][y]) for x,curveList in enumerate(curveLists) for y,jointCurves in enumerate(curveList) for c in jointCurves]
+        points = iter(crm.mirrorPoints([c.points for c,_,_ in flat],[w for _,w,_ in flat],[m for _,_,m in flat],axis))
+        curveLists = [[[CurveData(next(points),c.knots,c.degree,c.form) for c in jointCurves] for jointCurves in curveList] for curveList in curveLists]
+
+    with span('build'):
+        built = []
+        slots = []
+        try:
+            with GraphTransaction('CR_mirrorDrivers') as tx:
+                for (bound,drv,mode,attributeList,counterpart),solvedLocals,parentWorld,curveList in zip(sources,driverLocals,parentWorlds,curveLists):
+                    mark = tx.mark()
+                    slot = None
+                    try:
+                        drvNodes = _queueDriver(tx,counterpart,suffix)
+                        _placeDriver(tx,drvNodes,parentWorld,[t for t,r in solvedLocals],[r for t,r in solvedLocals])
+                        for dj,jointCurves in zip(drvNodes[0],curveList):
+                            for c in jointCurves:
+                                tx.setAttr(tx.createNode('nurbsCurve',dj.name()+'Shape',dj),'cached',c)
+                        drvOutputs,bnInputs = connectorPairs(drvNodes[0],counterpart.jointList,attributeList,mode)
+                        slot = getEmptyDriverManagerSlot(counterpart.manager)
+                        slotIndex = _slotIndex(plugName(slot))
+                        cntNodes = addConnectorNodes('con_'+counterpart.iname+suffix,drvNodes[1],slot,drvOutputs,bnInputs,tx,mode)
+                        built.append((bound,counterpart,drvNodes,drvOutputs,bnInputs,cntNodes,mode))
+                        slots.append((counterpart.manager,slotIndex))
+                    except Exception as e:
+                        tx.rollback(mark)
+                        if slot is not None:
+                            releaseDriverManagerSlot(counterpart.manager,slotIndex)
+                        results[bound.name()]['error'] = str(e)
+        except Exception:
+            #nothing was built, every reserved slot is free again
+            for bnManager,slotIndex in slots:
+                releaseDriverManagerSlot(bnManager,slotIndex)
+            raise
+
+    with span('register'):
+        for bound,counterpart,drvNodes,drvOutputs,bnInputs,cntNodes,mode in built:
+            drv,con = _registerDriver(tx,counterpart,drvNodes,drvOutputs,bnInputs,cntNodes,mode)
+            results[bound.name()].update({'bound' : counterpart,'driver' : drv,'connector' : con})
+
+    logger.info('mirrored %d drivers, %d failed',len(built),len([r for r in results.values() if r['error'] is not None]))
+    return results
+
+def _findCounterparts(sources,axis,results):
+    #by manager name, then by start joint position, then by joint names
+    registry = getManagerRegistry()
+    for source in sources:
+        bound = source[0]
+        name = mirrorName(bound.name())
+        if source[4] is None and name is not None:
+            manager = registry.getManager('bound',name)
+            if manager is not None and manager.name() != bound.manager.name():
+                source[4] = BoundJoints.from_manager(manager)
+
+    missing = [s for s in sources if s[4] is None]
+    if len(missing) > 0:
+        candidates = [BoundJoints.from_manager(m) for m in registry.iterManagers('bound')]
+        candidates = [c for c in candidates if c.startJnt is not None]
+        starts = getBackend().worldMatrices([s[0].startJnt for s in missing]+[c.startJnt for c in candidates])
+        candidateStarts = starts[len(missing):]
+        for source,start in zip(missing,crm.mirrorMatrices(starts[:len(missing)],axis)):
+            bound = source[0]
+            best = None
+            for c,m in zip(candidates,candidateStarts):
+                if c.manager.name() == bound.manager.name() or len(c.jointList) != len(bound.jointList):
+                    continue
+                distance = _distance(start,m)
+                if distance <= MIRRORTOLERANCE and (best is None or distance < best[0]):
+                    best = (distance,c)
+            if best is not None:
+                source[4] = best[1]
+
+    missing = [s for s in sources if s[4] is None]
+    for source in missing:
+        bound = source[0]
+        names = [mirrorName(j.name()) for j in bound.jointList]
+        name = mirrorName(bound.name())
+        if None in names or name is None:
+            results[bound.name()]['error'] = 'no counterpart found for {}'.format(bound.name())
+            continue
+        joints = cmds.ls(names) or []
+        if len(joints) != len(names):
+            results[bound.name()]['error'] = 'no counterpart found for {}'.format(bound.name())
+            continue
+        #no bound manager yet, it is created once the counterpart passed validation, see _mirrorDrivers
+        counterpart = BoundJoints.__new__(BoundJoints)
+        counterpart.iname = name
+        counterpart.manager = None
+        counterpart.jointList = getNodes(names)
+        counterpart.connectorPlugs = []
+        source[4] = counterpart
+
+def _distance(a,b):
+    #distance between the positions of two matrices
+    return sum([(a[3][i]-b[3][i])**2 for i in range(3)])**0.5
+
+def _placeDriver(tx,drvNodes,parentWorld,translates,rotates):
+    #master group offset on the bound parent (None at the world), driver joints on their solved locals
+    drvJnts,manager,masterGrp,masterGrpOffset = drvNodes
+    if parentWorld is not None:
+        translate,rotate = crm.alignLocal(crm.rigid(parentWorld),crm.identity())
+        tx.setAttr(masterGrpOffset,'translate',tuple(translate))
+        tx.setAttr(masterGrpOffset,'rotate',tuple(rotate))
+    for dj,translate,rotate in zip(drvJnts,translates,rotates):
+        tx.setAttr(dj,'translate',tuple(translate))
+        tx.setAttr(dj,'rotate',tuple(rotate))
+
+def _registerDriver(tx,bound,drvNodes,drvOutputs,bnInputs,cntNodes,mode):
+    #wrap the nodes of a committed driver and connector, tie them to the bound system
+    drvJnts,manager,masterGrp,masterGrpOffset = drvNodes
+    cntManager,connector = cntNodes
+    drv = DriverSystem.from_nodes([tx.resolve(j) for j in drvJnts],tx.resolve(manager),
+                                  tx.resolve(masterGrp),tx.resolve(masterGrpOffset))
+    drvOutputs = [(tx.resolve(node),a) for node,a in drvOutputs]
+    con = ConnectorSystem.from_nodes(bound.manager,drv.manager,drvOutputs,bnInputs,tx.resolve(cntManager),tx.resolve(connector),mode)
+    bound.connectorPlugs.append(con.getManager())
+    drv.connectorPlugs.append(con.getManager())
+    return drv,con
+
+def _driverNodes(tx,drvNodes):
+    #scene nodes of a driver queued by _queueDriver, master groups first
+    drvJnts,manager,masterGrp,masterGrpOffset = drvNodes
+    return [tx.resolve(n) for n in [masterGrp,masterGrpOffset,manager]+list(drvJnts)]
+
+def _queueDriver(tx,bound,suffix):
+    #driver joints right under their master group, managers and wiring queued on tx
+    driverName = 'drv_'+bound.iname+suffix
+    manager = addDriverManagerNode(driverName,tx)
+    masterGrp,masterGrpOffset = addMasterGrpNodes(driverName,manager,tx)
+    drvJnts = []
+    parent = masterGrp
+    for j in bound.jointList:
+        parent = tx.createNode('joint','drv_'+j.name()+suffix,parent)
+        tx.addAttr(parent,'driver')
+        tx.connect((manager,'drvMng'),(parent,'driver'))
+        drvJnts.append(parent)
+    return drvJnts,manager,masterGrp,masterGrpOffset
 
@@ -1,38 +1,206 @@
-import pymel.core as pm
+import math
+from collections import OrderedDict
+from contextlib import contextmanager
 
-def addBoundManagerNode(name='Default'):
+from .CR_Backend import pm,cmds,getBackend,getHandleCache,plugName
+from .CR_Transaction import GraphTransaction,TxNode,undoChunk
+from .CR_Graph import buildChainForest
+from .CR_Profile import logger
+from .CR_Shapes import getShapeLibrary,attachShapes
+from . import CR_Math as crm
+
+def addBoundManagerNode(name='Default',transaction=None):
     '''
     create a manager node to link CR objects
+    queued on the transaction if given, created right away otherwise
     '''
-    manager = pm.group(empty=True,name=('MNG_BOUND_'+name))
-    manager.addAttr('boundMng')
-    for x in range(0,10):
-        #10 slots for 10 drivers
-        #anymore than that is already nonsense
-        an = 'Manager'+str(x)
-        manager.addAttr(an)
-    manager.hiddenInOutliner.set(True)
-    return manager
+    tx = transaction if transaction is not None else GraphTransaction('CR_addBoundManagerNode')
+    manager = tx.createNode('transform','MNG_BOUND_'+name)
+    tx.addAttr(manager,'boundMng')
+    #growable driver slots, see getEmptyDriverManagerSlot
+    tx.addAttr(manager,'Manager',multi=True)
+    tx.setAttr(manager,'hiddenInOutliner',True)
+    return _commitManagerNode(tx,transaction,manager)
 
-def addDriverManagerNode(name='Default'):
+def addDriverManagerNode(name='Default',transaction=None):
     '''
     create a driver manager node to link CR objects
+    queued on the transaction if given, created right away otherwise
     '''
-    manager = pm.group(empty=True,name=('MNG_DRIVER_'+name))
-    manager.addAttr('drvMng')
-    manager.addAttr('Manager')
-    manager.hiddenInOutliner.set(True)
-    return manager
+    tx = transaction if transaction is not None else GraphTransaction('CR_addDriverManagerNode')
+    manager = tx.createNode('transform','MNG_DRIVER_'+name)
+    tx.addAttr(manager,'drvMng')
+    tx.addAttr(manager,'Manager')
+    tx.setAttr(manager,'hiddenInOutliner',True)
+    return _commitManagerNode(tx,transaction,manager)
 
-def addConnectorManagerNode(name='Default'):
+def addConnectorManagerNode(name='Default',transaction=None):
     '''
     create a Connector manager node to link CR objects
+    queued on the transaction if given, created right away otherwise
+    '''
+    tx = transaction if transaction is not None else GraphTransaction('CR_addConnectorManagerNode')
+    manager = tx.createNode('transform','MNG_CONNECTOR_'+name)
+    tx.addAttr(manager,'cntMng')
+    tx.addAttr(manager,'Manager')
+    tx.setAttr(manager,'hiddenInOutliner',True)
+    return _commitManagerNode(tx,transaction,manager)
+
+def addMasterGrpNodes(name,manager,transaction,parent=None):
+    '''
+    queue the master group and its offset group (its parent) of a driver manager
+    '''
+    tx = transaction
+    masterGrpOffset = tx.createNode('transform','masterGrp_'+name+'Offset',parent)
+    masterGrp = tx.createNode('transform','masterGrp_'+name,masterGrpOffset)
+    tx.addAttr(masterGrp,'driverGrp')
+    tx.addAttr(masterGrpOffset,'driverGrpOffset')
+    tx.connect((manager,'drvMng'),(masterGrp,'driverGrp'))
+    tx.connect((manager,'drvMng'),(masterGrpOffset,'driverGrpOffset'))
+    return masterGrp,masterGrpOffset
+
+CONNECTORMODES = ('direct','compound','matrix')
+#bound channels a matrix connector takes from the decomposed driver matrix
+MATRIXCHANNELS = dict([(c+x,'output'+c[0].upper()+c[1:]+x) for c in ('rotate','scale') for x in ('','X','Y','Z')])
+
+def addConnectorNodes(name,drvManager,slot,drvOutputs,bnInputs,transaction,mode='direct',jointOrients=None):
+    '''
+    queue a connector manager and its connector node wiring drvOutputs to bnInputs
+    slot is the bound manager Manager[] plug the connector hooks up to
+    mode is one of CONNECTORMODES, see connectorPairs and _queueMatrixPairs
+    jointOrients gives the joint orient queued on driver TxNodes, the ones left out have none
+    return manager,connector
+    '''
+    if mode not in CONNECTORMODES:
+        raise ValueError('unknown connector mode {}, use one of {}'.format(mode,', '.join(CONNECTORMODES)))
+    tx = transaction
+    manager = addConnectorManagerNode(name,tx)
+    tx.addAttr(manager,'connectorMode','long')
+    tx.setAttr(manager,'connectorMode',CONNECTORMODES.index(mode))
+
+    #one c[] multi holds every plug pair instead of one attribute per pair
+    connector = tx.createNode('network','connector_'+name)
+    tx.addAttr(connector,'c',multi=True)
+    tx.addAttr(connector,'connector')
+    tx.connect((manager,'cntMng'),(connector,'connector'))
+    if mode == 'matrix':
+        drvOutputs,bnInputs = _queueMatrixPairs(tx,manager,connector,drvOutputs,bnInputs,jointOrients or {})
+    for x in range(0,len(bnInputs)):
+        plug = (connector,'c[{}]'.format(x))
+        tx.connect(drvOutputs[x],plug)
+        tx.connect(plug,bnInputs[x])
+
+    tx.connect((drvManager,'Manager'),(manager,'Manager'))
+    tx.connect((manager,'Manager'),slot)
+    return manager,connector
+
+def connectorPairs(drvJnts,bnJnts,attributeList,mode='direct'):
+    '''
+    return the drvOutputs,bnInputs plug lists of a connector mirroring attributeList between two chains
+    compound and matrix modes wire whole translate/rotate/scale compounds when all their axes are listed
+    '''
+    if mode != 'direct':
+        attributeList = compoundAttributes(attributeList)
+    #(node,'attr') plugs, resolved through the handle cache when wired
+    drvOutputs = [(dj,a) for a in attributeList for dj in drvJnts]
+    bnInputs = [(j,a) for a in attributeList for j in bnJnts]
+    return drvOutputs,bnInputs
+
+def compoundAttributes(attributeList):
+    '''
+    return the attribute list with every complete X,Y,Z triplet folded into its compound
+    '''
+    attrs = []
+    for a in attributeList:
+        if a[-1:] in ('X','Y','Z') and all([a[:-1]+x in attributeList for x in 'XYZ']):
+            a = a[:-1]
+        if a not in attrs:
+            attrs.append(a)
+    return attrs
+
+def _queueMatrixPairs(tx,manager,connector,drvOutputs,bnInputs,queuedOrients):
+    #rotate and scale pairs of a joint go through one driver matrix decomposed on the bound side
+    #the matrices are held by a matrix m[] multi next to c[], return the pairs left for c[]
+    #the driver joint orient is taken out of the matrix with a constant so the bound joint gets
+    #the driver rotate values as in direct mode, drivers queued in tx have the orient queued with them
+    #translate and other pairs stay plain pairs, an orient would turn a decomposed translate
+    groups = OrderedDict()
+    plainOutputs,plainInputs = [],[]
+    for drvPlug,bnPlug in zip(drvOutputs,bnInputs):
+        drvNode,drvAttr = _splitPlug(drvPlug)
+        bnNode,bnAttr = _splitPlug(bnPlug)
+        if drvAttr != bnAttr or bnAttr not in MATRIXCHANNELS:
+            plainOutputs.append(drvPlug)
+            plainInputs.append(bnPlug)
+            continue
+        groups.setdefault((drvNode,bnNode),(drvNode,bnNode,[]))[2].append((bnAttr,bnPlug))
+    tx.addAttr(connector,'m','matrix',multi=True)
+
+    built = [drvNode for drvNode,bnNode,_ in groups.values() if not isinstance(drvNode,TxNode)]
+    values = getBackend().getAttrs([(bnNode,'rotateOrder') for drvNode,bnNode,_ in groups.values()]+[(n,'jointOrient') for n in built])
+    rotateOrders = values[:len(groups)]
+    jointOrients = iter(values[len(groups):])
+    for x,(drvNode,bnNode,channels) in enumerate(groups.values()):
+        rotateOrder = rotateOrders[x]
+        jointOrient = next(jointOrients) if not isinstance(drvNode,TxNode) else queuedOrients.get(drvNode,(0,0,0))
+        decompose = _addConnectorHelper(tx,manager,'decomposeMatrix','{}_dec{}'.format(connector.name(),x))
+        tx.setAttr(decompose,'inputRotateOrder',int(rotateOrder))
+        matrixInput = (decompose,'inputMatrix')
+        if any([abs(v) > 1e-9 for v in jointOrient]):
+            mult = _addConnectorHelper(tx,manager,'multMatrix','{}_mult{}'.format(connector.name(),x))
+            tx.setAttr(mult,'matrixIn[1]',crm.inverse(crm.eulerToMatrix(jointOrient)))
+            tx.connect((mult,'matrixSum'),matrixInput)
+            matrixInput = (mult,'matrixIn[0]')
+        plug = (connector,'m[{}]'.format(x))
+        tx.connect((drvNode,'matrix'),plug)
+        tx.connect(plug,matrixInput)
+        for bnAttr,bnPlug in channels:
+            tx.connect((decompose,MATRIXCHANNELS[bnAttr]),bnPlug)
+    return plainOutputs,plainInputs
+
+def _addConnectorHelper(tx,manager,nodeType,name):
+    #helper nodes hang off the connector manager like connector nodes, flagged connectorHelper
+    node = tx.createNode(nodeType,name)
+    tx.addAttr(node,'connectorHelper')
+    tx.connect((manager,'cntMng'),(node,'connectorHelper'))
+    return node
+
+def _splitPlug(plug):
+    #(node,'attr') of a plug given as a (node,'attr') tuple, a plug object or a plug name
+    if isinstance(plug,tuple):
+        return plug
+    nodeName,attrName = str(plug).split('.',1)
+    return nodeName,attrName
+
+def getNodes(names):
+    '''
+    return the node of every node name, resolved through the handle cache
+    '''
+    nodes = {}
+    for name,handle in zip(names,getHandleCache().nodeHandles(names)):
+        if name not in nodes:
+            nodes[name] = handle.node()
+    return [nodes[n] for n in names]
+
+def _plugTuples(plugNames):
+    #(node,'attr') plugs of plug names, the nodes resolved through the handle cache
+    pairs = [p.split('.',1) for p in plugNames]
+    return list(zip(getNodes([n for n,a in pairs]),[a for n,a in pairs]))
+
+def getConnectorMode(manager):
+    '''
+    return the connector mode of connector manager, direct for the ones built before modes
     '''
-    manager = pm.group(empty=True,name=('MNG_CONNECTOR_'+name))
-    manager.addAttr('cntMng')
-    manager.addAttr('Manager')
-    manager.hiddenInOutliner.set(True)
-    return manager
+    if not manager.hasAttr('connectorMode'):
+        return 'direct'
+    return CONNECTORMODES[int(getBackend().getAttrs([(manager,'connectorMode')])[0])]
+
+def _commitManagerNode(tx,transaction,manager):
+    #a caller owned transaction is committed by the caller
+    if transaction is not None:
+        return manager
+    tx.commit()
+    return tx.resolve(manager)
 
 #-------------------------
 def getJntsFromBoundManager(manager):
@@ -52,101 +220,812 @@ def getJntsFromBoundManager(manager):
 
 def getEmptyDriverManagerSlot(manager):
     '''
-    return the first empty slot of driver manager to hook up with driver
+    return an empty Manager[] slot of bound manager to hook up with driver, as a (manager,'Manager[i]') plug
+    the slot is reserved for the caller, connect it right away
+    old 10 slots managers are migrated first
     '''
-    for x in range(0,10):
-        #10 slots for 10 drivers
-        #anymore than that is already nonsense
-        an = 'Manager'+str(x)
-        at = pm.PyNode(manager.name()+'.'+an)
-        if len(at.inputs()) == 0:
-            return at
-    return None
+    if isLegacyBoundManager(manager):
+        migrateBoundManagerSlots(manager)
+    table = _getSlotTable(manager)
+    backend = getBackend()
+    while True:
+        slot = (manager,'Manager[{}]'.format(table.acquire()))
+        #someone may have connected it outside of CR
+        if not backend.isDestination([slot])[0]:
+            return slot
+
+def releaseDriverManagerSlot(manager,index):
+    '''
+    give back a Manager[] slot of bound manager once its driver is gone
+    '''
+    #a table built later reads the free slots from the scene
+    if _slotTablesBackend is getBackend() and manager in _slotTables:
+        _slotTables[manager].release(index)
+
+def getConnectorsFromBoundManager(manager):
+    '''
+    return the connector managers hooked to the slots of bound manager, in slot order
+    '''
+    name = str(manager)
+    if isLegacyBoundManager(manager):
+        plugs = [name+'.Manager'+str(x) for x in range(0,10)]
+    else:
+        plugs = [name+'.Manager']
+    pairs = cmds.listConnections(cmds.ls(plugs) or [],source=True,destination=False,connections=True) or []
+    slots = sorted(zip([_slotIndex(p) for p in pairs[0::2]],pairs[1::2]))
+    return getNodes([c for _,c in slots])
+
+def isLegacyBoundManager(manager):
+    '''
+    return True if bound manager still has the old Manager0..9 slots
+    '''
+    return manager.hasAttr('Manager0')
+
+def migrateBoundManagerSlots(manager):
+    '''
+    convert an old bound manager with 10 Manager0..9 slots to the Manager[] multi in place
+    connected drivers keep their slot index
+    '''
+    if not isLegacyBoundManager(manager):
+        return
+    name = str(manager)
+    oldSlots = [a for a in ['Manager'+str(x) for x in range(0,10)] if manager.hasAttr(a)]
+    pairs = cmds.listConnections([name+'.'+a for a in oldSlots],source=True,destination=False,connections=True,plugs=True) or []
+    with undoChunk('CR_migrateBoundManagerSlots'):
+        with GraphTransaction('CR_migrateBoundManagerSlots') as tx:
+            tx.addAttr(manager,'Manager',multi=True)
+            for dst,src in zip(pairs[0::2],pairs[1::2]):
+                tx.connect(src,(manager,'Manager[{}]'.format(_slotIndex(dst))))
+        for a in oldSlots:
+            cmds.deleteAttr(name,attribute=a)
+    getHandleCache().forgetPlugs(manager)
+    _slotTables.pop(manager,None)
+
+def migrateAllBoundManagers():
+    '''
+    convert every old 10 slots bound manager of the scene
+    '''
+    for manager in iterManagers('bound'):
+        migrateBoundManagerSlots(manager)
+
+class DriverSlotTable(object):
+    '''
+    free slots of the Manager[] multi of one bound manager
+    built with one connection query, then acquire/release are O(1)
+    '''
+    def __init__(self,manager):
+        pairs = cmds.listConnections(str(manager)+'.Manager',source=True,destination=False,connections=True) or []
+        used = set([_slotIndex(p) for p in pairs[0::2]])
+        self.nextIndex = max(used)+1 if len(used) > 0 else 0
+        #lowest free index at the end so it is popped first
+        self.free = [x for x in range(self.nextIndex-1,-1,-1) if x not in used]
+        self.freeSet = set(self.free)
+
+    def acquire(self):
+        if len(self.free) > 0:
+            index = self.free.pop()
+            self.freeSet.discard(index)
+            return index
+        index = self.nextIndex
+        self.nextIndex += 1
+        return index
+
+    def release(self,index):
+        if index < self.nextIndex and index not in self.freeSet:
+            self.free.append(index)
+            self.freeSet.add(index)
+
+_slotTables = {}
+_slotTablesBackend = None
+
+def _getSlotTable(manager):
+    global _slotTablesBackend
+    #tables of another scene backend are stale
+    if _slotTablesBackend is not getBackend():
+        _slotTables.clear()
+        _slotTablesBackend = getBackend()
+    if manager not in _slotTables:
+        _slotTables[manager] = DriverSlotTable(manager)
+    return _slotTables[manager]
+
+def _slotIndex(plugName):
+    #'MNG_BOUND_x.Manager[3]' or the old 'MNG_BOUND_x.Manager3'
+    attrName = plugName.split('.')[-1]
+    if attrName.endswith(']'):
+        return int(attrName[attrName.index('[')+1:-1])
+    return int(attrName.replace('Manager',''))
 
 def clearBoundManager(manager):
     jntList = getJntsFromBoundManager(manager)
     for j in jntList:
-        j.bound.disconecct()
+        j.bound.disconnect()
 
 def cleanupBoundManagers():
     '''
     Remove all empty boundManagers
     '''
-    for x in pm.ls('MNG_BOUND_*'):
-        if (x.type()=='transform') and (len(x.boundMng.outputs()) == 0):
-            print('Remove {}'.format(x))
-            pm.delete(x)
+    _deleteEmptyManagers('bound')
 
 def getJntsFromDriverManager(manager):
     '''
-    return the jointList from driver manager
+    return the jointList from driver manager, master groups left out
     the joints chain must be single chain, if not prompt error
     '''
     if manager.name().startswith('MNG_DRIVER_'):
-        jntList = manager.drvMng.outputs()
+        nodes = manager.drvMng.outputs()
+        backend = getBackend()
+        isGroup = [g or o for g,o in zip(backend.hasAttrs(nodes,'driverGrp'),backend.hasAttrs(nodes,'driverGrpOffset'))]
+        jntList = [n for n,g in zip(nodes,isGroup) if not g]
         return jntList #check later if this is single chain
 
 def clearDriverManager(manager):
     jntList = getJntsFromDriverManager(manager)
     for j in jntList:
-        j.driver.disconecct()
+        j.driver.disconnect()
 
 def cleanupDriverManagers():
     '''
     Remove all empty driverManagers
     '''
-    for x in pm.ls('MNG_DRIVER_*'):
-        if (x.type()=='transform') and (len(x.drvMng.outputs()) == 0):
-            print('Remove {}'.format(x))
-            pm.delete(x)
+    _deleteEmptyManagers('driver')
+
+def _deleteEmptyManagers(kind):
+    #one connection query for every manager of this kind, then one delete
+    marker = MANAGERKINDS[kind][1]
+    names = list(getManagerRegistry().iterNames(kind))
+    if len(names) == 0:
+        return
+    pairs = cmds.listConnections([n+'.'+marker for n in names],source=False,destination=True,connections=True,plugs=True) or []
+    used = set([p.split('.')[0] for p in pairs[0::2]])
+    emptyManagers = [n for n in names if n not in used]
+    for x in emptyManagers:
+        logger.info('Remove %s',x)
+    if len(emptyManagers) > 0:
+        cmds.delete(emptyManagers)
 
 def getIOFromDefaultConnector(manager):
     '''
-    return the jointList from driver manager
+    return the [drvOutputs,bnInputs] plugs of every connector node of connector manager
     '''
     if manager.name().startswith('MNG_CONNECTOR_'):
-        connectorNodes = manager.cntMng.outputs()
+        connectorNodes = getConnectorNodes(manager)
         connectorOutputSet = []
         for connectorNode in connectorNodes:
-            connectorAttrs = [a for a in connectorNode.listAttr(userDefined=True) if a.attrName().startswith('c_')]
-            drvOutputs = [oa.inputs(plugs=True)[0] for oa in connectorAttrs]
-            bnInputs = [ia.outputs(plugs=True)[0] for ia in connectorAttrs]
+            drvOutputs,bnInputs = getConnectorChannelPairs(connectorNode)
+            drvOutputs = _plugTuples(drvOutputs)
+            bnInputs = _plugTuples(bnInputs)
             connectorOutputSet.append([drvOutputs,bnInputs])
         return connectorOutputSet
 
+def getConnectorPlugPairs(connectorNode):
+    '''
+    return the driver output and bound input plug names of a connector node, in index order
+    all pairs are read with one query per direction
+    connector nodes hold one c[] multi, old ones one c_### attribute per pair
+    '''
+    pairs = getConnectorPairMap(connectorNode)
+    return [p[0] for p in pairs.values()],[p[1] for p in pairs.values()]
+
+def getConnectorChannelPairs(connectorNode):
+    '''
+    return the driver output and bound input plug names of a connector node like getConnectorPlugPairs
+    the matrix pairs of a matrix connector give the rotate and scale pairs their decompose drives
+    '''
+    drvOutputs,bnInputs = getConnectorPlugPairs(connectorNode)
+    if not connectorNode.hasAttr('m'):
+        return drvOutputs,bnInputs
+    name = str(connectorNode)
+    inPairs = cmds.listConnections(name+'.m',source=True,destination=False,connections=True,plugs=True) or []
+    outPairs = cmds.listConnections(name+'.m',source=False,destination=True,connections=True,plugs=True) or []
+    drivers = dict(zip([_connectorIndex(p) for p in inPairs[0::2]],[p.split('.')[0] for p in inPairs[1::2]]))
+    helpers = dict(zip([_connectorIndex(p) for p in outPairs[0::2]],outPairs[1::2]))
+    indices = sorted([x for x in drivers if x in helpers])
+
+    #multMatrix helpers lead to their decompose, one query for all of them
+    sums = [helpers[x].split('.')[0]+'.matrixSum' for x in indices if not helpers[x].endswith('.inputMatrix')]
+    sums = (cmds.listConnections(sums,source=False,destination=True,connections=True,plugs=True) or []) if len(sums) > 0 else []
+    helpers = dict([(x,helpers[x].split('.')[0]) for x in indices])
+    decompose = dict([(src.split('.')[0],dst.split('.')[0]) for src,dst in zip(sums[0::2],sums[1::2])])
+    decompose = dict([(x,decompose.get(helpers[x],helpers[x])) for x in indices])
+    outputs = cmds.listConnections([decompose[x] for x in indices],source=False,destination=True,connections=True,plugs=True) or []
+    channels = dict([(v,k) for k,v in MATRIXCHANNELS.items()])
+    driven = OrderedDict()
+    for src,dst in zip(outputs[0::2],outputs[1::2]):
+        helper,attrName = src.split('.',1)
+        if attrName in channels:
+            driven.setdefault(helper,[]).append((channels[attrName],dst))
+
+    pairs = [(drivers[x]+'.'+channel,dst) for x in indices for channel,dst in driven.get(decompose[x],[])]
+    return [p[0] for p in pairs]+drvOutputs,[p[1] for p in pairs]+bnInputs
+
+def getConnectorNodes(manager):
+    '''
+    return the connector nodes of connector manager, without the matrix helper nodes
+    '''
+    return splitConnectorNodes(manager)[0]
+
+def splitConnectorNodes(manager):
+    '''
+    return the connector nodes and the matrix helper nodes of connector manager
+    '''
+    nodes = manager.cntMng.outputs()
+    if len(nodes) < 2:
+        #a lone output is the connector node, no need to query the helper flag
+        return nodes,[]
+    flags = getBackend().hasAttrs(nodes,'connectorHelper')
+    return [n for n,f in zip(nodes,flags) if not f],[n for n,f in zip(nodes,flags) if f]
+
+def getConnectorPairMap(connectorNode):
+    '''
+    return an ordered dict index: (driver output,bound input) plug names of a connector node
+    indices wired on one side only are left out
+    '''
+    name = str(connectorNode)
+    if isLegacyConnector(connectorNode):
+        plugs = [name+'.'+a for a in cmds.listAttr(name,userDefined=True,string='c_*') or []]
+    else:
+        plugs = [name+'.c']
+    if len(plugs) == 0:
+        return OrderedDict()
+    inPairs = cmds.listConnections(plugs,source=True,destination=False,connections=True,plugs=True,skipConversionNodes=True) or []
+    outPairs = cmds.listConnections(plugs,source=False,destination=True,connections=True,plugs=True,skipConversionNodes=True) or []
+    drvOutputs = dict(zip([_connectorIndex(p) for p in inPairs[0::2]],inPairs[1::2]))
+    bnInputs = dict(zip([_connectorIndex(p) for p in outPairs[0::2]],outPairs[1::2]))
+    indices = sorted([x for x in drvOutputs if x in bnInputs])
+    return OrderedDict([(x,(drvOutputs[x],bnInputs[x])) for x in indices])
+
+def isLegacyConnector(connectorNode):
+    '''
+    return True if connector node still uses one c_### attribute per plug pair
+    '''
+    return not connectorNode.hasAttr('c')
+
+def _connectorIndex(plugName):
+    #'connector_x.c[3]' or the old 'connector_x.c_003'
+    attrName = plugName.split('.')[-1]
+    if attrName.endswith(']'):
+        return int(attrName[attrName.index('[')+1:-1])
+    return int(attrName[2:])
+
+# --------------------------------------------------------------
+# MANAGER REGISTRY
+# --------------------------------------------------------------
+MANAGERKINDS = {
+    'bound' : ('MNG_BOUND_','boundMng'),
+    'driver' : ('MNG_DRIVER_','drvMng'),
+    'connector' : ('MNG_CONNECTOR_','cntMng'),
+}
+
+class ManagerRegistry(object):
+    '''
+    index of the bound/driver/connector managers of the scene by kind and name
+    populated once, then kept current by node added/removed/renamed callbacks
+    nodes are kept as backend node handles
+    the generation counts the connection changes of managers, see managerProperty
+    listeners are told of every index change, for views kept current without rescans
+    '''
+    def __init__(self,backend=None):
+        self.backend = backend if backend is not None else getBackend()
+        self.index = dict([(kind,{}) for kind in MANAGERKINDS])
+        self.entries = {}
+        self.pending = []
+        self.callbackIds = []
+        self.populated = False
+        self.connectionGeneration = 0
+        self.holds = 0
+        self.heldGeneration = 0
+        self.listeners = []
+
+    def populate(self):
+        '''
+        index every manager of the scene, one ls per kind
+        '''
+        self.clear()
+        for kind,(prefix,marker) in MANAGERKINDS.items():
+            for handle in self.backend.nodesWithAttr(marker):
+                self._add(kind,handle)
+        if len(self.callbackIds) == 0:
+            self._addCallbacks()
+        self.populated = True
+
+    def clear(self):
+        '''
+        forget every indexed manager, the next query populates again
+        '''
+        wasPopulated = self.populated
+        for kind in self.index:
+            self.index[kind].clear()
+        self.entries.clear()
+        self.pending = []
+        self.populated = False
+        self.connectionGeneration += 1
+        if wasPopulated:
+            self._notify('cleared',None,None)
+
+    def remove(self):
+        '''
+        remove the scene callbacks of this registry
+        '''
+        self.backend.removeCallbacks(self.callbackIds)
+        self.callbackIds = []
+        self.clear()
+
+    def addListener(self,func):
+        '''
+        call func(event,kind,name) on every index change, events are
+        added, removed, renamed (name is the (old,new) pair), changed (a connection of the manager),
+        cleared (kind and name None) and pending (nodes added to the scene, indexed by the next flush)
+        listeners run inside scene callbacks, they should only record the change
+        '''
+        if len(self.callbackIds) == 0:
+            self._addCallbacks()
+        if func not in self.listeners:
+            self.listeners.append(func)
+
+    def removeListener(self,func):
+        '''
+        stop calling func on index changes
+        '''
+        if func in self.listeners:
+            self.listeners.remove(func)
+
+    def flush(self):
+        '''
+        index the nodes added since the last query, listeners are told of the new managers
+        '''
+        self._update()
+
+    def iterNames(self,kind):
+        '''
+        lazily yield the manager names of this kind
+        '''
+        self._update()
+        for name in list(self.index[kind]):
+            if name in self.index[kind]:
+                yield name
+
+    def iterManagers(self,kind):
+        '''
+        lazily yield the manager nodes of this kind
+        '''
+        for name in self.iterNames(kind):
+            handle = self.index[kind][name]
+            if handle.isValid():
+                yield handle.node()
+
+    def getManager(self,kind,name):
+        '''
+        return the manager node of this kind and name (prefix optional), None if not found
+        '''
+        self._update()
+        prefix = MANAGERKINDS[kind][0]
+        if not name.startswith(prefix):
+            name = prefix+name
+        handle = self.index[kind].get(name)
+        if handle is None or not handle.isValid():
+            return None
+        return handle.node()
+
+    def count(self,kind):
+        '''
+        return the amount of managers of this kind
+        '''
+        self._update()
+        return len(self.index[kind])
+
+    def generation(self):
+        '''
+        return the connection generation, bumped whenever a connection of a manager changes
+        '''
+        if len(self.callbackIds) == 0:
+            self._addCallbacks()
+        if self.holds > 0:
+            return self.heldGeneration
+        return self.connectionGeneration
+
+    # private methods
+    def _update(self):
+        if not self.populated:
+            self.populate()
+            return
+        #nodes added since the last query, their marker attribute exists by now
+        pending = self.pending
+        self.pending = []
+        for handle in pending:
+            if not handle.isValid():
+                continue
+            for kind,(prefix,marker) in MANAGERKINDS.items():
+                if handle.hasAttr(marker):
+                    self._notify('added',kind,self._add(kind,handle))
+                    break
+
+    def _add(self,kind,handle):
+        name = handle.name()
+        self.index[kind][name] = handle
+        self.entries[handle.key()] = (kind,name)
+        return name
+
+    def _addCallbacks(self):
+        self.callbackIds = self.backend.addCallbacks(
+            nodeAdded=self._nodeAdded,
+            nodeRemoved=self._nodeRemoved,
+            nameChanged=self._nameChanged,
+            connectionChanged=self._connectionChanged,
+            sceneCleared=self.clear,
+        )
+
+    def _notify(self,event,kind,name):
+        for func in list(self.listeners):
+            func(event,kind,name)
+
+    def _nodeAdded(self,handle):
+        self.pending.append(handle)
+        if len(self.listeners) > 0:
+            self._notify('pending',None,None)
+
+    def _nodeRemoved(self,handle):
+        entry = self.entries.pop(handle.key(),None)
+        if entry is not None:
+            kind,name = entry
+            self.index[kind].pop(name,None)
+            self._notify('removed',kind,name)
+
+    def _nameChanged(self,handle):
+        entry = self.entries.get(handle.key())
+        if entry is not None:
+            kind,name = entry
+            self.index[kind].pop(name,None)
+            self._notify('renamed',kind,(name,self._add(kind,handle)))
+
+    def _connectionChanged(self,srcHandle,dstHandle,made):
+        #held blocks change managers anyway, no need to look
+        if self.holds > 0:
+            self.connectionGeneration += 1
+            if len(self.listeners) > 0:
+                self._notify('changed',None,None)
+            return
+        #managers are always the source of their connections
+        #managers created since the last query are not indexed yet, their marker tells
+        entry = self.entries.get(srcHandle.key())
+        if entry is not None or ((len(self.pending) > 0 or not self.populated) and self._isManager(srcHandle)):
+            self.connectionGeneration += 1
+            if len(self.listeners) > 0:
+                kind,name = entry if entry is not None else (None,None)
+                self._notify('changed',kind,name)
+
+    def _isManager(self,handle):
+        for prefix,marker in MANAGERKINDS.values():
+            if handle.hasAttr(marker):
+                return True
+        return False
+
+_managerRegistry = None
+
+def getManagerRegistry():
+    '''
+    return the scene manager registry, created on first use and for each new scene backend
+    '''
+    global _managerRegistry
+    backend = getBackend()
+    if _managerRegistry is None or _managerRegistry.backend is not backend:
+        if _managerRegistry is not None:
+            _managerRegistry.remove()
+        _managerRegistry = ManagerRegistry(backend)
+    return _managerRegistry
+
+def iterManagers(kind):
+    '''
+    lazily yield the bound/driver/connector manager nodes of the scene
+    '''
+    return getManagerRegistry().iterManagers(kind)
+
+class managerProperty(object):
+    '''
+    system attribute read from the manager connections on first access, then cached on the instance
+    recomputed after a connection of a scene manager changed or another scene backend is set
+    assigned values are kept as they are until assigned again
+    '''
+    def __init__(self,func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self,obj,cls):
+        if obj is None:
+            return self
+        cache = obj.__dict__.setdefault('_managerCache',{})
+        entry = cache.get(self.name)
+        if entry is not None and entry[0] is None:
+            return entry[1]
+        registry = getManagerRegistry()
+        stamp = (registry,registry.generation())
+        if entry is None or entry[0] != stamp:
+            entry = (stamp,self.func(obj))
+            cache[self.name] = entry
+        return entry[1]
+
+    def __set__(self,obj,value):
+        obj.__dict__.setdefault('_managerCache',{})[self.name] = (None,value)
+
+    def __delete__(self,obj):
+        #the next access reads the scene again
+        obj.__dict__.setdefault('_managerCache',{}).pop(self.name,None)
+
+@contextmanager
+def holdManagerProperties():
+    '''
+    keep the cached system attributes through the connection changes made in the block
+    for builds and teardowns that keep the systems they touch up to date themselves
+    the changes are seen once the outermost block exits
+    '''
+    registry = getManagerRegistry()
+    if registry.holds == 0:
+        registry.heldGeneration = registry.generation()
+    registry.holds += 1
+    try:
+        yield
+    finally:
+        registry.holds -= 1
+
+# --------------------------------------------------------------
+# SKIN CLUSTERS
+# --------------------------------------------------------------
+def getSkinClusterMap(jointList):
+    '''
+    return an ordered dict skinCluster name -> influence joints (long names) of the joint list
+    one connection query for all the joints, then one influence query per skinCluster
+    '''
+    skinMap = OrderedDict()
+    if len(jointList) == 0:
+        return skinMap
+    names = [str(j) for j in jointList]
+    skinNodes = cmds.listConnections([n+'.worldMatrix' for n in names],source=False,destination=True,type='skinCluster') or []
+    if len(skinNodes) == 0:
+        return skinMap
+    #long names grow with the depth of the chain, only built when there is a skin to match
+    longNames = set(cmds.ls(names,long=True) or [])
+    for sn in skinNodes:
+        if sn in skinMap:
+            continue
+        influences = cmds.ls(cmds.skinCluster(sn,query=True,influence=True) or [],long=True) or []
+        skinMap[sn] = [i for i in influences if i in longNames]
+    return skinMap
+
+class SkinClusterCache(object):
+    '''
+    per scene cache of the skinClusters bound to joint sets, keyed on the joint set
+    cleared when a skinCluster connection changes or another scene is loaded
+    '''
+    def __init__(self,backend=None):
+        self.backend = backend if backend is not None else getBackend()
+        self.cache = {}
+        self.callbackIds = []
+
+    def getSkinClusters(self,jointList):
+        '''
+        return the skinCluster names bound to the joint list
+        '''
+        if len(self.callbackIds) == 0:
+            self._addCallbacks()
+        key = frozenset([str(j) for j in jointList])
+        if key not in self.cache:
+            self.cache[key] = list(getSkinClusterMap(jointList))
+        return list(self.cache[key])
+
+    def clear(self):
+        '''
+        forget every cached joint set
+        '''
+        self.cache.clear()
+
+    def remove(self):
+        '''
+        remove the scene callbacks of this cache
+        '''
+        self.backend.removeCallbacks(self.callbackIds)
+        self.callbackIds = []
+        self.clear()
+
+    # private methods
+    def _addCallbacks(self):
+        self.callbackIds = self.backend.addCallbacks(
+            connectionChanged=self._connectionChanged,
+            sceneCleared=self.clear,
+        )
+
+    def _connectionChanged(self,srcHandle,dstHandle,made):
+        if len(self.cache) == 0:
+            return
+        if dstHandle.isType('skinCluster') or srcHandle.isType('skinCluster'):
+            self.cache.clear()
+
+_skinClusterCache = None
+
+def getSkinClusterCache():
+    '''
+    return the scene skinCluster cache, created on first use and for each new scene backend
+    '''
+    global _skinClusterCache
+    backend = getBackend()
+    if _skinClusterCache is None or _skinClusterCache.backend is not backend:
+        if _skinClusterCache is not None:
+            _skinClusterCache.remove()
+        _skinClusterCache = SkinClusterCache(backend)
+    return _skinClusterCache
+
+def getBoundManagersFromSkin(skinNode):
+    '''
+    return the bound managers of the joints that are influences of this skinCluster
+    '''
+    influences = cmds.skinCluster(str(skinNode),query=True,influence=True) or []
+    boundPlugs = cmds.ls([i+'.bound' for i in influences]) or []
+    if len(boundPlugs) == 0:
+        return []
+    managers = cmds.listConnections(boundPlugs,source=True,destination=False) or []
+    return getNodes(list(OrderedDict.fromkeys(managers)))
+
+# --------------------------------------------------------------
+# DRIVER PREFABS
+# --------------------------------------------------------------
+#templates kept by the prefab cache, the least recently used one is dropped first
+PREFABCACHESIZE = 256
+#relative rotation and translation values closer than this share a signature
+PREFABTOLERANCE = 1e-4
+
+class PrefabCache(object):
+    '''
+    driver templates keyed by chain signature, for characters repeating the same chains
+    the signature is the joint count, the transform of every joint relative to the one above it
+    within tolerance, the attribute list, the connector mode and the controller shape
+    a template holds the local translate/rotate of the driver joints below the first one
+    and the size of every controller, the first joint is placed for each chain
+    '''
+    def __init__(self,maxSize=PREFABCACHESIZE,tolerance=PREFABTOLERANCE):
+        self.maxSize = maxSize
+        self.tolerance = tolerance
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self,worlds,parentWorld,attributeList,mode='direct',shape=None,size=1.0,boneScale=None):
+        '''
+        return the translates,rotates,sizes of the driver joints of a chain
+        from its joint world matrices and the one of its parent (None at the world)
+        a missing template is solved and recorded, sizes is None without shape
+        '''
+        rigids = [crm.rigid(m) for m in [parentWorld if parentWorld is not None else crm.identity()]+list(worlds)]
+        #the same solve alignTransforms runs on driver joints under a master group placed on the parent
+        first = crm.alignLocal(rigids[1],rigids[0])
+        relatives = [crm.multiply(rigids[x+1],crm.inverse(rigids[x])) for x in range(1,len(worlds))]
+        ratio = 1.0/self.tolerance
+        values = tuple([int(round(v*ratio)) for m in relatives for row in m for v in row[:3]])
+        shapeKey = (shape,float(size),boneScale) if shape is not None else None
+        key = (len(worlds),values,tuple(attributeList),mode,shapeKey)
+
+        template = self.templates.pop(key,None)
+        if template is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            template = self._solve(worlds,rigids,shape,size,boneScale)
+        self.templates[key] = template
+        while len(self.templates) > self.maxSize:
+            self.templates.popitem(last=False)
+            self.evictions += 1
+        translates,rotates,sizes = template
+        return (tuple(first[0]),)+translates,(tuple(first[1]),)+rotates,sizes
+
+    def stats(self):
+        '''
+        return the hit/miss counts, evictions and size of the cache
+        '''
+        lookups = self.hits+self.misses
+        return OrderedDict([
+            ('hits',self.hits),
+            ('misses',self.misses),
+            ('hitRate',float(self.hits)/lookups if lookups > 0 else 0.0),
+            ('evictions',self.evictions),
+            ('size',len(self.templates)),
+            ('maxSize',self.maxSize),
+        ])
+
+    def clear(self):
+        '''
+        forget every template and reset the statistics
+        '''
+        self.templates.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # private methods
+    def _solve(self,worlds,rigids,shape,size,boneScale):
+        #locals of the joints below the first one and the controller sizes
+        count = len(worlds)-1
+        solved = crm.alignLocals(rigids[2:],rigids[1:-1],[0]*count,[None]*count,[None]*count)
+        sizes = None
+        if shape is not None and boneScale is not None:
+            positions = [crm.translation(m) for m in worlds]
+            lengths = [math.sqrt(sum([(b[i]-a[i])**2 for i in range(3)])) for a,b in zip(positions[:-1],positions[1:])]
+            lengths.append(lengths[-1] if len(lengths) > 0 else 1.0)
+            sizes = tuple([l*boneScale for l in lengths])
+        elif shape is not None:
+            sizes = tuple([float(size)]*len(worlds))
+        return (tuple([tuple(t) for t,r in solved]),tuple([tuple(r) for t,r in solved]),sizes)
+
+_prefabCache = None
+
+def getPrefabCache():
+    '''
+    return the shared driver prefab cache, created on first use
+    templates hold no scene node, the cache is kept across scenes
+    '''
+    global _prefabCache
+    if _prefabCache is None:
+        _prefabCache = PrefabCache()
+    return _prefabCache
+
+# --------------------------------------------------------------
+# MIRRORING
+# --------------------------------------------------------------
+#left/right name tokens, swapped at the end of a name first, then at its start
+MIRRORSUFFIXES = (('Left','Right'),('left','right'),('_L','_R'),('_l','_r'),('L','R'))
+MIRRORPREFIXES = (('Left','Right'),('left','right'),('L_','R_'),('l_','r_'))
+#distance under which a mirrored joint sits on its counterpart
+MIRRORTOLERANCE = 1e-3
+
+def mirrorName(name,suffixes=MIRRORSUFFIXES,prefixes=MIRRORPREFIXES):
+    '''
+    return name with its left/right token swapped, None if it has none
+    '''
+    for a,b in suffixes:
+        for token,swapped in ((a,b),(b,a)):
+            if name.endswith(token) and len(name) > len(token):
+                #a bare L/R only counts after a lowercase letter or a digit, TAIL or COLLAR have no side
+                if len(token) == 1 and not (name[-2].islower() or name[-2].isdigit()):
+                    continue
+                return name[:-len(token)]+swapped
+    for a,b in prefixes:
+        for token,swapped in ((a,b),(b,a)):
+            if name.startswith(token) and len(name) > len(token):
+                return swapped+name[len(token):]
+    return None
+
 #-------------------------
+def getParentMap(nodeList):
+    '''
+    return ids,parentMap,labels of the dag nodes in one backend pass
+    ids are in nodeList order, parentMap maps every id to its parent id (None at world)
+    the ancestors of the nodes whose parent is not in the list are mapped too
+    '''
+    return getBackend().parentMap(nodeList)
+
 def reorderSingleChainJointList(jointList):
     '''
     reorder the joint list from top to bottom of joints chain
     raise error if this chain is not possible to be re-ordered
     '''
-    #find bottom joint
-    reorderList = []
-    btmJnt = None
-    for j in jointList:
-        isBtm = True
-        children = j.getChildren()
-        for c in children:
-            if c in jointList:
-                isBtm = False
-                break
-
-        if isBtm:
-            btmJnt = j
-            reorderList.append(btmJnt)
-            break
-
-    while len(reorderList) < len(jointList):
-        nextJnt = btmJnt.getParent()
-        if nextJnt in jointList:
-            btmJnt = nextJnt
-            reorderList.append(btmJnt)
-        else:
-            raise AttributeError('This is not a single joint chain, unable to reorder')
-        
-    reorderList.reverse()
-    return reorderList
+    chains = splitJointChains(jointList)
+    if len(chains) > 1:
+        raise AttributeError('This is not a single joint chain, unable to reorder')
+    if len(chains) == 0:
+        return []
+    return chains[0]
 
+def splitJointChains(jointList):
+    '''
+    split any joint list into ordered chains (top to bottom)
+    a chain stops at a branching joint, each branch starts a new chain
+    ie. a hand gives the arm chain then one chain per finger
+    raise error on gaps (missing joints in between) and cycles
+    '''
+    if len(jointList) == 0:
+        return []
+    ids,parentMap,labels = getParentMap(jointList)
+    nodes = dict(zip(ids,jointList))
+    chains = buildChainForest(ids,parentMap,labels)
+    return [[nodes[i] for i in chain] for chain in chains]
 
 def isSingleChain(jointList):
     '''
@@ -162,6 +1041,28 @@ def isSingleChain(jointList):
     
     return True
 
+def isSingleChains(jointLists):
+    '''
+    isSingleChain for many joint lists, with one type and one parent query for all joints
+    '''
+    joints = [j for jointList in jointLists for j in jointList]
+    if len(joints) == 0:
+        return [True]*len(jointLists)
+    backend = getBackend()
+    isJoint = iter(backend.hasAttrs(joints,'jointOrient'))
+    ids,parentMap,_ = backend.parentMap(joints)
+    ids = iter(ids)
+    result = []
+    for jointList in jointLists:
+        chainIds = [next(ids) for j in jointList]
+        types = [next(isJoint) for j in jointList]
+        single = all(types[1:])
+        for x in range(1,len(chainIds)):
+            if parentMap.get(chainIds[x]) != chainIds[x-1]:
+                single = False
+        result.append(single)
+    return result
+
 def duplicateSingleChain(jointList):
     '''
     true duplication of a joint list
@@ -169,12 +1070,8 @@ def duplicateSingleChain(jointList):
     the dup chain will be outside of any hierachy
     '''
     if isSingleChain(jointList):
-        dupJointList = []
-        pm.select(cl=True)
-        for j in jointList:
-            dj = pm.joint(n='dup_'+j.name())
-            alignTransform(j,dj)
-            dupJointList.append(dj)
+        dupJointList = getBackend().createJointChain(['dup_'+j.name() for j in jointList])
+        alignTransforms(jointList,dupJointList)
 
         return dupJointList
     else:
@@ -190,61 +1087,318 @@ def shapeGenerate(shape="circle",name="new_controller"):
 	'''
 	generate controller shape
 	general rule is 1 controller fit 15 unit tall figure
+	shapes come precompiled from the shape library
 	'''
-	if shape == "circle":
-		c = pm.circle(nr=[1,0,0],ch=False,n=name)[0]
-	elif shape == "square":
-		c = pm.curve(d=1, p=[(-1,0,1), (-1,0,-1), (1,0,-1), (1,0,1), (-1,0,1)], k=[0,1,2,3,4],n=name )
-	elif shape == "sphere":
-		c = pm.curve(d=1, p=[(-1,0,0),(-0.66,0,-0.66),(0,0,-1),(0.66,0,-0.66),(1,0,0),(0.66,0,0.66),(0,0,1),(-0.66,0,0.66),(-1,0,0),(-0.66,0.66,0),(0,1,0),(0.66,0.66,0),(1,0,0),(0.66,-0.66,0),(0,-1,0),(-0.66,-0.66,0),(-1,0,0),(-0.66,0.66,0),(0,1,0),(0,0.66,0.66),(0,0,1),(0,-0.66,0.66),(0,-1,0),(0,-0.66,-0.66),(0,0,-1),(0,0.66,-0.66),(0,1,0)], 
-								k=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23,24,25,26],n=name  )
-	elif shape == "cube":
-		c= pm.curve(d=1, p=[(1,-1,1),(1,-1,-1),(-1,-1,-1),(-1,-1,1),(1,-1,1),(1,1,1),(1,1,-1),(-1,1,-1),(-1,1,1),(1,1,1),(-1,1,1),(-1,-1,1),(-1,-1,-1),(-1,1,-1),(1,1,-1),(1,-1,-1)], 
-								k=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15],n=name  )
-	elif shape == "arrow":
-		c= pm.curve(d=1, p=[(-0.5,0,-1),(-0.5,0,0.25),(-1,0,0.25),(0,0,1),(1,0,0.25),(0.5,0,0.25),(0.5,0,-1),(-0.5,0,-1)], 
-								k=[0,1,2,3,4,5,6,7],n=name )
-	elif shape == "cross":
-		c = pm.curve(d=1, p=[(-0.33333,0,1),(-0.33333,0,0.333333),(-1,0,0.333333),(-1,0,-0.333333),(-0.33333,0,-0.333333),(-0.33333,0,-1),(0.333333,0,-1),(0.333333,0,-0.333333),(1,0,-0.333333),(1,0,0.333333),(0.333333,0,0.333333),(0.333333,0,1),(-0.33333,0,1)], 
-								k=[0,1,2,3,4,5,6,7,8,9,10,11,12],n=name )
-	elif shape == "diamond":
-		c = pm.curve(d=1, p=[(0,0,1),(-1,0,0),(0,0,-1),(1,0,0),(0,0,1),(0,1,0),(0,0,-1),(0,-1,0),(0,0,1),(1,0,0),(0,1,0),(-1,0,0),(0,-1,0),(1,0,0)], 
-								k=[0,1,2,3,4,5,6,7,8,9,10,11,12,13],n=name )
-	else:
-		c=None
-	return c
+	if shape not in getShapeLibrary().templates:
+		return None
+	with GraphTransaction('CR_shapeGenerate') as tx:
+		c = tx.createNode('transform',name)
+		attachShapes([c],shape,transaction=tx)
+	return tx.resolve(c)
 
 def matchCustomized(base,target):
-    baseShape = base.getShapes()[0]
-    targetShape = target.getShapes()[0]
-    
-    baseBBSize = (base.getBoundingBox().max() - base.getBoundingBox().min()).length()
-    targetBBSize = (target.getBoundingBox().max() - target.getBoundingBox().min()).length()
-    scaleRatio = baseBBSize/targetBBSize
-    pm.select(targetShape.cv,r=True)
-    pm.scale(scaleRatio,scaleRatio,scaleRatio,r=True,ocp=True)
-    pm.select(cl=True)
-    
-    #
-    baseLW = baseShape.lineWidth.get()
-    targetShape.lineWidth.set(baseLW)
-    #
-    baseColorSet = baseShape.overrideEnabled.get()
-    if baseColorSet:
-        targetShape.overrideEnabled.set(True)
-        targetShape.overrideColor.set(baseShape.overrideColor.get())
+    matchCustomizedShapes([base],[target])
+
+def matchCustomizedShapes(bases,targets):
+    '''
+    fit the shapes of every target controller to the size of its base and copy its style
+    the ratio comes from the world bounding boxes of all the shapes of each controller
+    cvs are scaled around the center of each target shape, the selection is not touched
+    '''
+    backend = getBackend()
+    baseShapes = [b.getShapes() for b in bases]
+    targetShapes = [t.getShapes() for t in targets]
+    shapes = [s for shapeList in baseShapes+targetShapes for s in shapeList]
+    pointLists = iter(backend.curvePoints(shapes))
+    basePoints = [[next(pointLists) for s in shapeList] for shapeList in baseShapes]
+    targetPoints = [[next(pointLists) for s in shapeList] for shapeList in targetShapes]
+    worlds = backend.worldMatrices(list(bases)+list(targets))
+    baseWorlds,targetWorlds = worlds[:len(bases)],worlds[len(bases):]
+
+    newShapes = []
+    newPoints = []
+    for x in range(0,len(targets)):
+        baseSize = _boundingBoxSize(basePoints[x],baseWorlds[x])
+        targetSize = _boundingBoxSize(targetPoints[x],targetWorlds[x])
+        if baseSize == 0 or targetSize == 0:
+            continue
+        ratio = baseSize/targetSize
+        for s,points in zip(targetShapes[x],targetPoints[x]):
+            newShapes.append(s)
+            newPoints.append(_scalePoints(points,ratio))
+    backend.setCurvePoints(newShapes,newPoints)
+
+    #style of the first base shape goes to every target shape
+    styleAttrs = ('lineWidth','overrideEnabled','overrideColor')
+    styled = [(shapeList[0],targetShapes[x]) for x,shapeList in enumerate(baseShapes) if len(shapeList) > 0]
+    styles = iter(backend.getAttrs([(b,a) for b,_ in styled for a in styleAttrs]))
+    plugs = []
+    values = []
+    for _,shapeList in styled:
+        lineWidth,overrideEnabled,overrideColor = [next(styles) for a in styleAttrs]
+        for s in shapeList:
+            plugs.append((s,'lineWidth'))
+            values.append(lineWidth)
+            if overrideEnabled:
+                plugs.extend([(s,'overrideEnabled'),(s,'overrideColor')])
+                values.extend([True,overrideColor])
+    backend.setAttrs(plugs,values)
+
+def _boundingBoxSize(pointLists,world):
+    #diagonal of the world bounding box of the cvs of some shapes
+    points = [p for points in pointLists for p in points]
+    if len(points) == 0:
+        return 0
+    if crm._np is not None:
+        p = crm._np.asarray(points,dtype=float)
+        w = crm._np.asarray(world,dtype=float)
+        p = p.dot(w[:3,:3]) + w[3,:3]
+        return float(crm._np.linalg.norm(p.max(axis=0)-p.min(axis=0)))
+    p = [[v[0]*world[0][c] + v[1]*world[1][c] + v[2]*world[2][c] + world[3][c] for c in range(3)] for v in points]
+    return sum([(max([v[c] for v in p])-min([v[c] for v in p]))**2 for c in range(3)])**0.5
+
+def _scalePoints(points,ratio):
+    #scale around the center of the bounding box, like scaling the cvs with the object center pivot
+    if crm._np is not None:
+        p = crm._np.asarray(points,dtype=float)
+        center = (p.max(axis=0)+p.min(axis=0))*0.5
+        return center + (p-center)*ratio
+    center = [(max([v[c] for v in points])+min([v[c] for v in points]))*0.5 for c in range(3)]
+    return [tuple([center[c] + (v[c]-center[c])*ratio for c in range(3)]) for v in points]
 
 def alignTransform(base,target):
-	pm.delete(pm.parentConstraint(base,target))
+	alignTransforms([base],[target])
 
-def isSamePlane(jntList):
-    return True
+def alignTransforms(bases,targets):
+    '''
+    snap every target on its base, position and orientation, the targets keep their scale
+    same result as a parentConstraint without offset, but matrices are read and written in bulk
+    targets may be parented under each other, parents are solved first
+    '''
+    if len(targets) == 0:
+        return
+    backend = getBackend()
+    count = len(targets)
+    #the closest target above each target, its move carries the ones below
+    above = [None]*count
+    direct = [False]*count
+    if count > 1:
+        ids,parentMap,_ = backend.parentMap(targets)
+        indexes = dict([(i,x) for x,i in enumerate(ids)])
+        for x in range(0,count):
+            p = parentMap.get(ids[x])
+            direct[x] = p in indexes
+            while (p is not None) and (p not in indexes):
+                p = parentMap.get(p)
+            above[x] = indexes.get(p)
+
+    #a target right under another one gets its parent matrix from the solve, no read needed
+    loose = [x for x in range(0,count) if not direct[x]]
+    carriers = sorted(set([above[x] for x in loose if above[x] is not None]))
+    worlds = backend.worldMatrices(list(bases)+[targets[a] for a in carriers])
+    baseWorlds = worlds[:count]
+    oldWorlds = dict(zip(carriers,worlds[count:]))
+    parentWorlds = [None]*count
+    for x,m in zip(loose,backend.worldMatrices([targets[x] for x in loose],exclusive=True)):
+        parentWorlds[x] = m
+
+    isJoint = backend.hasAttrs(targets,'jointOrient')
+    plugs = []
+    for t,j in zip(targets,isJoint):
+        plugs.extend([(t,'rotateOrder'),(t,'scale')])
+        if j:
+            plugs.extend([(t,'jointOrient'),(t,'segmentScaleCompensate'),(t,'inverseScale')])
+    values = iter(backend.getAttrs(plugs))
+    rotateOrders,scales,jointOrients,inverseScales = [],[],[],[]
+    for j in isJoint:
+        rotateOrders.append(int(next(values)))
+        scales.append(next(values))
+        if j:
+            jointOrient,compensate,inverseScale = [next(values) for x in range(0,3)]
+            jointOrients.append(jointOrient)
+            inverseScales.append(inverseScale if compensate else None)
+        else:
+            jointOrients.append(None)
+            inverseScales.append(None)
+
+    #levels of targets, each one only depends on the levels before it
+    depths = [None]*count
+    for x in range(0,count):
+        chain = []
+        y = x
+        while (y is not None) and (depths[y] is None):
+            chain.append(y)
+            y = above[y]
+        depth = depths[y] if y is not None else -1
+        for y in reversed(chain):
+            depth += 1
+            depths[y] = depth
+    levels = [[] for d in range(0,max(depths)+1)]
+    for x in range(0,count):
+        levels[depths[x]].append(x)
+
+    carried = set(above)
+    newWorlds = [None]*count
+    results = [None]*count
+    for level in levels:
+        for x in level:
+            a = above[x]
+            if direct[x]:
+                parentWorlds[x] = newWorlds[a]
+            elif a is not None:
+                #the untouched transforms in between keep their local matrix
+                parentWorlds[x] = crm.multiply(crm.multiply(parentWorlds[x],crm.inverse(oldWorlds[a])),newWorlds[a])
+        solved = crm.alignLocals([crm.rigid(baseWorlds[x]) for x in level],[parentWorlds[x] for x in level],
+                                 [rotateOrders[x] for x in level],[jointOrients[x] for x in level],[inverseScales[x] for x in level])
+        for x,(translate,rotate) in zip(level,solved):
+            results[x] = (tuple(translate),tuple(rotate))
+            if x in carried:
+                local = crm.composeMatrix(translate,rotate,scales[x],rotateOrders[x],jointOrients[x],inverseScales[x])
+                newWorlds[x] = crm.multiply(local,parentWorlds[x])
+
+    plugs = []
+    values = []
+    for t,(translate,rotate) in zip(targets,results):
+        plugs.extend([(t,'translate'),(t,'rotate')])
+        values.extend([translate,rotate])
+    backend.setAttrs(plugs,values)
+
+def getPlaneDeviations(chains):
+    '''
+    return the signed distance of every joint of every chain to the best fit plane of its chain
+    chains of less than 3 joints and straight chains are 0.0 everywhere
+    '''
+    positions = _chainPositions(chains)
+    planes = crm.fitPlanes(positions)
+    return [crm.planeDistances(p,plane) for p,plane in zip(positions,planes)]
+
+def isSamePlane(jntList,tolerance=0.001):
+    '''
+    return True if every joint is within tolerance of the best fit plane of the chain
+    see getPlaneDeviations for the distance of each joint
+    '''
+    return all([abs(d) <= tolerance for d in getPlaneDeviations([jntList])[0]])
 
 def snapOnPlane(jntList):
     '''
-    using the first 3 joints in list to align everybody else
+    move every joint onto the best fit plane of the chain, joints keep their orientation
+    '''
+    snapOnPlanes([jntList])
+
+def snapOnPlanes(chains):
+    '''
+    snapOnPlane for many chains, every chain is fitted and written back in one bulk update
+    '''
+    data = _readChains(chains)
+    planes = crm.fitPlanes(data['positions'])
+    worlds = []
+    for chainWorlds,positions,plane in zip(data['worlds'],data['positions'],planes):
+        projected = crm.projectOnPlane(positions,plane)
+        worlds.append([crm.rigid(m)[:3]+[p+[1.0]] for m,p in zip(chainWorlds,projected)])
+    _writeChains(chains,data,worlds,orient=False)
+
+def jointOrient(jntList,aimAxis='x',upAxis='y',up=None):
+    '''
+    orient a joint chain: aimAxis down the chain and upAxis towards up, rotate zeroed
+    up defaults to the normal of the best fit plane of the chain, so planar chains bend around one axis
+    the last joint takes the orientation of its parent
+    '''
+    jointOrients([jntList],aimAxis,upAxis,up)
+
+def jointOrients(chains,aimAxis='x',upAxis='y',up=None):
+    '''
+    jointOrient for many chains, solved together and written back in one bulk update
+    straight chains without up aim their upAxis at world y, or world z when they run along y
     '''
-    pass
+    data = _readChains(chains)
+    planes = crm.fitPlanes(data['positions']) if up is None else [(None,up)]*len(chains)
+    worlds = []
+    for chainWorlds,positions,(centroid,normal) in zip(data['worlds'],data['positions'],planes):
+        if len(positions) < 2:
+            worlds.append([crm.rigid(m) for m in chainWorlds])
+            continue
+        aims = []
+        for x in range(0,len(positions)-1):
+            upVector = normal if normal is not None else _straightUp(positions[x],positions[x+1])
+            aims.append(crm.aimMatrix(positions[x],positions[x+1],upVector,aimAxis,upAxis))
+        #the last joint follows its parent
+        aims.append(aims[-1][:3]+[positions[-1]+[1.0]])
+        worlds.append(aims)
+    _writeChains(chains,data,worlds,orient=True)
 
-def jointOrient(jntList, **kwargs):
-    pass
\ No newline at end of file
+def _straightUp(start,end):
+    aim = [end[c]-start[c] for c in range(3)]
+    length = sum([v*v for v in aim])**0.5
+    return [0.0,0.0,1.0] if length > 0 and abs(aim[1])/length > 0.99 else [0.0,1.0,0.0]
+
+def _chainPositions(chains):
+    #world position of every joint of every chain, one matrix read
+    worlds = iter(getBackend().worldMatrices([j for chain in chains for j in chain]))
+    return [[crm.translation(next(worlds)) for j in chain] for chain in chains]
+
+def _readChains(chains):
+    #world matrices, root parent matrices and the attributes the solve needs, one read each
+    backend = getBackend()
+    joints = [j for chain in chains for j in chain]
+    if len(joints) == 0:
+        return {'worlds' : [],'positions' : [],'roots' : [],'attrs' : []}
+    ids,parentMap,labels = backend.parentMap(joints)
+    offset = 0
+    for chain in chains:
+        for x in range(1,len(chain)):
+            if parentMap[ids[offset+x]] != ids[offset+x-1]:
+                raise ValueError('{} is not the child of {}, joints must be given as single chains'.format(chain[x],chain[x-1]))
+        offset += len(chain)
+
+    worlds = iter(backend.worldMatrices(joints))
+    chainWorlds = [[next(worlds) for j in chain] for chain in chains]
+    roots = [chain[0] for chain in chains if len(chain) > 0]
+    rootParents = iter(backend.worldMatrices(roots,exclusive=True))
+    attrs = ('rotateOrder','scale','jointOrient','segmentScaleCompensate','inverseScale','rotate')
+    values = iter(backend.getAttrs([(j,a) for j in joints for a in attrs]))
+    chainAttrs = []
+    for chain in chains:
+        chainAttrs.append([dict([(a,next(values)) for a in attrs]) for j in chain])
+    return {
+        'worlds' : chainWorlds,
+        'positions' : [[crm.translation(m) for m in ws] for ws in chainWorlds],
+        'roots' : [next(rootParents) if len(chain) > 0 else None for chain in chains],
+        'attrs' : chainAttrs,
+    }
+
+def _writeChains(chains,data,worlds,orient):
+    #solve every chain top down, one joint depth of all the chains at a time, then one bulk write
+    #orient solves jointOrient with rotate zeroed, otherwise only translate moves
+    parentWorlds = list(data['roots'])
+    plugs = []
+    values = []
+    depth = 0
+    while True:
+        level = [c for c in range(0,len(chains)) if depth < len(chains[c])]
+        if len(level) == 0:
+            break
+        attrs = [data['attrs'][c][depth] for c in level]
+        inverseScales = [a['inverseScale'] if a['segmentScaleCompensate'] else None for a in attrs]
+        if orient:
+            rotateOrders = [0]*len(level)
+            jointOrients = [None]*len(level)
+        else:
+            rotateOrders = [int(a['rotateOrder']) for a in attrs]
+            jointOrients = [a['jointOrient'] for a in attrs]
+        solved = crm.alignLocals([worlds[c][depth] for c in level],[parentWorlds[c] for c in level],rotateOrders,jointOrients,inverseScales)
+        for c,a,inverseScale,(translate,rotate) in zip(level,attrs,inverseScales,solved):
+            j = chains[c][depth]
+            if orient:
+                #with rotate zeroed the joint orient is the whole local rotation, always xyz
+                jointOrient,rotate = tuple(rotate),(0.0,0.0,0.0)
+                plugs.extend([(j,'translate'),(j,'rotate'),(j,'jointOrient')])
+                values.extend([tuple(translate),rotate,jointOrient])
+            else:
+                jointOrient,rotate = a['jointOrient'],a['rotate']
+                plugs.append((j,'translate'))
+                values.append(tuple(translate))
+            local = crm.composeMatrix(translate,rotate,a['scale'],int(a['rotateOrder']),jointOrient,inverseScale)
+            parentWorlds[c] = crm.multiply(local,parentWorlds[c])
+        depth += 1
+    if len(plugs) > 0:
+        getBackend().setAttrs(plugs,values)